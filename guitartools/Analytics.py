@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:02:44 2026
+
+Practice analytics
+
+@author: Ian Spielman
+
+Trends in the chord changes history.  The attempts of every pair are read
+into flat numpy arrays in one pass over the history, and then every pair is
+analyzed at once with segmented array operations (a segment being the
+attempts of one pair):
+
+running best: the best changes so far, after each attempt
+rolling best: the best changes of the last WINDOW attempts
+slope: least squares changes gained per attempt
+rate: exponential fit, the fraction changes grow by per attempt
+recent: the slope over the last WINDOW attempts only
+plateau: more than WINDOW attempts, none of the last WINDOW a new best, and
+    the recent slope below PLATEAU_SLOPE
+to_goal: attempts until the recent trend reaches the goal (0 if the best
+    already has, inf if it never will)
+
+PracticeAnalytics caches the results per pair, and recomputes (again all
+at once) only the pairs that were invalidated by a new attempt.
+"""
+
+import collections
+
+import numpy as np
+
+#
+# Constants
+#
+
+# Attempts in the rolling best and the recent trend
+WINDOW = 10
+
+# Changes per attempt below which a pair is not improving
+PLATEAU_SLOPE = 0.1
+
+
+PairStats = collections.namedtuple('PairStats',
+        ['attempts', 'best', 'rolling', 'slope', 'rate', 'recent',
+         'plateau', 'to_goal'])
+PairStats.__doc__ = """
+Trends of one pair of chords, see the module docstring
+"""
+
+
+def Series(records):
+    """
+    Returns the attempts of records, a sequence of PairRecords, as flat
+    arrays: (changes, segments, positions, lengths), where the attempt i is
+    number positions[i] of records[segments[i]] and lengths is the number
+    of attempts of each record
+    """
+
+    lengths = np.array([len(record) for record in records], dtype=np.int64)
+
+    if lengths.sum() > 0:
+        changes = np.concatenate(
+                [np.frombuffer(record.changes, dtype=record.changes.typecode)
+                 for record in records if len(record) > 0]).astype(float)
+    else:
+        changes = np.zeros(0)
+
+    segments = np.repeat(np.arange(len(records)), lengths)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions = np.arange(len(changes)) - offsets[segments]
+
+    return changes, segments, positions, lengths
+
+
+def RunningBest(changes, segments):
+    """
+    The best changes so far within each segment
+    """
+
+    if len(changes) == 0:
+        return changes.copy()
+
+    # Lift each segment above the last so one accumulate stays in segment
+    lift = segments * (changes.max() + 1)
+
+    return np.maximum.accumulate(changes + lift) - lift
+
+
+def RollingBest(changes, positions, window=WINDOW):
+    """
+    The best of the last window changes within each segment
+    """
+
+    rolling = changes.copy()
+    for shift in range(1, min(window, len(changes))):
+        inside = positions[shift:] >= shift
+        later = np.maximum(rolling[shift:], changes[:-shift])
+        rolling[shift:] = np.where(inside, later, rolling[shift:])
+
+    return rolling
+
+
+def SegmentFit(y, segments, positions, lengths):
+    """
+    Least squares line through y against position in each segment, where
+    lengths is the number of points in each segment.  Returns the slope and
+    the fitted value at the last point; zero for empty segments.
+    """
+
+    count = len(lengths)
+    n = lengths.astype(float)
+
+    # Positions relative to each segment's mean, so that sum(x) = 0
+    x = positions - (n[segments] - 1)/2
+
+    sxy = np.bincount(segments, x*y, minlength=count)
+    sy = np.bincount(segments, y, minlength=count)
+    sxx = n*(n**2 - 1)/12
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy/sxx, 0.0)
+        mean = np.where(n > 0, sy/n, 0.0)
+
+    return slope, mean + slope*(n - 1)/2
+
+
+def Analyze(records, goal=1, window=WINDOW):
+    """
+    Returns a PairStats for each of records, computed all at once
+    """
+
+    changes, segments, positions, lengths = Series(records)
+
+    count = len(records)
+    if count == 0:
+        return []
+
+    running = RunningBest(changes, segments)
+    rolling = RollingBest(changes, positions, window)
+
+    ends = np.cumsum(lengths) - 1
+    has = lengths > 0
+
+    best = np.array([record.best for record in records], dtype=float)
+    last_rolling = np.zeros(count)
+    last_rolling[has] = rolling[ends[has]]
+
+    # Whole series
+    slope, _ = SegmentFit(changes, segments, positions, lengths)
+    rate, _ = SegmentFit(np.log(np.maximum(changes, 1)), segments, positions,
+                         lengths)
+    rate = np.expm1(rate)
+
+    # The last window attempts of each segment
+    recent_lengths = np.minimum(lengths, window)
+    first = lengths - recent_lengths
+    inside = positions >= first[segments]
+    recent, end = SegmentFit(changes[inside], segments[inside],
+                             positions[inside] - first[segments[inside]],
+                             recent_lengths)
+
+    # No new best in the last window attempts
+    full = lengths > window
+    stalled = np.zeros(count, dtype=bool)
+    stalled[full] = running[ends[full]] == running[ends[full] - window]
+    plateau = stalled & (recent < PLATEAU_SLOPE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        to_goal = np.where(recent > 0,
+                           np.ceil(np.maximum(goal - end, 0) / recent),
+                           np.inf)
+    to_goal = np.where(best >= goal, 0, to_goal)
+
+    return [PairStats(int(lengths[i]), int(best[i]), int(last_rolling[i]),
+                      float(slope[i]), float(rate[i]), float(recent[i]),
+                      bool(plateau[i]), float(to_goal[i]))
+            for i in range(count)]
+
+
+class PracticeAnalytics():
+    """
+    PairStats of every pair of a ChordHistory, computed when first asked for
+    and cached until Invalidate is called for the pair
+    """
+
+    def __init__(self, history=None, goal=1, window=WINDOW):
+        self.goal = goal
+        self.window = window
+
+        self.SetHistory(history)
+
+    def SetHistory(self, history):
+        self.history = history
+        self._stats = {}
+        self._stale = set()
+        self._all = True
+
+    def SetGoal(self, goal):
+        if goal != self.goal:
+            self.goal = goal
+            self._all = True
+
+    def Invalidate(self, chord1, chord2):
+        """
+        An attempt of the pair has been recorded
+        """
+
+        if self.history is None:
+            return
+
+        record = self.history.Pair(chord1, chord2)
+        if record is not None:
+            self._stale.add(record.chords)
+
+    def Update(self):
+        """
+        Recompute every invalidated pair, all at once
+        """
+
+        if self.history is None:
+            return
+
+        if self._all:
+            records = list(self.history.Pairs())
+            self._stats = {}
+        elif len(self._stale) > 0:
+            records = [self.history.Pair(*chords) for chords in self._stale]
+        else:
+            return
+
+        for record, stats in zip(records,
+                                 Analyze(records, self.goal, self.window)):
+            self._stats[record.chords] = stats
+
+        self._stale = set()
+        self._all = False
+
+    def Stats(self, chord1, chord2):
+        """
+        Returns the PairStats of the pair or None if it was never attempted
+        """
+
+        if self.history is None:
+            return None
+
+        record = self.history.Pair(chord1, chord2)
+        if record is None:
+            return None
+
+        self.Update()
+
+        return self._stats.get(record.chords, None)
+
+    def Plateaus(self):
+        """
+        Returns the pairs that have stopped improving short of the goal
+        """
+
+        self.Update()
+
+        return sorted(chords for chords, stats in self._stats.items()
+                      if stats.plateau and stats.best < self.goal)
+
+    def Curves(self, chord1, chord2):
+        """
+        Returns (changes, running best, rolling best) arrays of the pair
+        """
+
+        if self.history is None:
+            return None
+
+        record = self.history.Pair(chord1, chord2)
+        if record is None:
+            return None
+
+        changes, segments, positions, _ = Series([record])
+
+        return (changes, RunningBest(changes, segments),
+                RollingBest(changes, positions, self.window))
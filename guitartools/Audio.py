@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:12:40 2026
+
+Audio support
+
+@author: Ian Spielman
+
+Shared audio plumbing: the PCM format used throughout guitartools and a pull
+mode QIODevice that lets a renderer continuously feed one long-lived
+QAudioOutput rather than restarting the output for every sound.
+"""
+
+from PyQt5 import QtCore, QtMultimedia
+
+#
+# Constants
+#
+
+SAMPLE_RATE = 44100
+SAMPLE_BYTES = 2
+
+
+def MakeAudioFormat(sample_rate=SAMPLE_RATE):
+    """
+    Returns the mono 16 bit little endian PCM format used by all our outputs
+    """
+
+    AudioFormat = QtMultimedia.QAudioFormat()
+    AudioFormat.setChannelCount(1)
+    AudioFormat.setSampleRate(sample_rate)
+    AudioFormat.setSampleSize(8*SAMPLE_BYTES)
+    AudioFormat.setCodec("audio/pcm")
+    AudioFormat.setByteOrder(QtMultimedia.QAudioFormat.LittleEndian)
+    AudioFormat.setSampleType(QtMultimedia.QAudioFormat.SignedInt)
+
+    return AudioFormat
+
+
+class StreamDevice(QtCore.QIODevice):
+    """
+    An endless, sequential, read-only device.  Every time the audio output
+    asks for data we call render(frames), which must return an array of
+    exactly that many int16 samples.
+    """
+
+    def __init__(self, render, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._render = render
+
+    def start(self):
+        if not self.isOpen():
+            self.open(QtCore.QIODevice.ReadOnly)
+
+    def stop(self):
+        if self.isOpen():
+            self.close()
+
+    def isSequential(self):
+        return True
+
+    def bytesAvailable(self):
+        # We can always make more sound
+        return 2**16 + super().bytesAvailable()
+
+    def readData(self, maxlen):
+        frames = maxlen // SAMPLE_BYTES
+        if frames <= 0:
+            return b''
+
+        return self._render(frames).astype('<i2', copy=False).tobytes()
+
+    def writeData(self, data):
+        return -1
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:21:46 2026
+
+Benchmarks
+
+@author: Ian Spielman
+
+Times the practice logic hot paths over synthetic chord libraries and
+histories, and prints (or writes) the results as JSON so that they can be
+compared between versions.  Runs without a display
+
+QT_QPA_PLATFORM=offscreen python -m guitartools.Benchmarks --output bench.json
+
+Every benchmark is run repeats times after one warm up call, except for the
+slow ones that are run just once; best and median are the time of one call
+in seconds.  Files are only written to a temporary directory.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import importlib.metadata
+
+from PyQt5 import QtWidgets, QtCore
+
+from guitartools.History import ChordHistory
+
+# Default library sizes (chords), and history sizes (attempts)
+CHORDS = [10, 100, 1000]
+ATTEMPTS = [1000, 100000, 1000000]
+
+
+def Timed(function, repeats, warmup=True):
+    """
+    Returns the time of each of repeats calls of function, after one
+    untimed call if warmup
+    """
+
+    if warmup:
+        function()
+
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def SyntheticHistory(chords, attempts, rng):
+    """
+    A ChordHistory of attempts spread over random pairs of chords, and the
+    chord library to go with it
+    """
+
+    names = ['C{}'.format(i) for i in range(chords)]
+
+    # About ten attempts per pair, but no more pairs than exist
+    pairs = min(max(attempts // 10, 1), chords*(chords-1)//2)
+    chosen = set()
+    while len(chosen) < pairs:
+        chord1, chord2 = rng.sample(range(chords), 2)
+        chosen.add((min(chord1, chord2), max(chord1, chord2)))
+    chosen = sorted(chosen)
+
+    pair_index = []
+    offsets = [0]
+    changes = []
+    times = []
+    start = time.mktime((2017, 1, 1, 0, 0, 0, 0, 1, -1))
+    for i, pair in enumerate(chosen):
+        count = attempts // pairs + (1 if i < attempts % pairs else 0)
+        pair_index.extend(pair)
+        changes.extend(rng.randrange(1, 80) for j in range(count))
+        times.extend(time.ctime(start + 60*(len(times) + j))
+                     for j in range(count))
+        offsets.append(len(changes))
+
+    history = ChordHistory.FromColumns(names, pair_index, offsets, changes,
+                                       times, {})
+
+    library = {name: {'active': True, 'required': False} for name in names}
+
+    return history, library
+
+
+class Suite():
+    """
+    Builds the main window once, and runs every benchmark against it
+    """
+
+    def __init__(self, application, repeats=5, seed=0):
+        # Imported here so that --help does not need the whole GUI
+        from guitartools.__main__ import GuitarToolsMainWindow
+
+        self.repeats = repeats
+        self.rng = random.Random(seed)
+
+        self.directory = tempfile.mkdtemp(prefix='guitartools-bench-')
+        self.filename = os.path.join(self.directory, 'changes.ini')
+
+        self.window = GuitarToolsMainWindow(application,
+                                            autoconfig_name_key='guitartools')
+        self.window.autosaveTimer.stop()
+
+        # Never journal to (or save over) the example file
+        self.window.SetFilename(self.filename)
+
+        self.results = []
+
+    def Close(self):
+        self.window.compactor.Wait()
+        if self.window.journal is not None:
+            self.window.journal.Close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def Run(self, name, function, repeats=None, **parameters):
+        """
+        Time function, repeats=1 is a single call without a warm up
+        """
+
+        if repeats is None:
+            repeats = self.repeats
+
+        times = Timed(function, repeats, warmup=repeats > 1)
+
+        result = dict(parameters, name=name, repeats=repeats,
+                      best=min(times), median=statistics.median(times))
+        self.results.append(result)
+
+        print('{:<40} {:<28} {:>12.6f} s'.format(
+                name,
+                ' '.join('{}={}'.format(k, v) for k, v in parameters.items()),
+                result['best']), file=sys.stderr)
+
+        return result
+
+    #
+    # Benchmarks
+    #
+
+    def Changes(self, chords, attempts):
+        changes = self.window.Changes
+
+        history, library = SyntheticHistory(chords, attempts, self.rng)
+        changes.history = history
+
+        def chords_setter():
+            changes.chords = {name: dict(chord)
+                              for name, chord in library.items()}
+
+        self.Run('Changes.chords', chords_setter, repeats=1,
+                 chords=chords, attempts=attempts)
+
+        self.Run('Changes.RebuildChordQuality',
+                 lambda: changes.RebuildChordQuality(
+                         {name: {} for name in library}),
+                 chords=chords, attempts=attempts)
+
+        def suggest():
+            changes._sampler_valid = False
+            changes.SuggestChordChanges()
+
+        self.Run('Changes.SuggestChordChanges (rebuild)', suggest,
+                 chords=chords, attempts=attempts)
+        self.Run('Changes.SuggestChordChanges', changes.SuggestChordChanges,
+                 chords=chords, attempts=attempts)
+
+        def state():
+            changes.MarkDirty('history', 'chords')
+            changes.set_state(**changes.get_state())
+
+        self.Run('Changes get_state/set_state', state, repeats=1,
+                 chords=chords, attempts=attempts)
+
+    def RoundTrip(self, chords, attempts):
+        """
+        Save the synthetic library and load it back, with and without the
+        binary snapshot
+        """
+
+        window = self.window
+        history, library = SyntheticHistory(chords, attempts, self.rng)
+        window.Changes.history = history
+        window.Changes.chords = library
+
+        def save():
+            window._save_all = True
+            window.Changes.MarkDirty('history', 'chords')
+            window.SaveChanges(wait=True)
+
+        self.Run('SaveChanges', save, repeats=1,
+                 chords=chords, attempts=attempts)
+
+        self.Run('SetFilename (snapshot)',
+                 lambda: window.SetFilename(self.filename), repeats=1,
+                 chords=chords, attempts=attempts)
+
+        def load_ini():
+            snapshot = self.filename + '.snapshot'
+            if os.path.exists(snapshot):
+                os.remove(snapshot)
+            window.SetFilename(self.filename)
+
+        self.Run('SetFilename (ini)', load_ini, repeats=1,
+                 chords=chords, attempts=attempts)
+
+    def Songs(self, songs):
+        window = self.window
+        window.Songs.songs = {'Song {}'.format(i): {'active': True,
+                                                   'quality': i % 50 + 1}
+                              for i in range(songs)}
+
+        self.Run('Songs.SuggestSong', window.Songs.SuggestSong,
+                 repeats=max(self.repeats, 20), songs=songs)
+
+        # Don't let the journal grow without bound
+        window.SaveChanges(wait=True)
+
+    def Metronome(self):
+        metronome = self.window.Metronome
+
+        def cold():
+            metronome.ClickBank.Clear()
+            metronome._make_click()
+
+        self.Run('Metronome._make_click (cold)', cold)
+        self.Run('Metronome._make_click', metronome._make_click)
+
+    def AutoConfig(self):
+        window = self.window
+        components = [window, window.Timer] + [getattr(window, name)
+                      for name in ('Metronome', 'Changes', 'Listening',
+                                   'Songs')]
+
+        def state():
+            for component in components:
+                component.set_state(**component.get_state())
+
+        self.Run('AutoConfig get_state/set_state', state)
+
+    def Report(self):
+        try:
+            version = importlib.metadata.version('guitartools')
+        except importlib.metadata.PackageNotFoundError:
+            version = None
+
+        return {'version': version,
+                'python': platform.python_version(),
+                'qt': QtCore.QT_VERSION_STR,
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': self.results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description='Benchmark the guitartools practice logic')
+    parser.add_argument('--chords', type=int, nargs='+', default=CHORDS,
+                        help='chord library sizes')
+    parser.add_argument('--attempts', type=int, nargs='+', default=ATTEMPTS,
+                        help='history sizes')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='write the JSON results here, not to stdout')
+    args = parser.parse_args(argv)
+
+    application = QtWidgets.QApplication.instance()
+    if application is None:
+        application = QtWidgets.QApplication(sys.argv[:1])
+
+    suite = Suite(application, args.repeats, args.seed)
+    try:
+        for chords in args.chords:
+            for attempts in args.attempts:
+                suite.Changes(chords, attempts)
+                suite.RoundTrip(chords, attempts)
+            suite.Songs(chords)
+
+        suite.Metronome()
+        suite.AutoConfig()
+    finally:
+        suite.Close()
+
+    report = json.dumps(suite.Report(), indent=1)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
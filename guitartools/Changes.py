@@ -20,15 +20,33 @@ c.SuggestAndTime()
 c.RecordChanges(changes) # This will write to disk!  
 
 Right now we keep a full history, which might be useful for something in the 
-figure to look at plataueing for example.
+figure to look at plataueing for example.  Analytics.py does just that.
 """
 
 import time
 import random
-import distutils.util
+import collections
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, QTableWidgetFixed, SortedTupleFromArgs, SortedStrongFromArgs, strtobool
-from PyQt5 import QtWidgets, QtCore, QtGui 
+from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, QTableViewFixed, SortedTupleFromArgs, CoerceInt
+from guitartools.History import ChordHistory
+from guitartools.Sampler import WeightedSampler
+from guitartools.Analytics import PracticeAnalytics
+from guitartools.Scheduler import ReviewScheduler, DAY
+from guitartools.Models import ChordRecord, ChordTableModel, PairMatrixModel
+from PyQt5 import QtWidgets 
+
+#
+# Constants
+#
+
+# How SuggestChordChanges picks a pair
+WEAKEST = 'weakest'
+DUE = 'due'
+
+SUGGEST_MODES = collections.OrderedDict([
+        (WEAKEST, 'Weakest'),
+        (DUE, 'Due'),
+        ])
 
 #
 #
@@ -53,9 +71,11 @@ class Changes(AutoConfig):
     format.  
     """
 
-    AutoConfig.Add('goal', 1)
-    AutoConfig.Add('history', {})
-    AutoConfig.Add('chords', {})
+    AutoConfig.Add('goal', 1, CoerceInt())
+    AutoConfig.Add('history', {}, cached=True)
+    AutoConfig.Add('chords', {}, cached=True)
+    AutoConfig.Add('suggest', WEAKEST)
+    AutoConfig.Add('plan_pairs', 5, CoerceInt(minimum=1))
 
     def __init__(self, GuitarTools, **kwargs):
                 
@@ -63,9 +83,38 @@ class Changes(AutoConfig):
         
         loader = UiLoader()
 
-        loader.registerCustomWidget(QTableWidgetFixed)
+        loader.registerCustomWidget(QTableViewFixed)
         self.ui = loader.load(LocalPath('changes.ui'))
         
+        self._history = ChordHistory()
+        
+        # The chord library is the source of truth, the table is a view on it
+        self.chordModel = ChordTableModel()
+        self._library = self.chordModel.records
+        self.ui.tableView_Chords.setModel(self.chordModel)
+        self.chordModel.recordChanged.connect(self._ChordRecordChanged)
+
+        # Trends of every pair, recomputed only for the pairs that change
+        self.analytics = PracticeAnalytics(self._history)
+        
+        # The Best matrix follows the chord model and looks up the history
+        self.pairModel = PairMatrixModel(self.chordModel, self._history,
+                                         analytics=self.analytics)
+        self.ui.tableView_Changes.setModel(self.pairModel)
+        
+        # Suggestion weights of the known pairs, only rebuilt when invalid
+        self._sampler = WeightedSampler()
+        self._sampler_valid = False
+        self._sampler_required = False
+        
+        # Spaced repetition schedule of the known pairs, likewise
+        self._scheduler = ReviewScheduler()
+        self._scheduler_valid = False
+        self._scheduler_required = False
+        
+        for mode, description in SUGGEST_MODES.items():
+            self.ui.comboBox_Suggest.addItem(description, mode)
+        
         # Load the UI before calling super
         super().__init__(**kwargs)
 
@@ -73,30 +122,25 @@ class Changes(AutoConfig):
         # Setup table widget (desire to subclass) TESTING!
         #
 
-        self.ui.tableWidget_Chords.setColumnCount(5)
-        self.ui.tableWidget_Chords.setRowCount(0)
-        self.ui.tableWidget_Chords.setHorizontalHeaderLabels(["Active", 
-                                                              "Required", 
-                                                              "Chord", 
-                                                              "Quality",
-                                                              "Pairs"
-                                                              ])
-        self.ui.tableWidget_Chords.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)                      
-        self.ui.tableWidget_Chords.setFixedWidth()
+        self.ui.tableView_Chords.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)                      
+        self.ui.tableView_Chords.setFixedWidth()
 
         # Changes table
-        self.ui.tableWidget_Changes.resizeColumnsToContents()
-        self.ui.tableWidget_Changes.resizeRowsToContents()
+        self.ui.tableView_Changes.resizeColumnsToContents()
+        self.ui.tableView_Changes.resizeRowsToContents()
 
         
 
 
         #
-        # Setup combo boxes
+        # Setup combo boxes, these list the chord column of the chord model
         #
         
-        self.ui.comboBox_Chord1.setInsertPolicy(QtWidgets.QComboBox.InsertAlphabetically)
-        self.ui.comboBox_Chord2.setInsertPolicy(QtWidgets.QComboBox.InsertAlphabetically)
+        column = self.chordModel.Column('name')
+        self.ui.comboBox_Chord1.setModel(self.chordModel)
+        self.ui.comboBox_Chord1.setModelColumn(column)
+        self.ui.comboBox_Chord2.setModel(self.chordModel)
+        self.ui.comboBox_Chord2.setModelColumn(column)
         
         
         #
@@ -106,13 +150,19 @@ class Changes(AutoConfig):
         self.ui.pushButton_SuggestChanges.clicked.connect(self.SuggestChordChanges)
         self.ui.pushButton_RecordChanges.clicked.connect(self.RecordChordChanges)
         self.ui.pushButton_NewChord.clicked.connect(self.NewChord)
+        self.ui.pushButton_PlanSession.clicked.connect(self.PlanSession)
+        self.ui.spinBox_Goal.valueChanged.connect(self._GoalChanged)
+        self.ui.spinBox_Goal.valueChanged.connect(self.analytics.SetGoal)
+        self.ui.spinBox_Goal.valueChanged.connect(self.pairModel.SetGoal)
+
+        # The goal may already have been set from the state
+        self.analytics.SetGoal(self.goal)
+        self.pairModel.SetGoal(self.goal)
 
         #
         # Logic for actual suggesting of chord changes
         #
         
-        self._history = {}
-        
         # Seed the random number generator
         random.seed()
 
@@ -122,145 +172,105 @@ class Changes(AutoConfig):
     
     @goal.setter
     def goal(self, value):        
-        self.ui.spinBox_Goal.setValue(int(value))
+        self.ui.spinBox_Goal.setValue(value)
+
+    @property
+    def suggest(self):
+        return self.ui.comboBox_Suggest.currentData()
+    
+    @suggest.setter
+    def suggest(self, value):
+        index = self.ui.comboBox_Suggest.findData(value)
+        self.ui.comboBox_Suggest.setCurrentIndex(max(index, 0))
+
+    @property
+    def plan_pairs(self):
+        return self.ui.spinBox_PlanPairs.value()
+    
+    @plan_pairs.setter
+    def plan_pairs(self, value):
+        self.ui.spinBox_PlanPairs.setValue(value)
     
     @property
     def history(self):
-        return self._history
+        return self._history.ToConfig()
     
     @history.setter
     def history(self, value):
         
-        self._history = value
+        # The binary snapshot provides an already built store
+        if isinstance(value, ChordHistory):
+            self._history = value
+        else:
+            self._history = ChordHistory.FromConfig(value)
         
-        for k, v in value.items():
-            self.RebuildBest(v)
+        self.MarkDirty('history')
+        self._scheduler_valid = False
+        self.analytics.SetHistory(self._history)
+        self.pairModel.SetHistory(self._history)
         
     @property
-    def chords(self):
-        rows = self.ui.tableWidget_Chords.rowCount()
-        
-        chords = {}
-        for row in range(rows):
-            data = {
-                    'active': self.ui.tableWidget_Chords.cellWidget(row, 0).isChecked(), 
-                    'required': self.ui.tableWidget_Chords.cellWidget(row, 1).isChecked(),
-                    'quality': float(self.ui.tableWidget_Chords.item(row, 3).text()),
-                    'pairs': int(self.ui.tableWidget_Chords.item(row, 4).text())
-                    }
-            
-            chord = self.ui.tableWidget_Chords.item(row, 2).text()
-            chords[chord] = data
+    def chord_history(self):
+        return self._history
 
-        self.ui.tableWidget_Chords.setFixedWidth()
-            
-        return chords
+    @property
+    def chords(self):
+        return {record.name: record.get_state() for record in self._library}
     
     @chords.setter
     def chords(self, chords):
-        # Really dumb approach that clears the table and re-adds all the chords
+        # Replace the whole library and rebuild the tables
 
         # rebuild chord quality assumes that the chord history is already set
         chords = self.RebuildChordQuality(chords)
 
-        self.ui.tableWidget_Chords.setRowCount(0)
-        self.ui.comboBox_Chord1.clear()
-        self.ui.comboBox_Chord2.clear()
-
+        records = []
         for name in sorted(chords.keys()):
             chord = chords[name]
             
-            row = self.add_chord(name, 
+            records.append(ChordRecord(name, 
                            active=chord.get('active', True),
                            required=chord.get('required', False),
                            quality=float(chord.get('quality', 0.0)),
-                           pairs=int(chord.get('pairs', 0)),
-                           duplicate_check=False
-                           )
-            
-            # Used to know where in the table this chord is stored.
-            chord['index'] = row
-
-        self.ui.tableWidget_Chords.setFixedWidth()
-            
-        #
-        # Now add chords to the BestTable
-        #
-        
-        rows = self.ui.tableWidget_Chords.rowCount()
-        
-        self.ui.tableWidget_Changes.setColumnCount(rows)
-        self.ui.tableWidget_Changes.setRowCount(rows)
-
-        labels = [self.ui.tableWidget_Chords.item(row, 2).text() for row in range(rows)]
-
-        label_index = {chord:i for i, chord in enumerate(labels)}
-
-        self.ui.tableWidget_Changes.setHorizontalHeaderLabels(labels)
-        self.ui.tableWidget_Changes.setVerticalHeaderLabels(labels)
-
-        # Now populate the table
+                           pairs=int(chord.get('pairs', 0))
+                           ))
 
-        for k, v in self._history.items():
-            chord1, chord2 = eval(k)
+        # The combo boxes and the Best matrix follow the model reset
+        self.chordModel.Replace(records)
+        self._sampler_valid = False
+        self._scheduler_valid = False
+        self.MarkDirty('chords')
 
-            index1 = label_index.get(chord1, None)
-            index2 = label_index.get(chord2, None)
-            
-            QTableWidgetItem_best1 = QtWidgets.QTableWidgetItem(str(v['Best']))
-            QTableWidgetItem_best2 = QtWidgets.QTableWidgetItem(str(v['Best']))
-            QTableWidgetItem_best1.setFlags(QtCore.Qt.ItemIsEnabled)
-            QTableWidgetItem_best2.setFlags(QtCore.Qt.ItemIsEnabled)
-            
-            # Set Colors                
-            if v['Best'] >= self.goal:
-                QTableWidgetItem_best1.setBackground(QtGui.QColor(200,255,200))
-                QTableWidgetItem_best2.setBackground(QtGui.QColor(200,255,200))
-            else:
-                QTableWidgetItem_best1.setBackground(QtGui.QColor(255,200,200))
-                QTableWidgetItem_best2.setBackground(QtGui.QColor(255,200,200))
-
-            self.ui.tableWidget_Changes.setItem(index1, index2, QTableWidgetItem_best1)
-            self.ui.tableWidget_Changes.setItem(index2, index1, QTableWidgetItem_best2)
+        self.ui.tableView_Chords.setFixedWidth()
 
-        self.ui.tableWidget_Changes.resizeColumnsToContents()
-        self.ui.tableWidget_Changes.resizeRowsToContents()
+        # Sizing to contents visits every cell, so only do it here
+        self.ui.tableView_Changes.resizeColumnsToContents()
+        self.ui.tableView_Changes.resizeRowsToContents()
 
+    def _UpdateChordRow(self, name):
+        """
+        Refresh the quality and pairs displayed for one chord
+        """
+        
+        row = self._library.Row(name)
+        if row is None:
+            return
+        
+        chord = self._library[row]
+        chord.quality = self._history.Quality(name)
+        chord.pairs = self._history.PairCount(name)
+        
+        self.chordModel.RefreshRow(row)
 
     @property
     def active_chords(self):
-        rows = self.ui.tableWidget_Chords.rowCount()
-        
-        chords = {}
-        for row in range(rows):
-            data = {
-                    'active': self.ui.tableWidget_Chords.cellWidget(row, 0).isChecked(), 
-                    'required': self.ui.tableWidget_Chords.cellWidget(row, 1).isChecked()
-                    }
-            
-            if data['active']:
-                chord = self.ui.tableWidget_Chords.item(row, 2).text()
-                chords[chord] = data
-            
-        return chords
-
+        return {record.name: {'active': record.active, 'required': record.required}
+                for record in self._library if record.active}
 
     @property
     def required_chords(self):
-        rows = self.ui.tableWidget_Chords.rowCount()
-        
-        chords = {}
-        for row in range(rows):
-            data = {
-                    'active': self.ui.tableWidget_Chords.cellWidget(row, 0).isChecked(), 
-                    'required': self.ui.tableWidget_Chords.cellWidget(row, 1).isChecked()
-                    }
-            
-            if data['required']:
-                chord = self.ui.tableWidget_Chords.item(row, 2).text()
-                chords[chord] = data
-            
-        return chords
+        return {record.name: {'active': record.active, 'required': record.required}
+                for record in self._library if record.required}
 
 
     #
@@ -304,61 +314,42 @@ class Changes(AutoConfig):
         """
 
         # check to see if this chord is already displayed
-        search = self.ui.tableWidget_Chords.findItems(name, QtCore.Qt.MatchFixedString)
-        if duplicate_check and len(search) != 0:
+        if duplicate_check and name in self._library:
             self.GuitarTools.ui.statusbar.showMessage(
                     "Record Changes: Attempt to add duplicate chord " + name, 
                     10000)
             return -1
         
-        # Add Chord to UI        
-        row = self.ui.tableWidget_Chords.rowCount()
-        self.ui.tableWidget_Chords.insertRow(row)
-        
-        active_check = QtWidgets.QCheckBox(self.ui.tableWidget_Chords)
-        active_check.setChecked(strtobool(active))
-        
-        required_check = QtWidgets.QCheckBox(self.ui.tableWidget_Chords)
-        required_check.setChecked(strtobool(required))
-        
-        chord_name = QtWidgets.QTableWidgetItem(name)
-        chord_name.setFlags(QtCore.Qt.ItemIsEnabled)
-
-        chord_quality = QtWidgets.QTableWidgetItem(
-                "{:.1f}".format(quality))
-        chord_quality.setFlags(QtCore.Qt.ItemIsEnabled)
-
-        chord_pairs = QtWidgets.QTableWidgetItem(
-                "{:d}".format(pairs))
-        chord_pairs.setFlags(QtCore.Qt.ItemIsEnabled)
+        # Add Chord to the library (and so the UI)
+        row = self.chordModel.InsertRecord(
+                len(self._library),
+                ChordRecord(name, active, required, quality, pairs)
+                )
         
-        self.ui.tableWidget_Chords.setCellWidget(row, 0, active_check)
-        self.ui.tableWidget_Chords.setCellWidget(row, 1, required_check)
-        self.ui.tableWidget_Chords.setItem(row, 2, chord_name)
-        self.ui.tableWidget_Chords.setItem(row, 3, chord_quality)
-        self.ui.tableWidget_Chords.setItem(row, 4, chord_pairs)
-
-        self.ui.tableWidget_Chords.resizeColumnsToContents()
+        if self._sampler_valid:
+            self._UpdateSamplerChord(name)
+        if self._scheduler_valid:
+            self._UpdateSchedulerChord(name)
         
-        #
-        # Add chord to comboboxes too
-        #
+        self.MarkDirty('chords')
         
-        self.ui.comboBox_Chord1.addItem(name)
-        self.ui.comboBox_Chord2.addItem(name)
+        self.ui.tableView_Chords.resizeColumnsToContents()
+        self.ui.tableView_Changes.resizeColumnToContents(row)
         
         return row
     
-    def RecordChanges(self, Changes, Chord1, Chord2):
+    def RecordChanges(self, Changes, Chord1, Chord2, when=None):
         """
         User interface to record a new set of changes.
         
-        NewChords: Allow new chords to be added
+        when: time key of the attempt.  If None this is a new attempt made 
+            now, and it is written to the journal.  Otherwise it is being 
+            replayed from the journal.
         """
         
         Changes = max(Changes, 1)
         
-        chords = self.chords
+        chords = self._library
         if not Chord1 in chords:
             self.GuitarTools.ui.statusbar.showMessage(
                     "Record Changes: Unknown Chord " + Chord1, 
@@ -371,35 +362,33 @@ class Changes(AutoConfig):
                     10000)
             return
 
-        key = SortedStrongFromArgs(Chord1, Chord2)
-                
-        chord_history = self.history.setdefault(key, {})
-
-        chord_history[time.ctime()] = {
-                            'Changes': Changes,
-                            }
-
+        new = when is None
 
-        self.UpdateBest(chord_history, Changes)
+        # A new attempt is timed by the history
+        record = self._history.Record(Chord1, Chord2, Changes, when)
+        when = record.times[-1]
+        self.analytics.Invalidate(*record.chords)
 
-    def UpdateBest(self, chord_history, Changes):
-        """
-        take a dictionary for of changes and update the "best" changes dictionary
-        with it
-        """
+        # Only the pair and its two chords have changed
+        for row, column in self.pairModel.RefreshPair(*record.chords):
+            self.ui.tableView_Changes.resizeColumnToContents(column)
+        self._UpdateChordRow(Chord1)
+        self._UpdateChordRow(Chord2)
         
-        best = int(chord_history.get('Best', 0))
+        if self._sampler_valid:
+            self._UpdateSamplerChord(Chord1)
+            self._UpdateSamplerChord(Chord2)
         
-        chord_history['Best'] = max(Changes, best)
-
-    def RebuildBest(self, chord_history):
-        chord_history.pop('Best', None)
+        if self._scheduler_valid:
+            self._scheduler.Review(record.chords, Changes, record.stamps[-1])
         
-        best = 1
-        for k, v in chord_history.items():
-            best = max(int(v['Changes']), best)
-            
-        chord_history['Best'] = best
+        self.MarkDirty('history', 'chords')
+
+        if new:
+            self.GuitarTools.JournalEntry('changes', 
+                                          chords=[Chord1, Chord2],
+                                          changes=Changes,
+                                          when=when)
 
     def RebuildChordQuality(self, chords):
         """
@@ -408,88 +397,44 @@ class Changes(AutoConfig):
         
         I will define quality like q^-1 = mean(changes^-1) where we sum over all
         the chords.  This way we strongly rate bad chords
+        
+        The history keeps these up to date as changes are recorded, so this 
+        only has to look them up.
         """
                 
-        # Reset
-        for k in chords:
-            chords[k]['quality'] = 0.0
-            chords[k]['pairs'] = 0
-        
-        # Compute
-        for key_string, val in self.history.items():
-            
-            # This key is a string, so we eval it
-            key = eval(key_string)
-            changes = max(val['Best'], 1.0)
-            
-            # Both keys
-            chord = chords.get(key[0], {'quality': 0.0, 'pairs': 0})
-            pairs = int(chord.setdefault('pairs', 0))
-            quality = float(chord.setdefault('quality', 0.0))
-            chord['pairs'] = pairs + 1
-            chord['quality'] = quality + 1/changes
-            chords[key[0]] = chord
-
-            chord = chords.get(key[1], {'quality': 0.0, 'pairs': 0})
-            pairs = int(chord.setdefault('pairs', 0))
-            quality = float(chord.setdefault('quality', 0.0))
-            chord['pairs'] = pairs + 1
-            chord['quality'] = quality + 1/changes
-            chords[key[1]] = chord
-        
-        # Noramlize
-        for k, v in chords.items():
-            if v['quality'] != 0:
-                v['quality'] = v['pairs'] / v['quality']
+        # Chords that only appear in the history are added too
+        for name in self._history.chords:
+            chords.setdefault(name, {})
 
+        for name, chord in chords.items():
+            chord['quality'] = self._history.Quality(name)
+            chord['pairs'] = self._history.PairCount(name)
         
         return chords
 
     def SuggestChordChanges(self):
         """
         Ramdonly suggest a change to work on, with probabilities distributed 
-        according to how bad we are at a changes
+        according to how bad we are at a changes, or in the spaced repetition 
+        mode the change that is most overdue
         """
         
-        chords = self.chords
-
-        total = 0.0
-        for key in self._known_pairs():
-
-            key_string = SortedStrongFromArgs(*key)
-            if key_string in self.history:
-                total += 1/self.history[key_string]['Best']
-            else:
-                # chord not yet tested, so take mean of goodness of two com-
-                # ponent chords
-                
-                total += 0.5/max(chords[key[0]]['quality'], 1.0)
-                total += 0.5/max(chords[key[1]]['quality'], 1.0)
-                
-            
-        selected = total * random.random()
-        
-        total = 0.0  
-        for key in self._known_pairs():
+        if self.suggest == DUE:
+            if not self._scheduler_valid:
+                self._RebuildScheduler()
             
-            key_string = SortedStrongFromArgs(*key)
-            if key_string in self.history:
-                total += 1/self.history[key_string]['Best']
-            else:
-                # chord not yet tested, so take mean of goodness of two com-
-                # ponent chords
-                total += 0.5/max(chords[key[0]]['quality'], 1.0)
-                total += 0.5/max(chords[key[1]]['quality'], 1.0)
-                
+            key = self._scheduler.Next()
+        else:
+            if not self._sampler_valid:
+                self._RebuildSampler()
             
-            if selected < total:
-                break
+            key = self._sampler.Sample()
         
-        line = self.ui.comboBox_Chord1.findText(key[0])
-        self.ui.comboBox_Chord1.setCurrentIndex(line)
-
-        line = self.ui.comboBox_Chord1.findText(key[1])
-        self.ui.comboBox_Chord2.setCurrentIndex(line)
+        if key is None:
+            return
+        
+        self.ui.comboBox_Chord1.setCurrentIndex(self._library.Row(key[0]))
+        self.ui.comboBox_Chord2.setCurrentIndex(self._library.Row(key[1]))
 
     def _known_pairs(self):
         """
@@ -501,18 +446,147 @@ class Changes(AutoConfig):
         and all other chords must be from self.active_chords
         """
         
-        active_chords = self.active_chords
-        if len(active_chords) == 0:
-            return
-        
-        required_chords = self.required_chords
+        required_chords = self._library.required
         if len(required_chords) == 0:
-            required_chords = active_chords.copy()
+            required_chords = self._library.active
         
+        pairs = set()
         for required_chord in required_chords:
+            for active_chord in self._library.active:
+                key = SortedTupleFromArgs(required_chord, active_chord)
+                
+                if required_chord != active_chord and key not in pairs:
+                    pairs.add(key)
+                    yield key
+
+    def _is_known_pair(self, chord1, chord2):
+        """
+        True if _known_pairs would yield this pair
+        """
+        
+        active = self._library.active
+        required = self._library.required
+        
+        if chord1 == chord2:
+            return False
+        elif len(required) == 0:
+            return chord1 in active and chord2 in active
+        else:
+            return ((chord1 in required and chord2 in active) or
+                    (chord2 in required and chord1 in active))
+
+    def _PairWeight(self, chord1, chord2):
+        """
+        Suggestion weight of a pair: 1/Best, or if the pair has not yet been 
+        tested, the mean of 1/quality of the two component chords
+        """
+        
+        best = self._history.Best(chord1, chord2)
+        if best is not None:
+            return 1/best
+        
+        return (0.5/max(self._history.Quality(chord1), 1.0) + 
+                0.5/max(self._history.Quality(chord2), 1.0))
+
+    def _RebuildSampler(self):
+        self._sampler.Build(
+                {key: self._PairWeight(*key) for key in self._known_pairs()}
+                )
+        self._sampler_valid = True
+        self._sampler_required = len(self._library.required) > 0
+
+    def _UpdateSamplerChord(self, name):
+        """
+        Update the weight (or membership) of every pair including name.  This
+        is needed when its flags change or its quality changes.
+        """
+        
+        for chord in self._library.names:
+            if chord == name:
+                continue
+            
+            key = SortedTupleFromArgs(name, chord)
+            if self._is_known_pair(*key):
+                self._sampler[key] = self._PairWeight(*key)
+            else:
+                self._sampler.pop(key)
+
+    def _RebuildScheduler(self):
+        self._scheduler.Build(self._history, self._known_pairs(), self.goal)
+        self._scheduler_valid = True
+        self._scheduler_required = len(self._library.required) > 0
+
+    def _UpdateSchedulerChord(self, name):
+        """
+        Add or remove the pairs including name from the schedule
+        """
+        
+        for chord in self._library.names:
+            if chord == name:
+                continue
             
-            # Remove the cord being looped over to avoid double counting
-            active_chords.pop(required_chord, None)
+            key = SortedTupleFromArgs(name, chord)
+            if self._is_known_pair(*key):
+                self._scheduler.Add(key, self._history)
+            else:
+                self._scheduler.Remove(key)
+
+    def _GoalChanged(self, goal):
+        # Attempts are graded against the goal
+        self._scheduler_valid = False
+
+    def PlanSession(self):
+        """
+        Show the pairs to practice next, one timer session each
+        """
+        
+        if not self._scheduler_valid:
+            self._RebuildScheduler()
+        
+        plan = self._scheduler.Plan(self.plan_pairs)
+        
+        repeats = self.GuitarTools.Timer.repeats
+        starttime = self.GuitarTools.Timer.starttime
+        minutes = len(plan) * repeats * starttime / 60
+        
+        lines = ["{} pairs x {} repeats of {} s: {:.0f} min".format(
+                len(plan), repeats, starttime, minutes)]
+        
+        now = time.time()
+        for (chord1, chord2), due in plan:
+            memory = self._scheduler.Memory((chord1, chord2))
+            days = (due - now) / DAY
+            if memory.stability == 0:
+                when = 'new'
+            elif days <= -1:
+                when = 'overdue {:.0f} days'.format(-days)
+            elif days <= 0:
+                when = 'due'
+            elif days < 1:
+                when = 'later today'
+            else:
+                when = 'in {:.0f} days'.format(days)
             
-            for active_chord in active_chords:
-                yield SortedTupleFromArgs(required_chord, active_chord)
+            lines.append("{} - {}: {}".format(chord1, chord2, when))
+        
+        self.ui.plainTextEdit_Plan.setPlainText('\n'.join(lines))
+
+    def _ChordRecordChanged(self, row, attribute):
+        """
+        Slot called when the active or required flag of a chord is changed
+        from the table
+        """
+        
+        self.MarkDirty('chords')
+        
+        # Switching between required and unrequired changes every pair
+        required = len(self._library.required) > 0
+        if self._sampler_valid and self._sampler_required != required:
+            self._sampler_valid = False
+        if self._scheduler_valid and self._scheduler_required != required:
+            self._scheduler_valid = False
+        
+        if self._sampler_valid:
+            self._UpdateSamplerChord(self._library[row].name)
+        if self._scheduler_valid:
+            self._UpdateSchedulerChord(self._library[row].name)
@@ -0,0 +1,601 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:11 2026
+
+Chord changes history
+
+@author: Ian Spielman
+
+In memory model of the chord changes history.  On disk the history is kept
+in the human-readable configobj layout
+
+[[history]]
+[[["('A', 'D')"]]]
+Best = 32
+[[[[Mon Jun 12 06:31:17 2017]]]]
+Changes = 27
+
+which is parsed once when loaded.  Chord names are interned to integer ids,
+each pair of chords has a compact record of its attempts, and every chord
+has an adjacency list of the pairs it takes part in.  ToColumns and
+FromColumns convert to and from flat arrays for the binary snapshot.
+
+Each chord also carries the sum of 1/Best over its pairs, so that its
+quality (the harmonic mean of Best over its pairs) is kept up to date as
+attempts are recorded without rescanning the history.
+
+The time keys are time.ctime() strings, which are only good to the second
+and awkward to compare.  So every attempt also has an integer timestamp
+(seconds since the epoch): all of the keys are parsed at once, with numpy,
+when the history is loaded, and the attempts of each pair are kept sorted
+by timestamp with no two the same.  The keys are kept as they are, and are
+what is written back to the file.
+"""
+
+import ast
+import time
+import array
+import bisect
+
+from guitartools.Support import SortedTupleFromArgs, SortedStrongFromArgs
+
+#
+# Time keys
+#
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec']
+
+# A ctime key, Mon Jun 12 06:29:55 2017, is this long ...
+CTIME_LENGTH = 24
+
+# ... with digits (or a leading space, for the day) in these columns
+DIGITS = [8, 9, 11, 12, 14, 15, 17, 18, 20, 21, 22, 23]
+SEPARATORS = {3: ' ', 7: ' ', 10: ' ', 13: ':', 16: ':', 19: ' '}
+
+
+def ParseTime(when):
+    """
+    Seconds since the epoch of a time.ctime() time key, or None if it is
+    not one
+    """
+
+    try:
+        _, month, day, clock, year = when.split()
+        hour, minute, second = clock.split(':')
+        return int(time.mktime((int(year), MONTHS.index(month) + 1,
+                                int(day), int(hour), int(minute),
+                                int(second), 0, 0, -1)))
+    except (ValueError, AttributeError, OverflowError):
+        return None
+
+
+def _DaysFromCivil(year, month, day):
+    """
+    Days since 1970-01-01 of each proleptic Gregorian date
+    """
+
+    import numpy as np
+
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era*400
+    doy = (153*(month + np.where(month > 2, -3, 9)) + 2)//5 + day - 1
+    doe = yoe*365 + yoe//4 - yoe//100 + doy
+
+    return era*146097 + doe - 719468
+
+
+def ParseTimes(keys):
+    """
+    Parse a list of time.ctime() keys at once.  Returns an int64 array of
+    seconds since the epoch, and a boolean array that is False where a key
+    could not be parsed (its time is then 0).
+    """
+
+    # numpy is only imported once there is a history to parse, so that
+    # starting the program does not wait for it
+    import numpy as np
+
+    count = len(keys)
+    stamps = np.zeros(count, dtype=np.int64)
+    if count == 0:
+        return stamps, np.zeros(0, dtype=bool)
+
+    # One character per byte, and usually every key the same length
+    text = ('\n'.join(keys) + '\n').encode('ascii', 'replace')
+    chars = np.frombuffer(text, dtype=np.uint8)
+    if (len(chars) == count*(CTIME_LENGTH + 1) and
+            np.all(chars[CTIME_LENGTH::CTIME_LENGTH + 1] == ord('\n'))):
+        chars = chars.reshape(count, CTIME_LENGTH + 1)[:, :CTIME_LENGTH]
+    else:
+        blank = ' '*CTIME_LENGTH
+        text = np.array([key if len(key) == CTIME_LENGTH and key.isascii()
+                         else blank for key in keys], dtype='S24')
+        chars = text.view(np.uint8).reshape(count, CTIME_LENGTH)
+
+    # Unsigned, so anything but a digit comes out above 9
+    digits = chars - np.uint8(ord('0'))
+    digits[chars[:, 8] == ord(' '), 8] = 0
+
+    parsed = np.all(digits[:, DIGITS] <= 9, axis=1)
+    for column, separator in SEPARATORS.items():
+        parsed &= chars[:, column] == ord(separator)
+
+    # Look the month up by its three letters
+    codes = np.array([int.from_bytes(m.encode(), 'big') for m in MONTHS])
+    order = np.argsort(codes)
+    code = ((chars[:, 4].astype(np.int64) << 16) |
+            (chars[:, 5].astype(np.int64) << 8) | chars[:, 6])
+    found = np.searchsorted(codes[order], code).clip(0, len(MONTHS) - 1)
+    parsed &= codes[order][found] == code
+    month = order[found] + 1
+
+    def number(*columns):
+        value = digits[:, columns[0]].astype(np.int64)
+        for column in columns[1:]:
+            value = value*10 + digits[:, column]
+        return value
+
+    day = number(8, 9)
+    seconds = number(11, 12)*3600 + number(14, 15)*60 + number(17, 18)
+    year = number(20, 21, 22, 23)
+
+    parsed &= (day >= 1) & (day <= 31) & (seconds < 24*3600)
+
+    # The keys are local times: as if they were UTC first ...
+    naive = _DaysFromCivil(year, month, day)*86400 + seconds
+
+    # ... then shift by the UTC offset, which only changes on the hour
+    hours, inverse = np.unique(np.where(parsed, naive // 3600, 0),
+                               return_inverse=True)
+    offsets = np.zeros(len(hours), dtype=np.int64)
+    for i, hour in enumerate(hours.tolist()):
+        try:
+            fields = time.gmtime(hour*3600)
+            offsets[i] = int(time.mktime(fields[:8] + (-1,))) - hour*3600
+        except (OverflowError, ValueError, OSError):
+            offsets[i] = 0
+
+    stamps = np.where(parsed, naive + offsets[inverse.reshape(-1)], 0)
+
+    # Anything else that time.ctime() might have written
+    for i in np.flatnonzero(~parsed).tolist():
+        stamp = ParseTime(keys[i])
+        if stamp is not None:
+            stamps[i] = stamp
+            parsed[i] = True
+
+    return stamps, parsed
+
+
+
+class PairRecord():
+    """
+    All attempts for one pair of chords
+
+    chords: sorted tuple of the two chord names
+    times: time keys of each attempt
+    stamps: timestamp (seconds since the epoch) of each attempt, increasing
+    changes: number of changes for each attempt
+    best: best number of changes ever (at least 1)
+    extra: any additional per-attempt fields found on load, by time key
+    """
+
+    __slots__ = ('chords', 'ids', 'times', 'stamps', 'changes', 'best',
+                 'extra')
+
+    def __init__(self, chords, ids):
+        self.chords = chords
+        self.ids = ids
+        self.times = []
+        self.stamps = array.array('q')
+        self.changes = array.array('l')
+        self.best = 1
+        self.extra = None
+
+    def __len__(self):
+        return len(self.changes)
+
+    def Append(self, when, changes, stamp=0):
+        """
+        Add an attempt at the end, see Sort
+        """
+
+        self.times.append(when)
+        self.stamps.append(stamp)
+        self.changes.append(changes)
+        self.best = max(self.best, changes)
+
+    def Sort(self):
+        """
+        Put the attempts in order of their timestamps, and move any that
+        share a timestamp apart by a second
+        """
+
+        import numpy as np
+
+        stamps = np.frombuffer(self.stamps, dtype=np.int64)
+        if len(stamps) < 2 or np.all(stamps[1:] > stamps[:-1]):
+            return
+
+        order = np.argsort(stamps, kind='stable')
+        self.times = [self.times[i] for i in order.tolist()]
+        self.changes = array.array('l', np.frombuffer(
+                self.changes, dtype=self.changes.typecode)[order].tolist())
+
+        # Strictly increasing: stamp[i] = max(stamp[i], stamp[i-1] + 1)
+        steps = np.arange(len(stamps))
+        stamps = np.maximum.accumulate(stamps[order] - steps) + steps
+        self.stamps = array.array('q', stamps.tolist())
+
+    def Span(self, start=None, stop=None):
+        """
+        The slice of the attempts made at or after start and before stop
+        (seconds since the epoch), found by binary search
+        """
+
+        first = 0 if start is None else bisect.bisect_left(self.stamps, start)
+        last = (len(self.stamps) if stop is None else
+                bisect.bisect_left(self.stamps, stop))
+
+        return slice(first, max(first, last))
+
+    @property
+    def key(self):
+        """
+        The legacy string key for this pair
+        """
+        return SortedStrongFromArgs(*self.chords)
+
+
+class ChordHistory():
+    """
+    Indexed store of chord change attempts
+    """
+
+    def __init__(self):
+        self._names = []
+        self._ids = {}
+        self._pairs = {}
+        self._adjacency = {}
+        self._inverse = []
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def __contains__(self, chords):
+        return self.Pair(*chords) is not None
+
+    #
+    # Chord and pair lookup
+    #
+
+    def ChordId(self, name):
+        """
+        Returns the interned id for chord name, adding it if needed
+        """
+
+        chord_id = self._ids.get(name, None)
+        if chord_id is None:
+            chord_id = len(self._names)
+            self._names.append(name)
+            self._ids[name] = chord_id
+            self._adjacency[chord_id] = {}
+            self._inverse.append(0.0)
+
+        return chord_id
+
+    def ChordName(self, chord_id):
+        return self._names[chord_id]
+
+    @property
+    def chords(self):
+        """
+        Names of all chords appearing in the history
+        """
+        return [name for name, chord_id in self._ids.items()
+                if len(self._adjacency[chord_id]) > 0]
+
+    def PairCount(self, chord):
+        """
+        Number of pairs that include chord
+        """
+
+        chord_id = self._ids.get(chord, None)
+        if chord_id is None:
+            return 0
+
+        return len(self._adjacency[chord_id])
+
+    def Quality(self, chord):
+        """
+        Harmonic mean of Best over all pairs that include chord, so that
+        bad changes count strongly.  Zero if the chord has no pairs.
+        """
+
+        chord_id = self._ids.get(chord, None)
+        if chord_id is None or self._inverse[chord_id] == 0:
+            return 0.0
+
+        return len(self._adjacency[chord_id]) / self._inverse[chord_id]
+
+    def Pair(self, chord1, chord2):
+        """
+        Returns the PairRecord for the two chords or None
+        """
+
+        id1 = self._ids.get(chord1, None)
+        id2 = self._ids.get(chord2, None)
+        if id1 is None or id2 is None:
+            return None
+
+        return self._adjacency[id1].get(id2, None)
+
+    def Best(self, chord1, chord2, default=None):
+        """
+        Returns the best changes for the two chords
+        """
+
+        record = self.Pair(chord1, chord2)
+        if record is None:
+            return default
+
+        return record.best
+
+    def Pairs(self):
+        """
+        Iterates over every PairRecord
+        """
+        return iter(self._pairs.values())
+
+    def Attempts(self, chord1, chord2, start=None, stop=None):
+        """
+        Returns the (stamp, changes) of the attempts of the two chords made
+        at or after start and before stop (seconds since the epoch)
+        """
+
+        record = self.Pair(chord1, chord2)
+        if record is None:
+            return []
+
+        span = record.Span(start, stop)
+
+        return list(zip(record.stamps[span], record.changes[span]))
+
+    def PairsWith(self, chord):
+        """
+        Iterates over the PairRecords that include chord
+        """
+
+        chord_id = self._ids.get(chord, None)
+        if chord_id is None:
+            return iter(())
+
+        return iter(self._adjacency[chord_id].values())
+
+    #
+    # Changes
+    #
+
+    def _record(self, chords):
+        """
+        Returns the PairRecord for the sorted chords tuple, creating it if
+        needed
+        """
+
+        ids = (self.ChordId(chords[0]), self.ChordId(chords[1]))
+
+        record = self._pairs.get(ids, None)
+        if record is None:
+            record = PairRecord(chords, ids)
+            self._pairs[ids] = record
+            self._adjacency[ids[0]][ids[1]] = record
+            self._adjacency[ids[1]][ids[0]] = record
+
+            for chord_id in ids:
+                self._inverse[chord_id] += 1/record.best
+
+        return record
+
+    def RebuildQuality(self):
+        """
+        Recompute the quality accumulators of every chord from scratch
+        """
+
+        self._inverse = [0.0]*len(self._names)
+
+        for record in self._pairs.values():
+            for chord_id in record.ids:
+                self._inverse[chord_id] += 1/record.best
+
+    def Record(self, chord1, chord2, changes, when=None):
+        """
+        Add an attempt of changes at time key when (now if None), returns
+        the PairRecord.
+
+        The attempt always goes last: if it is not later than the last
+        attempt of the pair it is moved to a second after it, and given the
+        time key of that second.
+        """
+
+        record = self._record(SortedTupleFromArgs(chord1, chord2))
+
+        stamp = None if when is None else ParseTime(when)
+        if stamp is None:
+            stamp = int(time.time())
+        if len(record.stamps) > 0 and stamp <= record.stamps[-1]:
+            stamp = record.stamps[-1] + 1
+            when = None
+        if when is None:
+            when = time.ctime(stamp)
+
+        best = record.best
+        record.Append(when, int(changes), stamp)
+
+        if record.best != best:
+            for chord_id in record.ids:
+                self._inverse[chord_id] += 1/record.best - 1/best
+
+        return record
+
+    #
+    # configobj layout
+    #
+
+    @classmethod
+    def FromConfig(cls, history):
+        """
+        Build from the nested dictionary stored by configobj
+        """
+
+        store = cls()
+        records = []
+
+        for key_string, attempts in history.items():
+            # The only place where we parse the string key
+            chords = SortedTupleFromArgs(*ast.literal_eval(key_string))
+            record = store._record(chords)
+            records.append(record)
+
+            for when, attempt in attempts.items():
+                if when == 'Best':
+                    # Always recomputed from the attempts
+                    continue
+
+                record.Append(when, int(attempt['Changes']))
+
+                if len(attempt) > 1:
+                    if record.extra is None:
+                        record.extra = {}
+                    record.extra[when] = {
+                            k: v for k, v in attempt.items() if k != 'Changes'
+                            }
+
+        store._Stamp(records)
+        store.RebuildQuality()
+
+        return store
+
+    def _Stamp(self, records):
+        """
+        Parse the time keys of every attempt of records in one go, and sort
+        each record by them.  Attempts whose keys are not times get the
+        timestamp of the attempt before.
+        """
+
+        import numpy as np
+
+        times = [when for record in records for when in record.times]
+        stamps, parsed = ParseTimes(times)
+
+        start = 0
+        for record in records:
+            stop = start + len(record)
+            span = stamps[start:stop]
+
+            if not parsed[start:stop].all():
+                known = parsed[start:stop]
+                last = np.maximum.accumulate(
+                        np.where(known, np.arange(len(span)), -1))
+                span = np.where(last >= 0, span[last.clip(0)], 0)
+
+            record.stamps = array.array('q', span.tolist())
+            record.Sort()
+            start = stop
+
+    def ToConfig(self):
+        """
+        Returns the nested dictionary layout used by configobj
+        """
+
+        history = {}
+        for record in self._pairs.values():
+            attempts = {'Best': record.best}
+
+            for when, changes in zip(record.times, record.changes):
+                attempt = {'Changes': changes}
+                if record.extra is not None and when in record.extra:
+                    attempt.update(record.extra[when])
+                attempts[when] = attempt
+
+            history[record.key] = attempts
+
+        return history
+
+    #
+    # Columnar layout
+    #
+
+    def ToColumns(self):
+        """
+        Returns the history as flat columns
+
+        chords: list of chord names
+        pairs: array of chord indices, two per pair
+        offsets: array, the attempts of pair i are offsets[i]:offsets[i+1]
+        changes: array of changes for every attempt
+        times: list of time keys for every attempt
+        stamps: array of timestamps for every attempt
+        extra: {str(pair index): extra} for pairs with additional fields
+        """
+
+        index = {}
+        chords = []
+        pairs = array.array('q')
+        offsets = array.array('q', [0])
+        changes = array.array('q')
+        times = []
+        stamps = array.array('q')
+        extra = {}
+
+        for i, record in enumerate(self._pairs.values()):
+            for name in record.chords:
+                if name not in index:
+                    index[name] = len(chords)
+                    chords.append(name)
+                pairs.append(index[name])
+
+            changes.extend(record.changes.tolist())
+            times.extend(record.times)
+            stamps.extend(record.stamps)
+            offsets.append(len(changes))
+
+            if record.extra is not None:
+                extra[str(i)] = record.extra
+
+        return {'chords': chords, 'pairs': pairs, 'offsets': offsets,
+                'changes': changes, 'times': times, 'stamps': stamps,
+                'extra': extra}
+
+    @classmethod
+    def FromColumns(cls, chords, pairs, offsets, changes, times, extra,
+                    stamps=None):
+        """
+        Build from the columns returned by ToColumns.  If stamps is None the
+        times are parsed.
+        """
+
+        store = cls()
+        records = []
+
+        for i in range(len(offsets) - 1):
+            record = store._record((chords[pairs[2*i]], chords[pairs[2*i+1]]))
+
+            start, stop = offsets[i], offsets[i+1]
+            record.times = list(times[start:stop])
+            record.changes = array.array('l', changes[start:stop])
+            record.best = max(max(record.changes, default=1), 1)
+            record.extra = extra.get(str(i), None)
+
+            if stamps is None:
+                records.append(record)
+            else:
+                record.stamps = array.array('q', stamps[start:stop])
+
+        # Stamps from a snapshot need no parsing (nor numpy)
+        if len(records) > 0:
+            store._Stamp(records)
+        store.RebuildQuality()
+
+        return store
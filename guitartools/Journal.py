@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 13:10:26 2026
+
+Practice journal
+
+@author: Ian Spielman
+
+Every practice event (a recorded set of changes, a suggested song, a timer
+session) is appended as one JSON line to a journal that sits next to the
+.ini file
+
+{"changes": 45, "chords": ["A", "D"], "kind": "changes", "seq": 12, "when": "..."}
+
+and is flushed to disk immediately, so a crash never loses more than the
+line being written.  The .ini file is a snapshot: it records the sequence
+number of the last journal entry it contains, and on load any later entries
+are replayed on top of it.  Writing a new snapshot (compaction) is done in a
+background thread, after which the entries it contains are dropped from the
+journal.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+
+import configobj
+
+from PyQt5 import QtCore
+
+from guitartools.Snapshot import WriteSnapshot
+
+
+# A top level section header such as [changes], but not [[history]]
+SECTION_HEADER = re.compile(r'^\s*\[\s*([^\[\]]+?)\s*\]\s*(#.*)?$')
+
+
+def FileStamp(filename):
+    """
+    Modification time and size of filename, or None if it does not exist
+    """
+
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def SplitSections(text):
+    """
+    Returns {name: text} for every top level section of a configobj file.
+    Anything before the first section is kept with it.
+    """
+
+    sections = {}
+    name = None
+    lines = []
+
+    for line in text.splitlines(True):
+        match = SECTION_HEADER.match(line)
+        if match is not None:
+            if name is not None:
+                sections[name] = ''.join(lines)
+                lines = []
+            name = match.group(1)
+        lines.append(line)
+
+    if name is not None:
+        sections[name] = ''.join(lines)
+
+    return sections
+
+
+def RenderSection(name, section, newline='\n'):
+    config = configobj.ConfigObj()
+    config[name] = section
+
+    return newline.join(config.write()) + newline
+
+
+def WriteConfig(filename, state, dirty=None, stamp=None):
+    """
+    Atomically replace filename with the configobj rendering of state, and
+    return the new FileStamp.
+
+    If stamp is the FileStamp of the file when it was last loaded or
+    written, then the text of the sections that are not in dirty is copied
+    from the file as is, rather than rendered again.
+    """
+
+    text = {}
+    newline = '\n'
+    if dirty is not None and stamp is not None and FileStamp(filename) == stamp:
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            current = f.read()
+        text = SplitSections(current)
+        if '\r\n' in current:
+            newline = '\r\n'
+
+    temp = filename + '.tmp'
+    with open(temp, 'w', encoding='utf-8', newline='') as f:
+        for name, section in state.items():
+            if name in text and name not in dirty:
+                f.write(text[name])
+            else:
+                f.write(RenderSection(name, section, newline))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp, filename)
+
+    return FileStamp(filename)
+
+
+def WriteState(filename, state, history=None, dirty=None, stamp=None):
+    """
+    Write state to the .ini file filename, followed by its binary snapshot
+    if the history columns are given.  Returns the FileStamp of the .ini.
+    """
+
+    stamp = WriteConfig(filename, state, dirty, stamp)
+
+    if history is not None:
+        WriteSnapshot(filename, state, history)
+
+    return stamp
+
+
+class Journal():
+    """
+    Append only journal of practice events
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sequence = 0
+        self._file = None
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def Load(self, after=0):
+        """
+        Open the journal and return the entries with sequence numbers
+        greater than after, in order.
+        """
+
+        self.Close()
+
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+
+            # A partial last line means we crashed while writing it
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                with open(self.path, 'rb+') as f:
+                    f.truncate(end)
+
+            for line in data[:end].splitlines():
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                    int(entry['seq'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                entries.append(entry)
+
+        entries.sort(key=lambda entry: entry['seq'])
+
+        self.sequence = max([after] + [entry['seq'] for entry in entries])
+        self._entries = [entry for entry in entries if entry['seq'] > after]
+
+        return list(self._entries)
+
+    def Append(self, kind, **fields):
+        """
+        Write one entry to disk, returns its sequence number
+        """
+
+        self.sequence += 1
+
+        entry = dict(fields, kind=kind, seq=self.sequence)
+        self._entries.append(entry)
+
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        self._file.write(json.dumps(entry, sort_keys=True) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        return self.sequence
+
+    def Discard(self, sequence):
+        """
+        Drop the entries up to sequence, which are now in the snapshot
+        """
+
+        self._entries = [entry for entry in self._entries
+                         if entry['seq'] > sequence]
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if len(self._entries) == 0:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp, self.path)
+
+    def Close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        self._entries = []
+
+
+class Compactor(QtCore.QObject):
+    """
+    Writes snapshots in a background thread.  finished(filename, sequence)
+    is emitted (and so delivered in the main thread) once the snapshot that
+    includes the journal up to sequence is on disk, or failed(filename,
+    message) if it could not be written.
+
+    If a snapshot is requested while one is being written, only the most
+    recent request is written next.
+
+    dirty is the set of sections that changed since the last request, or
+    None if they all may have.  The other sections are copied from the file
+    if it has not been touched since we last loaded (Track) or wrote it.
+
+    latency is the time taken by the last write, and depth the number of
+    requests that are not on disk yet.
+    """
+
+    finished = QtCore.pyqtSignal(str, int)
+    failed = QtCore.pyqtSignal(str, str)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._lock = threading.Lock()
+        self._pending = None
+        self._running = False
+        self._thread = None
+        self._stamps = {}
+        self._waiting = 0
+        self._writing = 0
+        self.latency = None
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def depth(self):
+        with self._lock:
+            return self._waiting + self._writing
+
+    def Track(self, filename):
+        """
+        filename has just been loaded
+        """
+
+        with self._lock:
+            self._stamps[filename] = FileStamp(filename)
+
+    def Stamp(self, filename):
+        with self._lock:
+            return self._stamps.get(filename, None)
+
+    def Start(self, filename, state, sequence, history=None, dirty=None):
+        with self._lock:
+            # Sections left dirty by a request that was never written
+            if self._pending is not None and self._pending[0] == filename:
+                previous = self._pending[4]
+                if dirty is not None and previous is not None:
+                    dirty = set(dirty) | previous
+                else:
+                    dirty = None
+
+            if dirty is not None:
+                dirty = set(dirty)
+
+            # Every request merged into the pending write counts
+            self._pending = (filename, state, sequence, history, dirty)
+            self._waiting += 1
+
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def Wait(self):
+        """
+        Block until every requested snapshot has been written
+        """
+
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def Write(self, filename, state, history=None, dirty=None):
+        """
+        Write a snapshot now, in this thread
+        """
+
+        self.Wait()
+
+        start = time.perf_counter()
+        stamp = WriteState(filename, state, history, dirty,
+                           self.Stamp(filename))
+        self.latency = time.perf_counter() - start
+
+        with self._lock:
+            self._stamps[filename] = stamp
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._pending is None:
+                    self._running = False
+                    return
+                filename, state, sequence, history, dirty = self._pending
+                self._pending = None
+                self._writing, self._waiting = self._waiting, 0
+                stamp = self._stamps.get(filename, None)
+
+            start = time.perf_counter()
+            try:
+                stamp = WriteState(filename, state, history, dirty, stamp)
+            except (OSError, TypeError, configobj.ConfigObjError) as e:
+                with self._lock:
+                    self._stamps.pop(filename, None)
+                    self._writing = 0
+                self.failed.emit(filename, str(e))
+            else:
+                self.latency = time.perf_counter() - start
+                with self._lock:
+                    self._stamps[filename] = stamp
+                    self._writing = 0
+                self.finished.emit(filename, sequence)
@@ -7,9 +7,7 @@ Created on Fri Apr 28 13:58:37 2017
 
 highlight current row in table mode
 move “mode selection” to above table (?) and have different possible displays 
-	* such as increase xxx bpm each repeat
 	* add units to repeats so “repeat 1 of 5”
-	* allow infinite repeats
 
 —————————————————————
 Chord Quality/Type Recognition (CQR)
@@ -53,8 +51,38 @@ Stage 9: Longer progressions
 
 """
 
+import time
+import random
+import collections
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5 import QtMultimedia
+
+from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, CoerceInt
+from guitartools.Audio import MakeAudioFormat, StreamDevice
+from guitartools.Samples import SampleLibrary, ProgressionSchedule
+from guitartools.Synth import SynthLibrary
+from guitartools.Quiz import Quiz, MODES, STAGES, SSR, CPR
+
+#
+# Constants
+#
+
+# Progression types: the possible number of strums of each chord, and the 
+# fraction by which the time for each chord may randomly change
+PROGRESSION_TYPES = collections.OrderedDict([
+        ('Single strums', ((1,), 0.0)),
+        ('Two or four strums', ((2, 4), 0.0)),
+        ('Changes in tempo', ((2, 4), 0.25)),
+        ])
+
+# Streaming output buffer and audio clock polling interval
+STREAM_BUFFER_USECS = 100000
+STREAM_NOTIFY_MSECS = 20
+
+# Pause after an answer before the next prompt, and answer buttons per row
+ANSWER_PAUSE_MSECS = 1000
+ANSWER_COLUMNS = 4
 
 AutoConfig = MakeAutoConfig()
 class Listening(AutoConfig):
@@ -62,8 +90,15 @@ class Listening(AutoConfig):
     Play chords from a known menu to work on sound skills
     """
 
+    AutoConfig.Add('progressions', 10, CoerceInt(minimum=1))
+    AutoConfig.Add('chordtime', 2, CoerceInt(minimum=1))
+    AutoConfig.Add('progression_type', 'Single strums')
+    AutoConfig.Add('chords', [])
+    AutoConfig.Add('mode', SSR)
+    AutoConfig.Add('stage', 1, CoerceInt(minimum=1, maximum=STAGES))
+    AutoConfig.Add('results', {}, cached=True)
+
     def __init__(self, GuitarTools, **kwargs):
-        super().__init__(**kwargs)
         
         self.GuitarTools = GuitarTools
         
@@ -71,5 +106,420 @@ class Listening(AutoConfig):
 
         self.ui = loader.load(LocalPath('listening.ui'))
         
+        self.ui.spinBox_NumberProgressions.setRange(1, 1000)
+        self.ui.spinBox_ChordTime.setRange(1, 60)
+        self.ui.spinBox_ChordTime.setSuffix(' s')
+        self.ui.comboBox_PogressionType.addItems(list(PROGRESSION_TYPES))
+        for mode, description in MODES.items():
+            self.ui.comboBox_Mode.addItem(description, mode)
+        self.ui.spinBox_Stage.setRange(1, STAGES)
+        
+        # Recorded chords, or synthesized ones if there are none
+        self.samples = SampleLibrary()
+        self.synth = SynthLibrary()
+        self.library = self.synth
+        
+        # Played so far, for the results
+        self._played = []
+        self._total = 0
+        self._end = None
+        
+        # Quiz in progress: the current prompt, when it started playing and
+        # the answers given to it so far
+        self.quiz = Quiz(available=lambda chord: chord in self.library)
+        self._quizzing = False
+        self._prompt = None
+        self._prompt_number = None
+        self._prompt_started = None
+        self._answers = []
+        self._asked = 0
+        self._right = 0
+        self._answerButtons = {}
+        
+        # Chord sound: one long lived output fed by the progression schedule
+        AudioFormat = MakeAudioFormat()
+
+        self.ChordOutput = QtMultimedia.QAudioOutput(AudioFormat)
+        self.ChordOutput.setBufferSize(
+                AudioFormat.bytesForDuration(STREAM_BUFFER_USECS))
+        self.ChordOutput.setNotifyInterval(STREAM_NOTIFY_MSECS)
+        self.ChordOutput.notify.connect(self._streamNotify)
+
+        self.ChordSchedule = ProgressionSchedule(self.library, 
+                                                 AudioFormat.sampleRate())
+        self.ChordStream = StreamDevice(self.ChordSchedule.render)
+
+        # Chords we can play, checked if they are on the menu
+        self.chordModel = QtGui.QStandardItemModel()
+        self.ui.listView_Chords.setModel(self.chordModel)
+        self.UpdateChords()
+
+        # Load the UI before calling super
+        super().__init__(**kwargs)
+
+        #
+        # Connect widgets!
+        #
+
+        self.ui.pushButton_PlayProgression.clicked.connect(self.PlayStop)
+        self.ui.pushButton_ViewResults.clicked.connect(self.ViewResults)
+        self.ui.pushButton_Quiz.clicked.connect(self.QuizStartStop)
+        
+        volume = self.GuitarTools.ui.verticalSlider_Volume
+        volume.valueChanged.connect(self.setVolume)
+        self.setVolume(volume.value())
+
+    #
+    # Direct access to UI constructs
+    #
+
+    @property
+    def progressions(self):
+        return self.ui.spinBox_NumberProgressions.value()
+    
+    @progressions.setter
+    def progressions(self, value):
+        self.ui.spinBox_NumberProgressions.setValue(value)
+
+    @property
+    def chordtime(self):
+        return self.ui.spinBox_ChordTime.value()
+    
+    @chordtime.setter
+    def chordtime(self, value):
+        self.ui.spinBox_ChordTime.setValue(value)
+
+    @property
+    def progression_type(self):
+        return self.ui.comboBox_PogressionType.currentText()
+    
+    @progression_type.setter
+    def progression_type(self, value):
+        index = self.ui.comboBox_PogressionType.findText(value)
+        self.ui.comboBox_PogressionType.setCurrentIndex(max(index, 0))
+
+    @property
+    def chords(self):
+        return [self.chordModel.item(row).text() 
+                for row in range(self.chordModel.rowCount())
+                if self.chordModel.item(row).checkState() == QtCore.Qt.Checked]
+
+    @chords.setter
+    def chords(self, chords):
+        chords = set(chords)
+        for row in range(self.chordModel.rowCount()):
+            item = self.chordModel.item(row)
+            item.setCheckState(QtCore.Qt.Checked if item.text() in chords 
+                               else QtCore.Qt.Unchecked)
+
+    @property
+    def mode(self):
+        return self.ui.comboBox_Mode.currentData()
+    
+    @mode.setter
+    def mode(self, value):
+        index = self.ui.comboBox_Mode.findData(value)
+        self.ui.comboBox_Mode.setCurrentIndex(max(index, 0))
+
+    @property
+    def stage(self):
+        return self.ui.spinBox_Stage.value()
+    
+    @stage.setter
+    def stage(self, value):
+        self.ui.spinBox_Stage.setValue(value)
+
+    @property
+    def results(self):
+        return self.quiz.get_state()
+    
+    @results.setter
+    def results(self, value):
+        self.quiz.set_state(value)
+        self.MarkDirty('results')
+
+    def UpdateChords(self):
+        """
+        Rescan the samples and list the chords, keeping the checked ones
+        """
+        
+        chords = self.chords
+        
+        self.samples.Index()
+        if len(self.samples.names) > 0:
+            self.library = self.samples
+        else:
+            self.library = self.synth
+        self.ChordSchedule.library = self.library
+        
+        self.chordModel.clear()
+        for name in self.library.names:
+            item = QtGui.QStandardItem(name)
+            item.setCheckable(True)
+            item.setEditable(False)
+            self.chordModel.appendRow(item)
+        
+        self.chords = chords
+
+    def setVolume(self, volume):
+        """
+        Sets Volume from 0 to 100
+        """
+        
+        self.ChordOutput.setVolume(volume/100)
+
+    #
+    # Playback
+    #
+
+    def Progression(self, rng=random):
+        """
+        A random progression of (chord, strums, bpm) from the checked 
+        chords, or all of them if none are checked
+        """
+        
+        chords = self.chords
+        if len(chords) == 0:
+            chords = self.library.names
+        if len(chords) == 0:
+            return []
+
+        strums, variation = PROGRESSION_TYPES.get(
+                self.progression_type, 
+                next(iter(PROGRESSION_TYPES.values())))
+        
+        progression = []
+        for i in range(self.progressions):
+            count = rng.choice(strums)
+            chordtime = self.chordtime * rng.uniform(1-variation, 1+variation)
+            progression.append((rng.choice(chords), count, 60*count/chordtime))
+        
+        return progression
+
+    def PlayStop(self):
+        if self.ChordStream.isOpen():
+            self.Stop()
+        else:
+            self.Play()
+
+    def _Queue(self, progression):
+        """
+        Play progression after anything already playing, returns the 
+        prompt numbers of its chords
+        """
+
+        # Decode everything before we start, so nothing is decoded while 
+        # we play
+        self.library.Preload([(chord, bpm) 
+                              for chord, strums, bpm in progression])
+        
+        if not self.ChordStream.isOpen():
+            self.ChordSchedule.reset()
+            self.ChordStream.start()
+            self.ChordOutput.start(self.ChordStream)
+
+        self._end = None
+
+        return self.ChordSchedule.Queue(progression)
+
+    def Play(self, progression=None):
+        """
+        Play progression, or a random one
+        """
+        
+        if progression is None:
+            progression = self.Progression()
+
+        if len(progression) == 0:
+            if self.library.directory is None:
+                message = "No chord sounds available"
+            else:
+                message = "No chord samples in {}".format(
+                        self.library.directory)
+            self.GuitarTools.ui.statusbar.showMessage(message, 10000)
+            return
+
+        self.QuizStop()
+        self.Stop()
+
+        self._played = []
+        self._total = len(progression)
+        
+        self._Queue(progression)
+        
+        self.ui.pushButton_PlayProgression.setText('Stop')
+
+    def Stop(self):
+        if self.ChordStream.isOpen():
+            self.ChordOutput.stop()
+            self.ChordStream.stop()
+
+        self.ui.pushButton_PlayProgression.setText('Play Progressions')
+
+    #
+    # Quiz
+    #
+
+    def QuizStartStop(self):
+        if self._quizzing:
+            self.QuizStop()
+        else:
+            self.QuizStart()
+
+    def QuizStart(self):
+        """
+        Ask progressions prompts from the selected stage
+        """
+        
+        self.Stop()
+        
+        self.quiz.SetStage(self.mode, self.stage)
+        self._asked = 0
+        self._right = 0
+        self._quizzing = True
+        
+        self.ui.pushButton_Quiz.setText('Stop Quiz')
+        self._NextPrompt()
+
+    def QuizStop(self):
+        self._quizzing = False
+        self._prompt = None
+        self.Stop()
+
+        self.ui.pushButton_Quiz.setText('Start Quiz')
+
+    def _NextPrompt(self):
+        if not self._quizzing:
+            # Stopped while we were pausing
+            return
+
+        prompt = self.quiz.Next(self.chordtime)
+        if prompt is None:
+            self.GuitarTools.ui.statusbar.showMessage(
+                    "Nothing to play for this stage", 10000)
+            self.QuizStop()
+            return
+
+        self._AnswerButtons(prompt.choices)
+        
+        self._prompt = prompt
+        self._answers = []
+        self._prompt_started = None
+        self._prompt_number = self._Queue(prompt.progression)[0]
+
+        self.ui.label_Prompt.setText("{} of {}: listen".format(
+                self._asked + 1, self.progressions))
+
+    def _AnswerButtons(self, choices):
+        """
+        One button for each possible answer
+        """
+        
+        if list(self._answerButtons) == choices:
+            return
+
+        for button in self._answerButtons.values():
+            self.ui.gridLayout_Answers.removeWidget(button)
+            button.deleteLater()
+
+        self._answerButtons = collections.OrderedDict()
+        for i, choice in enumerate(choices):
+            button = QtWidgets.QPushButton(choice)
+            button.setFocusPolicy(QtCore.Qt.NoFocus)
+            button.clicked.connect(
+                    lambda checked, choice=choice: self.QuizAnswer(choice))
+            self.ui.gridLayout_Answers.addWidget(button, 
+                                                 i // ANSWER_COLUMNS,
+                                                 i % ANSWER_COLUMNS)
+            self._answerButtons[choice] = button
+
+    def QuizAnswer(self, answer):
+        """
+        The answer to the current prompt, or for a progression to its next
+        chord
+        """
+        
+        prompt = self._prompt
+        if prompt is None or len(self._answers) >= len(prompt.items):
+            return
+
+        self._answers.append(answer)
+        if len(self._answers) < len(prompt.items):
+            self.ui.label_Prompt.setText(', '.join(self._answers) + ', ...')
+            return
+
+        if self._prompt_started is None:
+            latency = 0.0
+        else:
+            latency = time.monotonic() - self._prompt_started
+
+        results = self.quiz.Answer(prompt, self._answers, latency)
+        self.MarkDirty('results')
+        self.GuitarTools.ScheduleSave()
+        
+        self._asked += 1
+        if all(results):
+            self._right += 1
+            self.ui.label_Prompt.setText("Right: " + ', '.join(prompt.items))
+        else:
+            self.ui.label_Prompt.setText("Wrong: " + ', '.join(prompt.items))
+
+        if self._asked < self.progressions:
+            QtCore.QTimer.singleShot(ANSWER_PAUSE_MSECS, self._NextPrompt)
+        else:
+            self.QuizStop()
+            self.ui.label_Prompt.setText("{} of {} right".format(
+                    self._right, self._asked))
+            self.ViewResults()
+
+    def _streamNotify(self):
+        """
+        Follow the prompts the audio output has reached, and stop once 
+        everything has been played
+        """
+
+        position = self.ChordOutput.processedUSecs() * \
+            self.ChordSchedule.sample_rate // 1000000
+
+        for sample, number, chord in self.ChordSchedule.PopPrompts(position):
+            if self._prompt is not None:
+                # Answer time is counted from the start of the prompt
+                if number == self._prompt_number:
+                    self._prompt_started = time.monotonic()
+                continue
+
+            self._played.append(chord)
+            self.GuitarTools.ui.statusbar.showMessage(
+                    "Chord {} of {}".format(number + 1, self._total), 
+                    5000)
+
+        # The output is kept open between the prompts of a quiz
+        if self._prompt is not None:
+            return
+
+        # Once everything is rendered, wait for the output to play it
+        if self._end is None and self.ChordSchedule.idle:
+            self._end = self.ChordSchedule.position
+        
+        if self._end is not None and position >= self._end:
+            self.Stop()
+
+    def ViewResults(self):
+        """
+        Show the quiz results of the selected mode, weakest first, and the 
+        chords played so far
+        """
+        
+        lines = ["{}: {} asked, {:.0%} right, {:.1f} s".format(*row) 
+                 for row in self.quiz.Summary(self.mode)]
+        
+        if len(self._played) > 0:
+            if len(lines) > 0:
+                lines.append('')
+            lines += ['{}: {}'.format(i+1, chord) 
+                      for i, chord in enumerate(self._played)]
+
+        self.ui.plainTextEdit.setPlainText('\n'.join(lines))
+        
 
         
\ No newline at end of file
@@ -9,11 +9,15 @@ Metronome widget
 Provides metronome widget
 """
 
-import struct
 import numpy as np
 import random
+import collections
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig
+from guitartools.Support import (UiLoader, LocalPath, MakeAutoConfig,
+                                 CoerceBool, CoerceInt)
+from guitartools.Audio import SAMPLE_RATE, MakeAudioFormat, StreamDevice
+from guitartools.Models import MetronomeRow, MetronomeTableModel
+from guitartools.Program import Program
 
 from PyQt5 import QtGui, QtCore, QtWidgets
 from PyQt5 import QtMultimedia
@@ -26,6 +30,21 @@ SILENT = 0
 QUIET = 1
 LOUD = 2
 
+# Relative volume of each kind of click
+CLICK_VOLUMES = {SILENT: 0.0, QUIET: 0.25, LOUD: 1.0}
+
+# Pitch and sharpness of each kind of click, relative to the chosen sound:
+# the accented first beat is higher with a harder attack
+CLICK_SHAPES = {SILENT: (1.0, 1.0), QUIET: (1.0, 1.0), LOUD: (1.5, 0.25)}
+
+# In a measure of four or more (an even number of) beats, the middle beat
+# is a little higher, as in 4/4 or 6/8
+MIDDLE_PITCH = 1.25
+
+# Streaming output buffer and audio clock polling interval
+STREAM_BUFFER_USECS = 50000
+STREAM_NOTIFY_MSECS = 5
+
 
 class _QStyledItemDelegateMetronome(QtWidgets.QStyledItemDelegate):
 
@@ -47,7 +66,10 @@ class _QStyledItemDelegateMetronome(QtWidgets.QStyledItemDelegate):
         return super().eventFilter(obj, event)
         
 
-class QTableWidgetMetronome(QtWidgets.QTableWidget):
+class QTableViewMetronome(QtWidgets.QTableView):
+    """
+    Editable view of a MetronomeTableModel; the model validates entries
+    """
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -58,9 +80,6 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
                 self._clicked
                 )
 
-        # Link double click action to new item if clicked in no-mans land
-        self.itemChanged.connect(self._validItem)
-
         self.delegate = _QStyledItemDelegateMetronome(self)
         self.setItemDelegate(self.delegate)
 
@@ -87,7 +106,7 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
         self.setMinimumWidth(width)
         
     def _clicked(self, point):
-        row = self.row(self.itemAt(point))
+        row = self.rowAt(point.y())
         
         menu = QtWidgets.QMenu(self)
         menu.addAction(self._actionCreate(row))
@@ -117,7 +136,7 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
         actionRemove = QtWidgets.QAction("Remove current item...", self)
     
         def _removeItem():
-            self.removeRow(row)
+            self.model().removeRows(row, 1)
             
         actionRemove.triggered.connect(_removeItem)
         
@@ -131,7 +150,7 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
         actionRemove = QtWidgets.QAction("Remove all...", self)
     
         def _removeAll():
-            self.setRowCount(0)
+            self.model().removeRows(0, self.model().rowCount())
             
         actionRemove.triggered.connect(_removeAll)
         
@@ -139,82 +158,42 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
 
 
     def newItem(self, row, Duration="60", BPM="100", Emph='1', Skipped="0%"):
-        if row == -1 or row > self.rowCount():
-            new_row = self.rowCount()
+        rows = self.model().rowCount()
+        if row == -1 or row > rows:
+            new_row = rows
         else:
             new_row = row+1
-            
-        self.insertRow(new_row)
-                
-        tableWidgetItem_Duration = QtWidgets.QTableWidgetItem(Duration)
-        tableWidgetItem_Duration.min = "1"
-        tableWidgetItem_Duration.default = "60"
-        tableWidgetItem_Duration.max = "3600"
-
-        tableWidgetItem_Bpm = QtWidgets.QTableWidgetItem(BPM)
-        tableWidgetItem_Bpm.min = "1"
-        tableWidgetItem_Bpm.default = "100"
-        tableWidgetItem_Bpm.max = "240"
-
-        tableWidgetItem_Emph = QtWidgets.QTableWidgetItem(Emph)
-        tableWidgetItem_Emph.min = "1"
-        tableWidgetItem_Emph.default = "1"
-        tableWidgetItem_Emph.max = "32"
         
-        tableWidgetItem_Skipped = QtWidgets.QTableWidgetItem(Skipped)
-        tableWidgetItem_Skipped.min = "0"
-        tableWidgetItem_Skipped.default = "0"
-        tableWidgetItem_Skipped.max = "99"
-
-
-        self.setItem(new_row, 0, tableWidgetItem_Duration)
-        self.setItem(new_row, 1, tableWidgetItem_Bpm)
-        self.setItem(new_row, 2, tableWidgetItem_Emph)
-        self.setItem(new_row, 3, tableWidgetItem_Skipped)
+        self.model().InsertRecord(new_row, 
+                                  MetronomeRow(Duration, BPM, Emph, Skipped))
 
         self.resizeColumnsToContents()
         
-    def _validItem(self, item):
-        
-        value = item.text()
-        min_value = item.min
-        max_value = item.max
-        
-        try:
-            x = int(value)
-            x = max(x, int(min_value))
-            x = min(x, int(max_value))
-            x = str(x)
-        except:
-            x = str(item.default)
-                        
-        item.setText(x)
-        
     def keyPressEvent(self, event):
         """
         If we are at the last row, create a new one on tab
         """
         key = event.key()
         if key == QtCore.Qt.Key_Tab:
-            row = self.currentRow()
-            column = self.currentColumn()
+            row = self.currentIndex().row()
+            column = self.currentIndex().column()
                                     
-            if (row == self.rowCount()-1) and (column == self.columnCount()-1):
+            if (row == self.model().rowCount()-1) and (column == self.model().columnCount()-1):
                 self.newItem(row)
 
             super().keyPressEvent(event)
             
         elif key == QtCore.Qt.Key_Enter or key == QtCore.Qt.Key_Return:
             # On enter or return add a new row if at and
-            row = self.currentRow()
-            column = self.currentColumn()
+            row = self.currentIndex().row()
+            column = self.currentIndex().column()
             
             if row != -1:
                 # no action if no selection
-                if row == self.rowCount()-1:
+                if row == self.model().rowCount()-1:
                     self.newItem(row)
                 
-                self.setCurrentCell(row+1, column)
+                self.setCurrentIndex(self.model().index(row+1, column))
 
             
         else:
@@ -226,7 +205,7 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
         """
         
         if event.button() == QtCore.Qt.LeftButton:
-            rows = self.rowCount()
+            rows = self.model().rowCount()
                         
             if (rows == 0):
                 self.newItem(-1)
@@ -237,6 +216,205 @@ class QTableWidgetMetronome(QtWidgets.QTableWidget):
 
 
 
+class ClickBank():
+    """
+    Generates and caches metronome click sounds.
+
+    A click is a sine burst at some frequency with a sin(pi t / duration)
+    envelope raised to the power sharpness (small values give a hard
+    attack, large values a soft one).  Waveforms for every requested
+    frequency and sharpness are made together in one vectorized pass, and
+    each volume level is only scaled once; all later requests are served
+    from the cache.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, duration=0.04):
+        self.sample_rate = sample_rate
+        self.duration = duration
+
+        self.samples = int(sample_rate*duration)
+        self._time_array = np.linspace(0, duration, self.samples)
+
+        self._shapes = {}
+        self._clicks = {}
+
+    def Render(self, frequencies, sharpnesses):
+        """
+        Compute and cache the full scale waveform for every combination of
+        the provided frequencies and sharpnesses in a single numpy pass
+        """
+
+        frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        sharpnesses = np.atleast_1d(np.asarray(sharpnesses, dtype=float))
+
+        t = self._time_array
+        tone = np.sin(2*np.pi*frequencies[:, None]*t[None, :])
+        envelope = np.abs(np.sin(np.pi*t / self.duration))
+        envelope = envelope[None, :]**sharpnesses[:, None]
+
+        shapes = (2**15-1) * tone[:, None, :] * envelope[None, :, :]
+
+        for i, frequency in enumerate(frequencies):
+            for j, sharpness in enumerate(sharpnesses):
+                self._shapes[(frequency, sharpness)] = shapes[i, j]
+
+    def Click(self, volume=1.0, frequency=400, sharpness=0.5):
+        """
+        Returns the int16 click for volume (0 to 1), frequency and sharpness
+        """
+
+        key = (float(volume), float(frequency), float(sharpness))
+        click = self._clicks.get(key, None)
+
+        if click is None:
+            shape = self._shapes.get(key[1:], None)
+            if shape is None:
+                self.Render(key[1], key[2])
+                shape = self._shapes[key[1:]]
+
+            click = (volume*shape).astype(np.int16)
+            click.setflags(write=False)
+            self._clicks[key] = click
+
+        return click
+
+    def Clear(self):
+        self._shapes.clear()
+        self._clicks.clear()
+
+
+class ClickSchedule():
+    """
+    Sample accurate click schedule for the streaming metronome.
+
+    Rather than starting a sound on every timer tick, the metronome output
+    pulls PCM from render(), which places each click at the exact sample
+    offset given by the current BPM.  Beats are spaced on a floating point
+    sample grid so rounding never accumulates into drift, and a click that
+    straddles two buffers is carried over into the next one.
+
+    self.sounds maps QUIET and LOUD to click arrays; an entry keyed by
+    (loudness, index) overrides these for one position in the measure, which
+    allows a different pitch on each beat.
+
+    Every audible beat is also queued in self.beats as (sample, index, loud)
+    so the GUI can flash in step with the audio clock.
+
+    A nonzero ramp (BPM per second) moves the BPM along after every beat.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+
+        self.bpm = 100
+        self.ramp = 0.0
+        self.emphasis = 1
+        self.skipped = 0
+        self.enabled = True
+
+        self.sounds = {}
+
+        self.reset()
+
+    def reset(self):
+        """
+        Restart the schedule with a beat at sample zero
+        """
+
+        self._position = 0
+        self._next_beat = 0.0
+        self._index = 0
+        self._tail = np.zeros(0, dtype=np.int32)
+        self.beats = collections.deque()
+
+    @property
+    def position(self):
+        """
+        Number of samples rendered so far
+        """
+        return self._position
+
+    @property
+    def period(self):
+        """
+        Samples between beats at the current BPM
+        """
+        return 60 * self.sample_rate / max(self.bpm, 1)
+
+    def Glide(self, seconds):
+        """
+        Move the BPM seconds along the ramp
+        """
+
+        if self.ramp != 0:
+            self.bpm = max(self.bpm + self.ramp*seconds, 1)
+
+    def _loudness(self):
+        if random.randrange(100) < self.skipped:
+            return SILENT
+        elif self._index == 0:
+            return LOUD
+        else:
+            return QUIET
+
+    def render(self, frames):
+        """
+        Render the next frames samples of the metronome as int16
+        """
+
+        start = self._position
+        stop = start + frames
+
+        out = np.zeros(frames, dtype=np.int32)
+
+        # Remainder of clicks started in the previous buffer
+        carried = min(len(self._tail), frames)
+        out[:carried] += self._tail[:carried]
+        self._tail = self._tail[carried:]
+
+        while True:
+            beat = int(round(self._next_beat))
+            if beat >= stop:
+                break
+
+            loud = self._loudness()
+            sound = self.sounds.get((loud, self._index),
+                                    self.sounds.get(loud, None))
+            if self.enabled and loud != SILENT and sound is not None:
+                offset = beat - start
+                inside = min(len(sound), frames - offset)
+                out[offset:offset+inside] += sound[:inside]
+
+                overflow = sound[inside:]
+                if len(overflow) > len(self._tail):
+                    self._tail = np.pad(self._tail,
+                                        (0, len(overflow) - len(self._tail)))
+                self._tail[:len(overflow)] += overflow
+
+                self.beats.append((beat, self._index, loud))
+
+            self._index = (self._index + 1) % max(self.emphasis, 1)
+
+            period = self.period
+            self._next_beat += period
+            self.Glide(period / self.sample_rate)
+
+        self._position = stop
+
+        return np.clip(out, -2**15, 2**15-1).astype(np.int16)
+
+    def PopBeats(self, position):
+        """
+        Remove and return the queued beats at or before sample position
+        """
+
+        beats = []
+        while len(self.beats) > 0 and self.beats[0][0] <= position:
+            beats.append(self.beats.popleft())
+
+        return beats
+
+
 AutoConfig = MakeAutoConfig()
 class Metronome(QtWidgets.QWidget, AutoConfig):
     
@@ -246,12 +424,17 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
     timerSettings = QtCore.pyqtSignal(object)
     timerSettingsGo = QtCore.pyqtSignal()
 
+    AutoConfig.Add('streaming', True, CoerceBool)
+    AutoConfig.Add('table_step', 0, CoerceInt(minimum=-50, maximum=50))
+    AutoConfig.Add('table_passes', 1, CoerceInt(minimum=0, maximum=99))
+    AutoConfig.Add('table_ramp', False, CoerceBool)
+
     def __init__(self, *args, **kwargs):
         
         # Setup widget
         QtWidgets.QWidget.__init__(self, *args, **kwargs)
         loader = UiLoader()
-        loader.registerCustomWidget(QTableWidgetMetronome)
+        loader.registerCustomWidget(QTableViewMetronome)
         loader.load(LocalPath('metronome.ui'), self)
         
         #
@@ -259,9 +442,15 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         #
 
         self._externalTimerIndex = -1
+        self._externalSegment = -1
+        self._program = None
         self._MetronomeIndex = 0
         self._MetronomeLoud = True
         self._TimerConnected = False
+        self._streaming = True
+        self._table_step = 0
+        self._table_passes = 1
+        self._table_ramp = False
 
         # Perform autoconfig
         AutoConfig.__init__(self, autoconfig_name_key='metronome')
@@ -274,21 +463,29 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         #
 
         # Metronome sound
-        AudioFormat = QtMultimedia.QAudioFormat()
-        AudioFormat.setChannelCount(1)
-        AudioFormat.setSampleRate(44100)
-        AudioFormat.setSampleSize(16)
-        AudioFormat.setCodec("audio/pcm")
-        AudioFormat.setByteOrder(QtMultimedia.QAudioFormat.LittleEndian)
-        AudioFormat.setSampleType(QtMultimedia.QAudioFormat.SignedInt)
+        AudioFormat = MakeAudioFormat()
         
         self.MetronomeOutput = QtMultimedia.QAudioOutput(AudioFormat)
         self.MetronomeOutput.setVolume(1.0)
+
+        # Streaming mode: one long lived output fed by the click schedule,
+        # with a short buffer so that BPM changes are heard right away.
+        # The output's notify signal is our audio clock for flashing.
+        self.MetronomeSchedule = ClickSchedule(AudioFormat.sampleRate())
+        self.MetronomeStream = StreamDevice(self.MetronomeSchedule.render)
+        self.MetronomeOutput.setBufferSize(
+                AudioFormat.bytesForDuration(STREAM_BUFFER_USECS))
+        self.MetronomeOutput.setNotifyInterval(STREAM_NOTIFY_MSECS)
+        self.MetronomeOutput.notify.connect(self._streamNotify)
+
+        # Per-beat mode
         self.MetronomeBuffer = QtCore.QBuffer()
         self.MetronomeDataSilent = QtCore.QByteArray()
         self.MetronomeDataQuiet = QtCore.QByteArray()
         self.MetronomeDataLoud = QtCore.QByteArray()
 
+        self.ClickBank = ClickBank(AudioFormat.sampleRate())
+
         self._make_click()
         
         # Metronome Flash timer
@@ -309,7 +506,7 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         self.Emph_spinBox.setKeyboardTracking(False)
         self.Emph_spinBox.valueChanged.connect(self.emphUpdate)
         
-        # Build button array
+        # Build button array (and the clicks for each beat)
         self.emphUpdate()
 
         self.spinBox_Skipped.setKeyboardTracking(False)
@@ -322,33 +519,84 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         self.pushButton_Preset_10.clicked.connect(lambda: self.Preset(10))
 
         # Table mode
-        self.tableWidgetMetronome.setColumnCount(4)
-        self.tableWidgetMetronome.setRowCount(0)
-        self.tableWidgetMetronome.setHorizontalHeaderLabels(
-                ["Duration", "BPM", "Beats per measure", "Skipped"]
-                )
-        self.tableWidgetMetronome.setFixedWidth()
+        self.tableModel = MetronomeTableModel()
+        self.tableViewMetronome.setModel(self.tableModel)
+        self.tableViewMetronome.setFixedWidth()
+
+        self.spinBox_TableStep.valueChanged.connect(self._tableSettingsChanged)
+        self.spinBox_TablePasses.valueChanged.connect(self._tableSettingsChanged)
+        self.checkBox_TableRamp.toggled.connect(self._tableSettingsChanged)
 
     #    
     # TODO: Table needs to be populated from the ini file
     #
 
     @property
-    def dynamicValues(self):
-        rows = self.tableWidgetMetronome.rowCount()
-        
-        Duration = []
-        BPM = []
-        Emph = []
-        Skipped = []
-        for row in range(rows):
-            
-            Duration.append(int(self.tableWidgetMetronome.item(row, 0).text()))
-            BPM.append(int(self.tableWidgetMetronome.item(row, 1).text()))
-            Emph.append(int(self.tableWidgetMetronome.item(row, 2).text()))
-            Skipped.append(int(self.tableWidgetMetronome.item(row, 3).text()))
-            
-        return {'Duration':Duration, 'BPM':BPM, 'Emph': Emph, 'Skipped': Skipped}
+    def streaming(self):
+        return self._streaming
+    
+    @streaming.setter
+    def streaming(self, value):
+        # Takes effect the next time the metronome is started
+        self._streaming = value
+
+    #
+    # Table mode settings are kept here and shown by their widgets.
+    # AutoConfig first sets them from QWidget.__init__, before the ui is
+    # loaded, and then again once it is.
+    #
+
+    @property
+    def table_step(self):
+        return self._table_step
+    
+    @table_step.setter
+    def table_step(self, value):
+        self._table_step = value
+        if self._loaded:
+            self.spinBox_TableStep.setValue(value)
+
+    @property
+    def table_passes(self):
+        return self._table_passes
+    
+    @table_passes.setter
+    def table_passes(self, value):
+        self._table_passes = value
+        if self._loaded:
+            self.spinBox_TablePasses.setValue(value)
+
+    @property
+    def table_ramp(self):
+        return self._table_ramp
+    
+    @table_ramp.setter
+    def table_ramp(self, value):
+        self._table_ramp = value
+        if self._loaded:
+            self.checkBox_TableRamp.setChecked(value)
+
+    @property
+    def _loaded(self):
+        return 'tableViewMetronome' in self.__dict__
+
+    def _tableSettingsChanged(self):
+        self._table_step = self.spinBox_TableStep.value()
+        self._table_passes = self.spinBox_TablePasses.value()
+        self._table_ramp = self.checkBox_TableRamp.isChecked()
+
+    def CompileProgram(self):
+        """
+        The table, with the pass settings, as a Program; passes of 0 means
+        forever
+        """
+        
+        passes = self.table_passes
+        
+        return Program.FromRows(self.tableModel.records,
+                                step=self.table_step,
+                                passes=passes if passes > 0 else None,
+                                ramp=self.table_ramp)
 
     
     #
@@ -366,18 +614,13 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         
         #  Only flash if planning to click
         if self._MetronomeLoud != SILENT:
-            # Flash the strobe button.
-
-            pushButton = self._pushButtons_Click[self._MetronomeIndex%emphasis]
-            pushButton.setDown(True)
-
-            def MetronomeUnFlash():
-                try:
-                    pushButton.setDown(False)
-                except:
-                    pass
+            self._flash(self._MetronomeIndex)
 
-            self.MetronomeUnFlashTimer.singleShot(100, MetronomeUnFlash)
+        # Follow any ramp
+        if self.MetronomeSchedule.ramp != 0:
+            self.MetronomeSchedule.Glide(self.MetronomeTimer.interval() / 1000)
+            self.MetronomeTimer.setInterval(
+                    round(60 / self.MetronomeSchedule.bpm * 1000))
 
         # Now get ready for the next shot
  
@@ -391,6 +634,37 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         else:
             self._MetronomeLoud = QUIET
 
+    def _flash(self, index):
+        """
+        Flash the strobe button for beat index
+        """
+
+        pushButton = self._pushButtons_Click[index%len(self._pushButtons_Click)]
+        pushButton.setDown(True)
+
+        def MetronomeUnFlash():
+            try:
+                pushButton.setDown(False)
+            except:
+                pass
+
+        self.MetronomeUnFlashTimer.singleShot(100, MetronomeUnFlash)
+
+    def _streamNotify(self):
+        """
+        Flash for the beats the audio output has reached.  This runs from the
+        output's notify signal, so the display follows the audio clock.
+        """
+
+        position = self.MetronomeOutput.processedUSecs() * \
+            self.MetronomeSchedule.sample_rate // 1000000
+
+        beats = self.MetronomeSchedule.PopBeats(position)
+        
+        # If we fell behind only the most recent beat is worth showing
+        if len(beats) > 0:
+            self._flash(beats[-1][1])
+
     def emphUpdate(self):
         """
         Rebuild the button array for the metronome
@@ -413,16 +687,27 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
             if i == 0:
                 b.setStyleSheet("QPushButton:pressed {background-color: #ff0000; border-style: inset;}")
 
+        self.MetronomeSchedule.emphasis = num
+
+        # The middle beat may have moved
+        self._make_click(*self._click_sound)
+
     def MetronomeUpdate(self):
+        BPM = self.BPM_spinBox.value()
+
+        self.MetronomeSchedule.bpm = BPM
+        self.MetronomeSchedule.ramp = 0.0
+        self.MetronomeSchedule.skipped = self.spinBox_Skipped.value()
+
         if self.MetronomeTimer.isActive():
-            BPM = self.BPM_spinBox.value()
-            self.MetronomeTimer.setInterval(60 / BPM * 1000) # BPM to ms
+            self.MetronomeTimer.setInterval(round(60 / BPM * 1000)) # BPM to ms
 
     def MetronomeStartStop(self, state):
                 
         if state == 0:
             # Stopped state
             self.MetronomeTimer.stop()
+            self._stopStream()
             self._connect_timer(False)
             return
         
@@ -432,7 +717,12 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         self._MetronomeVolume = 1.0
         BPM = self.BPM_spinBox.value()
         
-        self.MetronomeTimer.start(60 / BPM * 1000) # BPM to ms
+        if self.streaming:
+            self.MetronomeTimer.stop()
+            self._startStream()
+        else:
+            self._stopStream()
+            self.MetronomeTimer.start(round(60 / BPM * 1000)) # BPM to ms
 
         if state == 1: # Started state
             self._connect_timer(True)
@@ -443,17 +733,18 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
                 self._connect_timer(False)
         elif state == 3:# Table control state
 
-            # Send update signal to timer widget with
-            # expected durations
+            # Compile the table once, and send it to the timer widget; from
+            # here on both are driven by the same program
 
-            self.timerSettings.emit(self.dynamicValues['Duration'])
+            self._program = self.CompileProgram()
+            self.timerSettings.emit(self._program)
             
             # This signal start the timer when this method is selected.
             # this is not user friendly behavior, actually
             
             self.timerSettingsGo.emit()
         
-            if self._externalTimerIndex >= 0:
+            if self._externalSegment >= 0:
                 self._connect_timer(True)
             else:
                 self._connect_timer(False)
@@ -463,7 +754,8 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         """
         start a metronome session with duration = duration
         """
-        self.timerSettings.emit([60,]*duration)
+        self._program = None
+        self.timerSettings.emit(Program.FromTimes([60], passes=duration))
         self.timerSettingsGo.emit()
 
     
@@ -477,6 +769,10 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         connected
         """
         
+        # The streaming schedule keeps time regardless, but only clicks
+        # when connected
+        self.MetronomeSchedule.enabled = connect
+
         if connect:
             # connect if needed
             if not self._TimerConnected:
@@ -501,19 +797,59 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         state = self.comboBox_Metronome.currentIndex()
         if state == 2:
             self._connect_timer(index != -1)        
-        elif state == 3:
-            # Update metronome settings from table based on current index
-            # note that index is reversed indexed
-
-            if index != -1:
-                try:
-                    self.BPM_spinBox.setValue(self.dynamicValues['BPM'][-(index+1)])
-                    self.Emph_spinBox.setValue(self.dynamicValues['Emph'][-(index+1)])
-                    self.spinBox_Skipped.setValue(self.dynamicValues['Skipped'][-(index+1)])
-                except:
-                    self._connect_timer(False)
-                    
-            self._connect_timer(index != -1)
+
+    def externalSegment(self, index, elapsed):
+        """
+        a slot for the program segment of the external timer and the seconds
+        into it.  In table mode this sets the metronome from the compiled
+        program, and clicks while the timer runs
+        """
+        
+        self._externalSegment = int(index)
+        
+        if self.comboBox_Metronome.currentIndex() != 3:
+            return
+        
+        segment = None
+        if index >= 0 and self._program is not None:
+            segment = self._program.Segment(index)
+
+        if segment is not None:
+            self._applySegment(segment, elapsed)
+        
+        self._connect_timer(index != -1)
+
+    def _applySegment(self, segment, elapsed):
+        """
+        Set the metronome to segment, elapsed seconds into it; the ramp only
+        runs once the segment has started
+        """
+        
+        bpm = segment.BPM(elapsed)
+        emphasis = self.Emph_spinBox.value()
+        
+        # Show the segment without it looking like a user edit (which would
+        # schedule a save); the schedule is set directly below
+        for spinBox, value in [(self.BPM_spinBox, int(round(bpm))),
+                               (self.Emph_spinBox, segment.emphasis),
+                               (self.spinBox_Skipped, segment.skipped)]:
+            blocker = QtCore.QSignalBlocker(spinBox)
+            spinBox.setValue(value)
+            blocker.unblock()
+
+        if segment.emphasis != emphasis:
+            self.emphUpdate()
+
+        # The spinbox only holds whole BPM
+        self.MetronomeSchedule.bpm = bpm
+        self.MetronomeSchedule.skipped = segment.skipped
+        if 0 <= elapsed < segment.duration:
+            self.MetronomeSchedule.ramp = segment.ramp
+        else:
+            self.MetronomeSchedule.ramp = 0.0
+
+        if self.MetronomeTimer.isActive():
+            self.MetronomeTimer.setInterval(round(60 / bpm * 1000))
     
     def setVolume(self, volume):
         """
@@ -526,6 +862,25 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
     # Support Functions
     #
 
+    def _startStream(self):
+        """
+        (Re)start the continuous output from a fresh click schedule
+        """
+
+        self._stopStream()
+
+        self.MetronomeSchedule.reset()
+        self.MetronomeUpdate()
+        self.MetronomeSchedule.emphasis = self.Emph_spinBox.value()
+
+        self.MetronomeStream.start()
+        self.MetronomeOutput.start(self.MetronomeStream)
+
+    def _stopStream(self):
+        if self.MetronomeStream.isOpen():
+            self.MetronomeOutput.stop()
+            self.MetronomeStream.stop()
+
     def _play(self, Loud=LOUD):
     
         if self.MetronomeOutput.state() == QtMultimedia.QAudio.ActiveState:
@@ -547,43 +902,51 @@ class Metronome(QtWidgets.QWidget, AutoConfig):
         self.MetronomeOutput.reset()
         self.MetronomeOutput.start(self.MetronomeBuffer)
 
-    def _make_click(self):
+    def _make_click(self, frequency=400, sharpness=0.5):
+        """
+        Build the per-beat mode buffers and the streaming sounds from the
+        click bank, with the first and middle beats of the measure set apart
+        (see CLICK_SHAPES).  Cheap enough to call whenever the sound or the
+        beats per measure are changed.
+        """
 
-        # make a short click
-        sample_rate = 44100
-        duration = 0.04
-        frequency = 400
-        sharpness = 0.5
-        
-        samples = int(sample_rate*duration)
-        
-        time_array = np.linspace(0, duration, samples)
-        
-        sound_array = 2**15 * (np.sin(2*np.pi*time_array*frequency) * 
-                       np.abs(np.sin(np.pi*time_array / duration))**sharpness )
+        self._click_sound = (frequency, sharpness)
 
-                                    
-        self._click_array = sound_array.astype(np.int16)
-
-        self.MetronomeDataSilent.clear()
-        self.MetronomeDataQuiet.clear()
-        self.MetronomeDataLoud.clear()
-
-        # Zero pre-pad
-        for value in self._click_array:
-            self.MetronomeDataSilent.append(struct.pack("<h", 0))
-            self.MetronomeDataQuiet.append(struct.pack("<h", 0))
-            self.MetronomeDataLoud.append(struct.pack("<h", 0))
-
-        # Data
-        for value in self._click_array:
-            self.MetronomeDataSilent.append(struct.pack("<h", 0))
-            self.MetronomeDataQuiet.append(struct.pack("<h", value//4))
-            self.MetronomeDataLoud.append(struct.pack("<h", value))
-        
-        # Zero pad
-        for value in self._click_array:
-            self.MetronomeDataSilent.append(struct.pack("<h", 0))
-            self.MetronomeDataQuiet.append(struct.pack("<h", 0))
-            self.MetronomeDataLoud.append(struct.pack("<h", 0))
-  
\ No newline at end of file
+        def click(loud, pitch=1.0):
+            frequency_ratio, sharpness_ratio = CLICK_SHAPES[loud]
+            return self.ClickBank.Click(CLICK_VOLUMES[loud],
+                                        frequency*frequency_ratio*pitch,
+                                        sharpness*sharpness_ratio)
+
+        # Every shape used, in one pass
+        self.ClickBank.Render(
+                [frequency*ratio for ratio, _ in CLICK_SHAPES.values()] +
+                [frequency*MIDDLE_PITCH],
+                [sharpness*ratio for _, ratio in CLICK_SHAPES.values()])
+
+        samples = self.ClickBank.samples
+
+        # Each buffer is zero pre-pad, click data then zero pad.  Make all
+        # of them as rows of one contiguous little endian array
+        loudness = [SILENT, QUIET, LOUD]
+        data = np.zeros((len(loudness), 3*samples), dtype='<i2')
+        for row, loud in enumerate(loudness):
+            data[row, samples:2*samples] = click(loud)
+
+        raw = memoryview(data.tobytes())
+        row_bytes = data.shape[1] * data.itemsize
+
+        for row, buffer in enumerate([self.MetronomeDataSilent,
+                                      self.MetronomeDataQuiet,
+                                      self.MetronomeDataLoud]):
+            buffer.clear()
+            buffer.append(bytes(raw[row*row_bytes:(row+1)*row_bytes]))
+
+        # The per-beat mode only tells the first beat from the others
+        sounds = {QUIET: click(QUIET), LOUD: click(LOUD)}
+
+        emphasis = self.Emph_spinBox.value()
+        if emphasis >= 4 and emphasis % 2 == 0:
+            sounds[(QUIET, emphasis // 2)] = click(QUIET, MIDDLE_PITCH)
+
+        self.MetronomeSchedule.sounds = sounds
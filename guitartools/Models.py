@@ -0,0 +1,769 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 12:05:48 2026
+
+Practice data models
+
+@author: Ian Spielman
+
+Plain python records that hold the practice state (chords, songs and the
+metronome table) independently of any widget, together with thin
+QAbstractTableModel adapters so that table views can display and edit them.
+
+The records are the source of truth: reading the state is a dictionary or
+list lookup, and the logic can be exercised without a display.
+"""
+
+from PyQt5 import QtCore, QtGui
+
+from guitartools.Support import strtobool
+from guitartools.Sampler import AgeSampler
+
+#
+# Records
+#
+
+class ChordRecord():
+    """
+    A known chord, its practice flags and its quality estimate
+    """
+
+    __slots__ = ('name', 'active', 'required', 'quality', 'pairs')
+
+    def __init__(self, name, active=True, required=False, quality=0.0, pairs=0):
+        self.name = name
+        self.active = bool(strtobool(active))
+        self.required = bool(strtobool(required))
+        self.quality = float(quality)
+        self.pairs = int(pairs)
+
+    def get_state(self):
+        return {'active': self.active,
+                'required': self.required,
+                'quality': round(self.quality, 1),
+                'pairs': self.pairs}
+
+
+class SongRecord():
+    """
+    A song in the repertoire and its age (suggestions since last played).
+
+    While the song is active in a SongList, quality is its age as of the
+    list's tick given by tick; see SongList.Age.
+    """
+
+    __slots__ = ('name', 'active', 'quality', 'tick')
+
+    def __init__(self, name, active=True, quality=1):
+        self.name = name
+        self.active = bool(strtobool(active))
+        self.quality = int(float(quality))
+        self.tick = 0
+
+    def get_state(self):
+        return {'active': self.active,
+                'quality': self.quality}
+
+
+class MetronomeRow():
+    """
+    One row of the metronome table
+    """
+
+    __slots__ = ('duration', 'bpm', 'emph', 'skipped')
+
+    # (minimum, default, maximum) of each field
+    LIMITS = {'duration': (1, 60, 3600),
+              'bpm': (1, 100, 240),
+              'emph': (1, 1, 32),
+              'skipped': (0, 0, 99)}
+
+    def __init__(self, duration=60, bpm=100, emph=1, skipped=0):
+        self.duration = self.Coerce('duration', duration)
+        self.bpm = self.Coerce('bpm', bpm)
+        self.emph = self.Coerce('emph', emph)
+        self.skipped = self.Coerce('skipped', skipped)
+
+    @classmethod
+    def Coerce(cls, attribute, value):
+        """
+        Returns value as an int clipped to the limits of attribute, or the
+        default if it cannot be understood
+        """
+
+        min_value, default, max_value = cls.LIMITS[attribute]
+
+        try:
+            value = int(str(value).strip().rstrip('%'))
+        except ValueError:
+            return default
+
+        return min(max(value, min_value), max_value)
+
+#
+# Collections
+#
+
+class RecordList():
+    """
+    Ordered list of records, indexed by name if the records have one
+    """
+
+    def __init__(self, records=()):
+        self.Replace(records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, row):
+        return self._records[row]
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def Row(self, name, default=None):
+        return self._rows.get(name, default)
+
+    def Find(self, name):
+        """
+        Returns the record called name or None
+        """
+
+        row = self._rows.get(name, None)
+        if row is None:
+            return None
+
+        return self._records[row]
+
+    @property
+    def names(self):
+        return [record.name for record in self._records]
+
+    def _reindex(self):
+        self._rows = {}
+        for row, record in enumerate(self._records):
+            name = getattr(record, 'name', None)
+            if name is not None:
+                self._rows[name] = row
+
+    def Replace(self, records):
+        self._records = list(records)
+        self._reindex()
+
+    def Insert(self, row, record):
+        self._records.insert(row, record)
+
+        if row == len(self._records) - 1 and hasattr(record, 'name'):
+            self._rows[record.name] = row
+        else:
+            self._reindex()
+
+    def Remove(self, row, count=1):
+        del self._records[row:row+count]
+        self._reindex()
+
+    def Set(self, row, attribute, value):
+        """
+        Change one attribute of the record in row
+        """
+        setattr(self._records[row], attribute, value)
+
+
+class ChordLibrary(RecordList):
+    """
+    The known chords.  The names of the active and required chords are also
+    kept as sets, since the suggestion logic asks about them all the time.
+    """
+
+    def _reindex(self):
+        super()._reindex()
+
+        self.active = {r.name for r in self._records if r.active}
+        self.required = {r.name for r in self._records if r.required}
+
+    def Insert(self, row, record):
+        super().Insert(row, record)
+
+        if record.active:
+            self.active.add(record.name)
+        if record.required:
+            self.required.add(record.name)
+
+    def Set(self, row, attribute, value):
+        super().Set(row, attribute, value)
+
+        if attribute in ('active', 'required'):
+            flags = getattr(self, attribute)
+            name = self._records[row].name
+            if value:
+                flags.add(name)
+            else:
+                flags.discard(name)
+
+
+class SongList(RecordList):
+    """
+    The repertoire, and the rotation that suggests which song to play.
+
+    Rather than aging every active song each time one is played, the list
+    keeps a tick counting the songs played, and each active song the tick
+    at which its age was last set.  The ages are implicit, and the active
+    songs sit in an AgeSampler so that one can be drawn, weighted by age,
+    in O(log n).
+    """
+
+    def __init__(self, records=()):
+        self.tick = 0
+        self.sampler = AgeSampler()
+
+        super().__init__(records)
+
+    def _reindex(self):
+        super()._reindex()
+
+        self.sampler.now = self.tick
+        self.sampler.Build({record.name: record.tick - record.quality
+                            for record in self._records if record.active})
+
+    def Replace(self, records):
+        records = list(records)
+        for record in records:
+            record.tick = self.tick
+
+        super().Replace(records)
+
+    def Insert(self, row, record):
+        record.tick = self.tick
+
+        super().Insert(row, record)
+
+        if record.active:
+            self.sampler[record.name] = self.tick - record.quality
+
+    def Set(self, row, attribute, value):
+        record = self._records[row]
+        if attribute not in ('active', 'quality'):
+            super().Set(row, attribute, value)
+            return
+
+        # Start counting from the current age
+        record.quality = self.Age(record)
+        record.tick = self.tick
+
+        super().Set(row, attribute, value)
+
+        if record.active:
+            self.sampler[record.name] = self.tick - record.quality
+        else:
+            self.sampler.pop(record.name)
+
+    def Age(self, record):
+        """
+        Songs played since record was last played, counting itself
+        """
+
+        if record.active:
+            return record.quality + self.tick - record.tick
+
+        return record.quality
+
+    def Suggest(self, rng):
+        """
+        Returns the name of a random active song, weighted by age, or None
+        """
+        return self.sampler.Sample(rng)
+
+    def Play(self, name):
+        """
+        Mark song name as just played; every other active song ages by one
+        """
+
+        record = self.Find(name)
+        if record is None:
+            return
+
+        self.tick += 1
+        self.sampler.now = self.tick
+
+        record.quality = 1
+        record.tick = self.tick
+        if record.active:
+            self.sampler[name] = self.tick - 1
+
+    def Sync(self):
+        """
+        Store the current age of every song in its quality
+        """
+
+        for record in self._records:
+            record.quality = self.Age(record)
+            record.tick = self.tick
+
+#
+# Qt adapters
+#
+
+CHECK = 'check'
+TEXT = 'text'
+
+class Column():
+    """
+    Description of one column of a RecordTableModel
+
+    header: header label
+    attribute: record attribute displayed in this column
+    kind: CHECK for a check box, TEXT otherwise
+    fmt: format string for TEXT columns
+    editable: if True values typed into the view are passed to coerce
+    coerce: function(value) returning the value to store
+    """
+
+    __slots__ = ('header', 'attribute', 'kind', 'fmt', 'editable', 'coerce')
+
+    def __init__(self, header, attribute, kind=TEXT, fmt="{}", editable=False,
+                 coerce=None):
+        self.header = header
+        self.attribute = attribute
+        self.kind = kind
+        self.fmt = fmt
+        self.editable = editable
+        self.coerce = coerce
+
+
+class RecordTableModel(QtCore.QAbstractTableModel):
+    """
+    A table model displaying a RecordList, one record per row
+
+    recordChanged(row, attribute) is emitted whenever the user changes a
+    record through the view.
+    """
+
+    recordChanged = QtCore.pyqtSignal(int, str)
+
+    columns = []
+
+    def __init__(self, records, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.records = records
+
+    #
+    # QAbstractTableModel interface
+    #
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section].header
+
+        return str(section+1)
+
+    def flags(self, index):
+        flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
+
+        column = self.columns[index.column()]
+        if column.kind == CHECK:
+            flags |= QtCore.Qt.ItemIsUserCheckable
+        elif column.editable:
+            flags |= QtCore.Qt.ItemIsEditable
+
+        return flags
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        column = self.columns[index.column()]
+        value = self.Value(self.records[index.row()], column.attribute)
+
+        if column.kind == CHECK:
+            if role == QtCore.Qt.CheckStateRole:
+                return QtCore.Qt.Checked if value else QtCore.Qt.Unchecked
+        elif role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return column.fmt.format(value)
+
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        column = self.columns[index.column()]
+
+        if column.kind == CHECK and role == QtCore.Qt.CheckStateRole:
+            value = (value == QtCore.Qt.Checked)
+        elif column.editable and role == QtCore.Qt.EditRole:
+            if column.coerce is not None:
+                value = column.coerce(value)
+        else:
+            return False
+
+        self.SetValue(index.row(), column.attribute, value)
+
+        return True
+
+    def insertRows(self, row, count, parent=QtCore.QModelIndex()):
+        if row < 0 or row > len(self.records):
+            return False
+
+        for i in range(count):
+            record = self.NewRecord()
+            if record is None:
+                return False
+            self.InsertRecord(row+i, record)
+        return True
+
+    def removeRows(self, row, count, parent=QtCore.QModelIndex()):
+        if row < 0 or row+count > len(self.records):
+            return False
+
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row+count-1)
+        self.records.Remove(row, count)
+        self.endRemoveRows()
+
+        return True
+
+    #
+    # Record level access
+    #
+
+    def NewRecord(self):
+        """
+        A default record for insertRows, or None if there is none
+        """
+        return None
+
+    def UnusedName(self, name):
+        """
+        name, or name followed by the first number that makes it unused
+        """
+
+        unused = name
+        number = 1
+        while unused in self.records:
+            number += 1
+            unused = "{} {}".format(name, number)
+
+        return unused
+
+    def Value(self, record, attribute):
+        """
+        The value of attribute displayed for record
+        """
+        return getattr(record, attribute)
+
+    def Column(self, attribute):
+        """
+        Returns the column index displaying attribute
+        """
+
+        for i, column in enumerate(self.columns):
+            if column.attribute == attribute:
+                return i
+
+        return -1
+
+    def SetValue(self, row, attribute, value):
+        """
+        Change one attribute of the record in row and update the views
+        """
+
+        self.records.Set(row, attribute, value)
+
+        column = self.Column(attribute)
+        if column >= 0:
+            index = self.index(row, column)
+            self.dataChanged.emit(index, index)
+
+        self.recordChanged.emit(row, attribute)
+
+    def InsertRecord(self, row, record):
+        row = max(min(row, len(self.records)), 0)
+
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.records.Insert(row, record)
+        self.endInsertRows()
+
+        return row
+
+    def Replace(self, records):
+        """
+        Replace every record
+        """
+
+        self.beginResetModel()
+        self.records.Replace(records)
+        self.endResetModel()
+
+    def RefreshRow(self, row):
+        """
+        Tell the views that the record in row was changed directly
+        """
+
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, len(self.columns)-1))
+
+    def RefreshColumn(self, attribute):
+        """
+        Tell the views that attribute may have changed in every record
+        """
+
+        column = self.Column(attribute)
+        if column >= 0 and len(self.records) > 0:
+            self.dataChanged.emit(self.index(0, column),
+                                  self.index(len(self.records)-1, column))
+
+    def RefreshAll(self):
+        if len(self.records) > 0:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(len(self.records)-1,
+                                             len(self.columns)-1))
+
+
+class ChordTableModel(RecordTableModel):
+
+    columns = [Column("Active", 'active', CHECK),
+               Column("Required", 'required', CHECK),
+               Column("Chord", 'name'),
+               Column("Quality", 'quality', fmt="{:.1f}"),
+               Column("Pairs", 'pairs', fmt="{:d}")]
+
+    def __init__(self, records=None, *args, **kwargs):
+        if records is None:
+            records = ChordLibrary()
+        super().__init__(records, *args, **kwargs)
+
+    def NewRecord(self):
+        return ChordRecord(self.UnusedName("New chord"))
+
+
+class SongTableModel(RecordTableModel):
+
+    columns = [Column("Song", 'name'),
+               Column("Active", 'active', CHECK),
+               Column("Age", 'quality', fmt="{:.1f}")]
+
+    def __init__(self, records=None, *args, **kwargs):
+        if records is None:
+            records = SongList()
+        super().__init__(records, *args, **kwargs)
+
+    def NewRecord(self):
+        return SongRecord(self.UnusedName("New song"))
+
+    def Value(self, record, attribute):
+        if attribute == 'quality':
+            return self.records.Age(record)
+        return getattr(record, attribute)
+
+
+class MetronomeTableModel(RecordTableModel):
+
+    columns = [Column("Duration", 'duration', editable=True,
+                      coerce=lambda v: MetronomeRow.Coerce('duration', v)),
+               Column("BPM", 'bpm', editable=True,
+                      coerce=lambda v: MetronomeRow.Coerce('bpm', v)),
+               Column("Beats per measure", 'emph', editable=True,
+                      coerce=lambda v: MetronomeRow.Coerce('emph', v)),
+               Column("Skipped", 'skipped', fmt="{}%", editable=True,
+                      coerce=lambda v: MetronomeRow.Coerce('skipped', v))]
+
+    def __init__(self, records=None, *args, **kwargs):
+        if records is None:
+            records = RecordList()
+        super().__init__(records, *args, **kwargs)
+
+    def NewRecord(self):
+        return MetronomeRow()
+
+
+class PairMatrixModel(QtCore.QAbstractTableModel):
+    """
+    The symmetric matrix of Best changes for every pair of known chords.
+
+    Nothing is stored here: rows and columns follow the records of a
+    ChordTableModel and each cell is looked up in the ChordHistory when the
+    view asks for it, so recording an attempt only has to refresh two cells.
+
+    If analytics (a PracticeAnalytics) is given, each cell's tool tip shows
+    the pair's trend and pairs stuck short of the goal get their own color.
+    """
+
+    GOOD_COLOR = QtGui.QColor(200, 255, 200)
+    BAD_COLOR = QtGui.QColor(255, 200, 200)
+    PLATEAU_COLOR = QtGui.QColor(255, 230, 180)
+
+    def __init__(self, chordModel, history=None, goal=1, analytics=None,
+                 *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.records = chordModel.records
+        self.history = history
+        self.goal = goal
+        self.analytics = analytics
+
+        # Rows and columns are inserted separately, so count them separately
+        self._rows = len(self.records)
+        self._columns = len(self.records)
+
+        chordModel.modelAboutToBeReset.connect(self.beginResetModel)
+        chordModel.modelReset.connect(self._chordsReset)
+        chordModel.rowsInserted.connect(self._chordsInserted)
+        chordModel.rowsRemoved.connect(self._chordsRemoved)
+
+    def _chordsReset(self):
+        self._rows = len(self.records)
+        self._columns = len(self.records)
+        self.endResetModel()
+
+    def _chordsInserted(self, parent, first, last):
+        self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        self._rows += last - first + 1
+        self.endInsertRows()
+
+        self.beginInsertColumns(QtCore.QModelIndex(), first, last)
+        self._columns += last - first + 1
+        self.endInsertColumns()
+
+    def _chordsRemoved(self, parent, first, last):
+        self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+        self._rows -= last - first + 1
+        self.endRemoveRows()
+
+        self.beginRemoveColumns(QtCore.QModelIndex(), first, last)
+        self._columns -= last - first + 1
+        self.endRemoveColumns()
+
+    #
+    # QAbstractTableModel interface
+    #
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._rows
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._columns
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or section >= len(self.records):
+            return None
+
+        return self.records[section].name
+
+    def flags(self, index):
+        return QtCore.Qt.ItemIsEnabled
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if (not index.isValid() or self.history is None or
+                role not in (QtCore.Qt.DisplayRole, QtCore.Qt.BackgroundRole,
+                             QtCore.Qt.ToolTipRole)):
+            return None
+
+        chord1 = self.records[index.row()].name
+        chord2 = self.records[index.column()].name
+
+        best = self.history.Best(chord1, chord2)
+        if best is None:
+            return None
+
+        if role == QtCore.Qt.DisplayRole:
+            return str(best)
+        elif role == QtCore.Qt.ToolTipRole:
+            return self._toolTip(chord1, chord2)
+        elif best >= self.goal:
+            return self.GOOD_COLOR
+        elif self._plateau(chord1, chord2):
+            return self.PLATEAU_COLOR
+        else:
+            return self.BAD_COLOR
+
+    def _plateau(self, chord1, chord2):
+        if self.analytics is None:
+            return False
+
+        stats = self.analytics.Stats(chord1, chord2)
+
+        return stats is not None and stats.plateau
+
+    def _toolTip(self, chord1, chord2):
+        if self.analytics is None:
+            return None
+
+        stats = self.analytics.Stats(chord1, chord2)
+        if stats is None or stats.attempts == 0:
+            return None
+
+        lines = ["{} attempts, best {}, best of the last {} {}".format(
+                         stats.attempts, stats.best, self.analytics.window,
+                         stats.rolling),
+                 "{:+.2f} changes ({:+.1%}) per attempt, {:+.2f} lately".format(
+                         stats.slope, stats.rate, stats.recent)]
+
+        if stats.plateau:
+            lines.append("Plateaued")
+        if 0 < stats.to_goal < float('inf'):
+            lines.append("About {:.0f} attempts to the goal".format(
+                    stats.to_goal))
+
+        return '\n'.join(lines)
+
+    #
+    # Updates
+    #
+
+    def SetHistory(self, history):
+        self.beginResetModel()
+        self.history = history
+        self.endResetModel()
+
+    def SetGoal(self, goal):
+        """
+        Change the goal, which only changes the cell colors
+        """
+
+        if goal == self.goal:
+            return
+
+        self.goal = goal
+
+        if self._rows > 0 and self._columns > 0:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self._rows-1, self._columns-1),
+                                  [QtCore.Qt.BackgroundRole])
+
+    def RefreshPair(self, chord1, chord2):
+        """
+        Tell the views that the Best of this pair has changed, returns the
+        two (row, column) positions touched
+        """
+
+        row1 = self.records.Row(chord1)
+        row2 = self.records.Row(chord2)
+        if row1 is None or row2 is None:
+            return ()
+
+        cells = ((row1, row2), (row2, row1))
+        for row, column in cells:
+            index = self.index(row, column)
+            self.dataChanged.emit(index, index)
+
+        return cells
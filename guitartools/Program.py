@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:48:31 2026
+
+Practice programs
+
+@author: Ian Spielman
+
+The metronome table compiled, once, into the segments that the timer counts
+down and the metronome plays.  Each segment has a duration (in seconds), a
+BPM, the beats per measure, the percentage of beats skipped and a ramp: the
+BPM per second it changes by.  With ramps on, every segment glides into the
+BPM of the one after it.
+
+The table is played passes times (forever if passes is None), step BPM
+faster on each pass.  Nothing is expanded: segment i is row i % rows of
+pass i // rows, so finding a segment is O(1) and an endless program costs
+no more than a single pass.
+"""
+
+import collections
+
+from guitartools.Models import MetronomeRow
+
+#
+# Constants
+#
+
+MIN_BPM = MetronomeRow.LIMITS['bpm'][0]
+MAX_BPM = MetronomeRow.LIMITS['bpm'][2]
+
+
+class Segment(collections.namedtuple('Segment',
+        ['index', 'row', 'duration', 'bpm', 'emphasis', 'skipped', 'ramp'])):
+    """
+    One segment of a Program, row being the table row it was made from
+    """
+
+    __slots__ = ()
+
+    def BPM(self, elapsed):
+        """
+        The BPM elapsed seconds into the segment
+        """
+
+        elapsed = min(max(elapsed, 0), self.duration)
+
+        return self.bpm + self.ramp*elapsed
+
+
+class Program(collections.namedtuple('Program',
+        ['rows', 'step', 'passes', 'ramp'])):
+    """
+    An immutable practice program: rows is a tuple of (duration, bpm,
+    emphasis, skipped) tuples
+
+    program = Program.FromRows(tableModel.records, step=5, passes=None)
+    segment = program.Segment(index)
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def FromRows(cls, rows, step=0, passes=1, ramp=False):
+        """
+        Compile MetronomeRows, played passes times (None for forever) step
+        BPM faster each pass
+        """
+
+        rows = tuple((row.duration, row.bpm, row.emph, row.skipped)
+                     for row in rows)
+
+        return cls(rows, int(step), passes, bool(ramp))
+
+    @classmethod
+    def FromTimes(cls, times, passes=1):
+        """
+        A program that is just a list of durations, as for a plain timer
+        """
+
+        default = MetronomeRow()
+        rows = tuple((int(duration), default.bpm, default.emph,
+                      default.skipped) for duration in times)
+
+        return cls(rows, 0, passes, False)
+
+    @property
+    def count(self):
+        """
+        Segments in the program, None if it never ends
+        """
+
+        if len(self.rows) == 0:
+            return 0
+        elif self.passes is None:
+            return None
+
+        return len(self.rows)*self.passes
+
+    def Remaining(self, index):
+        """
+        Segments left once segment index is complete, None if endless
+        """
+
+        count = self.count
+
+        return None if count is None else count - 1 - index
+
+    def Duration(self, index):
+        """
+        Seconds in segment index, 0 past the end
+        """
+
+        count = self.count
+        if index < 0 or (count is not None and index >= count):
+            return 0
+
+        return self.rows[index % len(self.rows)][0]
+
+    def _BPM(self, index):
+        row = self.rows[index % len(self.rows)]
+        bpm = row[1] + (index // len(self.rows))*self.step
+
+        return min(max(bpm, MIN_BPM), MAX_BPM)
+
+    def Segment(self, index):
+        """
+        Returns segment index, or None past the end
+        """
+
+        count = self.count
+        if index < 0 or (count is not None and index >= count):
+            return None
+
+        row = index % len(self.rows)
+        duration, _, emphasis, skipped = self.rows[row]
+        bpm = self._BPM(index)
+
+        ramp = 0.0
+        if self.ramp and (count is None or index + 1 < count):
+            ramp = (self._BPM(index + 1) - bpm) / duration
+
+        return Segment(index, row, duration, bpm, emphasis, skipped, ramp)
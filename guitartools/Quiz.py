@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:48:13 2026
+
+Listening quiz
+
+@author: Ian Spielman
+
+The three listening exercises laid out in Listening.py, each in nine stages
+
+SSR: single sound recognition, name the chord
+CQR: chord quality recognition, name the quality of the chord
+CPR: chord progression recognition, name each chord of a progression
+
+Every answer is recorded against the item it tests (a chord for SSR and CPR,
+a quality for CQR): how often it was asked, how often it was right and the
+mean time taken to answer.  These are updated as each answer comes in, and
+so is the item's weight in a WeightedSampler, so that the next prompt
+favors the items that are most often wrong or slow without rescanning
+anything.
+"""
+
+import random
+import collections
+
+from guitartools.Sampler import WeightedSampler
+from guitartools.Samples import SOUND_STAGES
+
+#
+# Constants
+#
+
+SSR = 'SSR'
+CQR = 'CQR'
+CPR = 'CPR'
+
+MODES = collections.OrderedDict([
+        (SSR, 'Single sound recognition'),
+        (CQR, 'Chord quality recognition'),
+        (CPR, 'Chord progression recognition'),
+        ])
+
+STAGES = 9
+
+ROOTS = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+
+# Power chords, from either the 6th or 5th string
+POWER_CHORDS = [root + '5' for root in ROOTS]
+
+# How each quality is written after the root
+QUALITY_SUFFIXES = {'major': [''], 'minor': ['m'], '7': ['7'],
+                    'maj7': ['maj7'], 'power': ['5'], 'sus': ['sus2', 'sus4']}
+
+# Chord quality recognition: the qualities of each stage, and the root
+# they are played on (None for any root)
+QUALITY_STAGES = [
+        (['major', 'minor'], 'A'),
+        (['major', 'minor'], 'A'),
+        (['major', 'minor'], 'A'),
+        (['major', 'minor', '7'], 'A'),
+        (['major', 'minor', '7'], None),
+        (['major', 'minor', '7'], None),
+        (['major', 'minor', '7'], None),
+        (['major', 'minor', '7', 'maj7', 'power'], None),
+        (['major', 'minor', '7', 'maj7', 'power', 'sus'], None),
+        ]
+
+# Chord progression recognition: the chords of each stage, the possible
+# strums of each chord, how much the tempo may change and the number of
+# chords in a progression
+PROGRESSION_STAGES = [
+        (SOUND_STAGES[0], (1,), 0.0, 3),
+        (SOUND_STAGES[1], (1,), 0.0, 3),
+        (SOUND_STAGES[2], (1,), 0.0, 3),
+        (SOUND_STAGES[3], (1,), 0.0, 4),
+        (SOUND_STAGES[3], (2, 4), 0.0, 4),
+        (SOUND_STAGES[4], (2, 4), 0.0, 4),
+        (SOUND_STAGES[6], (2, 4), 0.25, 4),
+        (POWER_CHORDS, (2, 4), 0.0, 4),
+        (SOUND_STAGES[6], (2, 4), 0.25, 8),
+        ]
+
+# The faster single sound stage, and how much faster it is
+FAST_STAGE = 6
+FAST = 2
+
+# Answer times are measured against this, in seconds
+LATENCY_SCALE = 3.0
+LATENCY_LIMIT = 10.0
+
+
+Prompt = collections.namedtuple('Prompt',
+        ['mode', 'stage', 'progression', 'items', 'choices'])
+Prompt.__doc__ = """
+A quiz question
+
+progression: the (chord, strums, bpm) to play
+items: what each answer is scored against, in order
+choices: the possible answers
+"""
+
+
+class ItemStats():
+    """
+    Running record of the answers for one item
+    """
+
+    __slots__ = ('count', 'correct', 'latency')
+
+    def __init__(self, count=0, correct=0, latency=0.0):
+        self.count = int(count)
+        self.correct = int(correct)
+        self.latency = float(latency)
+
+    def Record(self, correct, latency):
+        self.count += 1
+        self.correct += int(correct)
+
+        # Running mean
+        latency = min(max(latency, 0.0), LATENCY_LIMIT)
+        self.latency += (latency - self.latency) / self.count
+
+    @property
+    def accuracy(self):
+        return self.correct / self.count if self.count > 0 else 0.0
+
+    @property
+    def weight(self):
+        """
+        Chance of being asked: the smoothed error rate, raised for slow
+        answers.  Items never asked count as half right and slow.
+        """
+
+        errors = (self.count - self.correct + 1) / (self.count + 2)
+        latency = self.latency if self.count > 0 else LATENCY_SCALE
+
+        return errors * (1 + latency / LATENCY_SCALE)
+
+    def get_state(self):
+        return {'count': self.count, 'correct': self.correct,
+                'latency': round(self.latency, 3)}
+
+
+class Quiz():
+    """
+    Makes prompts for one mode and stage at a time, and keeps the answer
+    statistics of every mode.
+
+    available(chord) tells us if a chord can be played; by default all can.
+    """
+
+    def __init__(self, available=None, rng=random):
+        self.available = available
+        self.rng = rng
+
+        self.mode = SSR
+        self.stage = 1
+
+        self.stats = {mode: {} for mode in MODES}
+
+        self._candidates = []
+        self._sampler = WeightedSampler()
+
+    #
+    # Stages
+    #
+
+    def _playable(self, chords):
+        if self.available is None:
+            return list(chords)
+
+        return [chord for chord in chords if self.available(chord)]
+
+    def Candidates(self, mode, stage):
+        """
+        The items that may be asked in stage of mode
+        """
+
+        stage = min(max(int(stage), 1), STAGES)
+
+        if mode == CQR:
+            qualities, root = QUALITY_STAGES[stage-1]
+            return [quality for quality in qualities
+                    if len(self._QualityChords(quality, root)) > 0]
+        elif mode == CPR:
+            return self._playable(PROGRESSION_STAGES[stage-1][0])
+        elif stage == 8:
+            return self._playable(POWER_CHORDS)
+        elif stage == 9:
+            return self._playable(SOUND_STAGES[8] + POWER_CHORDS)
+        else:
+            return self._playable(SOUND_STAGES[stage-1])
+
+    def _QualityChords(self, quality, root):
+        roots = ROOTS if root is None else [root]
+
+        return self._playable([r + suffix for r in roots
+                               for suffix in QUALITY_SUFFIXES[quality]])
+
+    def SetStage(self, mode, stage):
+        """
+        Start asking prompts from stage of mode
+        """
+
+        if mode not in MODES:
+            raise KeyError(mode)
+
+        self.mode = mode
+        self.stage = min(max(int(stage), 1), STAGES)
+
+        self._candidates = self.Candidates(self.mode, self.stage)
+
+        stats = self.stats[self.mode]
+        self._sampler.Build({item: stats.get(item, ItemStats()).weight
+                             for item in self._candidates})
+
+    #
+    # Prompts and answers
+    #
+
+    def _Draw(self):
+        item = self._sampler.Sample(self.rng)
+        if item is None:
+            item = self.rng.choice(self._candidates)
+
+        return item
+
+    def Next(self, chordtime=2.0):
+        """
+        Returns the next Prompt, each chord of it lasting about chordtime
+        seconds, or None if there is nothing to ask
+        """
+
+        if len(self._candidates) == 0:
+            return None
+
+        if self.mode == SSR:
+            chord = self._Draw()
+            if self.stage == FAST_STAGE:
+                chordtime /= FAST
+            progression = [(chord, 1, 60/chordtime)]
+            items = [chord]
+        elif self.mode == CQR:
+            quality = self._Draw()
+            chord = self.rng.choice(self._QualityChords(
+                    quality, QUALITY_STAGES[self.stage-1][1]))
+            progression = [(chord, 1, 60/chordtime)]
+            items = [quality]
+        else:
+            chords, strums, variation, length = \
+                PROGRESSION_STAGES[self.stage-1]
+
+            items = [self._Draw() for i in range(length)]
+            progression = []
+            for chord in items:
+                count = self.rng.choice(strums)
+                time = chordtime * self.rng.uniform(1-variation, 1+variation)
+                progression.append((chord, count, 60*count/time))
+
+        return Prompt(self.mode, self.stage, progression, items,
+                      sorted(self._candidates))
+
+    def Answer(self, prompt, answers, latency):
+        """
+        Score answers to prompt, given latency seconds after it started.
+        Returns whether each answer was right.
+        """
+
+        stats = self.stats[prompt.mode]
+
+        # The time per answer, for progressions
+        latency = latency / max(len(prompt.items), 1)
+
+        results = []
+        for item, answer in zip(prompt.items, answers):
+            correct = item == answer
+            results.append(correct)
+
+            record = stats.get(item, None)
+            if record is None:
+                record = stats[item] = ItemStats()
+            record.Record(correct, latency)
+
+            if prompt.mode == self.mode and item in self._sampler:
+                self._sampler[item] = record.weight
+
+        return results
+
+    #
+    # State
+    #
+
+    def Summary(self, mode=None):
+        """
+        Returns (item, count, accuracy, latency) for every item of mode
+        asked so far, weakest first
+        """
+
+        if mode is None:
+            mode = self.mode
+
+        return [(item, record.count, record.accuracy, record.latency)
+                for item, record in sorted(self.stats[mode].items(),
+                                           key=lambda x: -x[1].weight)]
+
+    def get_state(self):
+        return {mode: {item: record.get_state()
+                       for item, record in stats.items()}
+                for mode, stats in self.stats.items()}
+
+    def set_state(self, state):
+        self.stats = {mode: {} for mode in MODES}
+
+        for mode, stats in state.items():
+            if mode not in MODES:
+                continue
+            for item, record in stats.items():
+                try:
+                    self.stats[mode][item] = ItemStats(**record)
+                except (TypeError, ValueError):
+                    continue
+
+        self.SetStage(self.mode, self.stage)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:20:37 2026
+
+Weighted random selection
+
+@author: Ian Spielman
+
+A weighted sampler backed by a Fenwick (binary indexed) tree, so that both
+changing the weight of one item and drawing an item take O(log n) rather
+than a pass over every item.
+
+AgeSampler weights every item by its age instead, which grows by the same
+amount for every item as time advances, so that nothing needs updating
+when it does.
+"""
+
+import random
+
+
+def FenwickTree(values):
+    """
+    Returns the Fenwick tree (indexed from 1) of the list values in O(n)
+    """
+
+    size = len(values)
+    tree = [0.0] + list(values)
+    for i in range(1, size+1):
+        parent = i + (i & -i)
+        if parent <= size:
+            tree[parent] += tree[i]
+
+    return tree
+
+
+class WeightedSampler():
+    """
+    Draw keys at random with probability proportional to their weight
+
+    sampler = WeightedSampler({'a': 1.0, 'b': 3.0})
+    sampler['c'] = 0.5
+    key = sampler.Sample()
+    """
+
+    def __init__(self, weights=None):
+        self.Clear()
+
+        if weights is not None:
+            self.Build(weights)
+
+    def Clear(self):
+        self._slots = {}
+        self._keys = []
+        self._weights = []
+        self._tree = [0.0]
+        self._free = []
+
+    def Build(self, weights):
+        """
+        Replace the contents with the dictionary of weights in O(n)
+        """
+
+        self._slots = {}
+        self._keys = []
+        self._weights = []
+        self._free = []
+
+        for key, weight in weights.items():
+            self._slots[key] = len(self._keys)
+            self._keys.append(key)
+            self._weights.append(float(weight))
+
+        self._rebuild(len(self._keys))
+
+    def _rebuild(self, capacity):
+        """
+        Rebuild the tree with room for capacity slots
+        """
+
+        size = 1
+        while size < capacity:
+            size *= 2
+
+        # New slots are free, lowest first
+        self._free.extend(range(size-1, len(self._keys)-1, -1))
+
+        self._keys.extend([None]*(size - len(self._keys)))
+        self._weights.extend([0.0]*(size - len(self._weights)))
+
+        self._tree = FenwickTree(self._weights)
+
+    @staticmethod
+    def _addto(tree, slot, delta):
+        i = slot + 1
+        size = len(tree) - 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def _add(self, slot, delta):
+        self._addto(self._tree, slot, delta)
+
+    def _node(self, index):
+        """
+        Sum of the weights covered by node index of the tree
+        """
+        return self._tree[index]
+
+    def _weight(self, slot):
+        return self._weights[slot]
+
+    #
+    # dictionary like access
+    #
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def __getitem__(self, key):
+        return self._weights[self._slots[key]]
+
+    def __setitem__(self, key, weight):
+        weight = float(weight)
+
+        slot = self._slots.get(key, None)
+        if slot is None:
+            if len(self._free) == 0:
+                self._rebuild(len(self._keys) + 1)
+
+            slot = self._free.pop()
+            self._slots[key] = slot
+            self._keys[slot] = key
+
+        self._add(slot, weight - self._weights[slot])
+        self._weights[slot] = weight
+
+    def __delitem__(self, key):
+        slot = self._slots.pop(key)
+
+        self._add(slot, -self._weights[slot])
+        self._weights[slot] = 0.0
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def get(self, key, default=None):
+        slot = self._slots.get(key, None)
+        if slot is None:
+            return default
+
+        return self._weights[slot]
+
+    def pop(self, key, default=None):
+        weight = self.get(key, default)
+        if key in self._slots:
+            del self[key]
+
+        return weight
+
+    #
+    # Sampling
+    #
+
+    @property
+    def total(self):
+        """
+        Sum of all weights
+        """
+
+        total = 0.0
+        i = len(self._tree) - 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+
+        return total
+
+    def Find(self, value):
+        """
+        Returns the key at which the running sum of weights passes value
+        """
+
+        position = 0
+        size = len(self._tree) - 1
+        step = 1
+        while step*2 <= size:
+            step *= 2
+
+        while step > 0:
+            index = position + step
+            if index <= size:
+                node = self._node(index)
+                if node <= value:
+                    position = index
+                    value -= node
+            step //= 2
+
+        # Guard against round off walking us past the last weighted slot
+        while position > 0 and (position >= size or
+                                self._keys[position] is None or
+                                self._weight(position) <= 0):
+            position -= 1
+
+        return self._keys[position]
+
+    def Sample(self, rng=random):
+        """
+        Returns a random key with probability proportional to its weight,
+        or None if the total weight is zero
+        """
+
+        total = self.total
+        if total <= 0:
+            return None
+
+        return self.Find(total * rng.random())
+
+
+class AgeSampler(WeightedSampler):
+    """
+    Draw keys at random with probability proportional to their age,
+    now - birth.  The value stored for each key is its birth, so advancing
+    now ages every key at once without touching the tree: a second tree
+    counts the keys, and the ages of any run of slots sum to now*count
+    minus the sum of their births.
+
+    sampler = AgeSampler({'a': 0, 'b': -3}, now=1)
+    sampler.now += 1
+    key = sampler.Sample()
+    """
+
+    def __init__(self, births=None, now=0):
+        self.now = now
+
+        super().__init__(births)
+
+    def Clear(self):
+        super().Clear()
+        self._counts = [0.0]
+
+    def _rebuild(self, capacity):
+        super()._rebuild(capacity)
+
+        self._counts = FenwickTree([0.0 if key is None else 1.0
+                                    for key in self._keys])
+
+    def __setitem__(self, key, birth):
+        new = key not in self._slots
+
+        super().__setitem__(key, birth)
+
+        if new:
+            self._addto(self._counts, self._slots[key], 1.0)
+
+    def __delitem__(self, key):
+        slot = self._slots[key]
+
+        super().__delitem__(key)
+
+        self._addto(self._counts, slot, -1.0)
+
+    def _node(self, index):
+        return self.now*self._counts[index] - self._tree[index]
+
+    def _weight(self, slot):
+        if self._keys[slot] is None:
+            return 0.0
+
+        return self.now - self._weights[slot]
+
+    def Age(self, key):
+        return self.now - self[key]
+
+    @property
+    def total(self):
+        """
+        Sum of all ages
+        """
+
+        return self.now*len(self) - super().total
@@ -0,0 +1,662 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 15:24:09 2026
+
+Chord samples
+
+@author: Ian Spielman
+
+The Chords directory holds .wav recordings of chords, named after the chord
+(Am.wav, with _ for / as in D_F#.wav).  Further takes of the same chord are
+numbered (Am_2.wav) or kept in subdirectories, for example one per guitar.
+
+SampleIndex describes every sample: its chord, root, quality and listening
+stages, and the format and location of its PCM data.  The index is kept in
+the user's cache directory (or failing that in __pycache__ in the Chords
+directory, which may not be writable once installed) and reused as long as
+the modification times of the directories match, so only new or changed
+files are opened.
+The PCM data is then memory mapped, so only the pages that are played are
+ever read; samples already in our output format are used without a copy.
+
+SampleLibrary holds these samples in a SamplePool, bounded in memory and
+dropping the least recently used samples first.  ProgressionSchedule queues
+strums of these samples on a sample accurate grid and is rendered into one
+long-lived QAudioOutput through Audio.StreamDevice, so a quiz plays without
+gaps and without decoding anything while it plays.
+"""
+
+import os
+import re
+import json
+import struct
+import hashlib
+import random
+import collections
+
+import numpy as np
+
+from PyQt5 import QtCore
+
+from guitartools.Audio import SAMPLE_RATE
+from guitartools.Support import LocalPath
+
+#
+# Constants
+#
+
+# A take number at the end of a file name: Am_2.wav
+TAKE_SUFFIX = re.compile(r'_\d+$')
+
+# Root, quality and bass note of a chord name
+CHORD_NAME = re.compile(r'^([A-G][#b]?)([^/]*)(?:/(.+))?$')
+
+# Chord qualities, by the text following the root
+QUALITIES = {'': 'major', 'm': 'minor', '7': '7', 'maj7': 'maj7', 
+             'm7': 'm7', '5': 'power', 'sus2': 'sus', 'sus4': 'sus'}
+
+# Chords of each single sound recognition stage, see Listening.py.  Stage 8
+# is every power chord, and stage 9 adds them to the named chords.
+SOUND_STAGES = [
+        ['D', 'A', 'E'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C', 'G7', 'C7', 'B7', 
+         'Fmaj7'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C', 'G7', 'C7', 'B7', 'D7', 
+         'E7', 'A7', 'Fmaj7'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C', 'G7', 'C7', 'B7', 'D7', 
+         'E7', 'A7', 'Fmaj7'],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C', 'G7', 'C7', 'B7', 'D7', 
+         'E7', 'A7', 'Fmaj7', 'F'],
+        [],
+        ['E', 'A', 'D', 'Em', 'Am', 'Dm', 'G', 'C', 'G7', 'C7', 'B7', 'D7', 
+         'E7', 'A7', 'Fmaj7', 'F', 'Asus2', 'Asus4', 'Dsus2', 'Dsus4', 
+         'Esus4', 'G/B', 'C/G', 'D/F#'],
+        ]
+POWER_STAGES = [8, 9]
+
+# WAVE format codes
+WAVE_PCM = 1
+WAVE_FLOAT = 3
+WAVE_EXTENSIBLE = 0xFFFE
+
+# Bump if the index layout changes
+INDEX_VERSION = 1
+
+# Default memory for decoded samples
+POOL_BYTES = 64 * 2**20
+
+# A strum cuts off the chord still ringing over this many seconds
+CHOKE_SECONDS = 0.02
+
+# Time from queueing a progression on an idle stream to its first strum
+LEAD_SECONDS = 0.1
+
+
+def ChordName(filename):
+    """
+    The chord a sample file is a recording of
+    """
+
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return TAKE_SUFFIX.sub('', name).replace('_', '/')
+
+
+def ChordParts(name):
+    """
+    Returns the root and quality of chord name, which are None if it is
+    not understood
+    """
+
+    match = CHORD_NAME.match(name.replace(' ', ''))
+    if match is None:
+        return None, None
+
+    return match.group(1), QUALITIES.get(match.group(2), None)
+
+
+def ChordStages(name, quality):
+    """
+    The single sound recognition stages that chord name is part of
+    """
+
+    name = name.replace(' ', '')
+    stages = [i+1 for i, chords in enumerate(SOUND_STAGES) if name in chords]
+
+    if quality == 'power':
+        stages = sorted(set(stages + POWER_STAGES))
+
+    return stages
+
+
+def ReadWaveHeader(path):
+    """
+    Returns (format, sample_rate, channels, width, frames, offset) of the
+    .wav file path, where offset is the location of the PCM data
+    """
+
+    with open(path, 'rb') as f:
+        riff, size, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError("Not a .wav file: " + path)
+
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError("No data in " + path)
+
+            name, size = struct.unpack('<4sI', chunk)
+            if name == b'fmt ':
+                data = f.read(size)
+                code, channels, rate, _, _, bits = struct.unpack_from(
+                        '<HHIIHH', data)
+                if code == WAVE_EXTENSIBLE and len(data) >= 26:
+                    code, = struct.unpack_from('<H', data, 24)
+                fmt = (code, rate, channels, bits // 8)
+            elif name == b'data':
+                if fmt is None:
+                    raise ValueError("No format before data in " + path)
+                code, rate, channels, width = fmt
+                # Recorders that crashed leave the size too large
+                offset = f.tell()
+                size = min(size, os.fstat(f.fileno()).st_size - offset)
+                frames = size // max(channels*width, 1)
+                return (code, rate, channels, width, frames, offset)
+            else:
+                f.seek(size, os.SEEK_CUR)
+
+            # Chunks are word aligned
+            if size % 2 == 1:
+                f.seek(1, os.SEEK_CUR)
+
+
+SampleEntry = collections.namedtuple('SampleEntry', 
+        ['path', 'mtime', 'size', 'name', 'root', 'quality', 'stages', 
+         'format', 'sample_rate', 'channels', 'width', 'frames', 'offset'])
+
+
+def MakeEntry(path, stat=None):
+    """
+    Returns the SampleEntry of the .wav file path
+    """
+
+    if stat is None:
+        stat = os.stat(path)
+
+    name = ChordName(path)
+    root, quality = ChordParts(name)
+
+    return SampleEntry(path, stat.st_mtime_ns, stat.st_size, name, root, 
+                       quality, ChordStages(name, quality), 
+                       *ReadWaveHeader(path))
+
+
+def MapSamples(entry, sample_rate=SAMPLE_RATE):
+    """
+    Returns the samples of entry as a read-only mono int16 array at 
+    sample_rate.  If the file is already in that format this is a memory
+    map of it, otherwise it is converted from one.
+    """
+
+    if entry.frames == 0:
+        return np.zeros(0, dtype=np.int16)
+
+    if entry.format == WAVE_FLOAT and entry.width in (4, 8):
+        dtype = '<f{}'.format(entry.width)
+    elif entry.format != WAVE_PCM:
+        raise ValueError("Unsupported format {} in {}".format(
+                entry.format, entry.path))
+    elif entry.width == 1:
+        dtype = np.uint8
+    elif entry.width in (2, 4):
+        dtype = '<i{}'.format(entry.width)
+    elif entry.width == 3:
+        dtype = (np.uint8, 3)
+    else:
+        raise ValueError("Unsupported sample width {} in {}".format(
+                entry.width, entry.path))
+
+    data = np.memmap(entry.path, dtype=dtype, mode='r', offset=entry.offset,
+                     shape=(entry.frames, entry.channels))
+
+    if (dtype == '<i2' and entry.channels == 1 and 
+            entry.sample_rate == sample_rate):
+        return data[:, 0]
+
+    if entry.format == WAVE_FLOAT:
+        samples = data * (2**15-1)
+    elif entry.width == 1:
+        samples = (data.astype(np.int32) - 128) << 8
+    elif entry.width == 3:
+        raw = data.astype(np.int32)
+        samples = (raw[..., 0] | (raw[..., 1] << 8) | (raw[..., 2] << 16)) << 8 >> 16
+    elif entry.width == 4:
+        samples = data >> 16
+    else:
+        samples = data
+
+    samples = samples.mean(axis=1)
+
+    if entry.sample_rate != sample_rate and len(samples) > 1:
+        count = int(round(len(samples) * sample_rate / entry.sample_rate))
+        samples = np.interp(np.arange(count) * entry.sample_rate / sample_rate,
+                            np.arange(len(samples)),
+                            samples)
+
+    samples = np.clip(np.round(samples), -2**15, 2**15-1).astype(np.int16)
+    samples.setflags(write=False)
+
+    return samples
+
+
+class SampleIndex():
+    """
+    SampleEntry for every .wav file in directory, by path
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.entries = {}
+
+    @staticmethod
+    def CachePaths(directory):
+        """
+        Where the index of directory may be kept, best first: the user's
+        cache, by the path of directory, then directory itself
+        """
+
+        directory = os.path.abspath(directory)
+        paths = []
+
+        cache = QtCore.QStandardPaths.writableLocation(
+                QtCore.QStandardPaths.GenericCacheLocation)
+        if cache:
+            key = hashlib.sha1(directory.encode('utf-8')).hexdigest()
+            paths.append(os.path.join(cache, 'guitartools', 'samples',
+                                      '{}.index.json'.format(key)))
+
+        paths.append(os.path.join(directory, '__pycache__',
+                                  'samples.index.json'))
+
+        return paths
+
+    @classmethod
+    def _read(cls, directory):
+        """
+        The first index of directory that can be read, or None
+        """
+
+        for path in cls.CachePaths(directory):
+            try:
+                with open(path, 'r') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            if isinstance(cache, dict) and cache.get('version') == INDEX_VERSION:
+                return cache
+
+        return None
+
+    def _directories(self):
+        """
+        Modification time of every directory, by path relative to ours
+        """
+
+        directories = {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            directories[os.path.relpath(root, self.directory)] = \
+                os.stat(root).st_mtime_ns
+
+        return directories
+
+    def Load(self):
+        """
+        Read the index, updating it if any directory has changed since it 
+        was written
+        """
+
+        directories = self._directories()
+
+        try:
+            cache = self._read(self.directory)
+            if cache is None:
+                raise ValueError
+            entries = {}
+            for fields in cache['samples']:
+                entry = SampleEntry(*fields)
+                path = os.path.join(self.directory, entry.path)
+                entries[path] = entry._replace(path=path)
+        except (OSError, ValueError, KeyError, TypeError):
+            cache = {'directories': None}
+            entries = {}
+
+        if cache['directories'] == directories:
+            self.entries = entries
+            return
+
+        # Only open files that are new or changed
+        self.entries = {}
+        for relative in directories:
+            root = os.path.join(self.directory, relative)
+            for filename in sorted(os.listdir(root)):
+                if not filename.lower().endswith('.wav'):
+                    continue
+
+                path = os.path.normpath(os.path.join(root, filename))
+                try:
+                    self.entries[path] = self.Refresh(entries.get(path, None), 
+                                                      path)
+                except (OSError, ValueError, struct.error):
+                    continue
+
+        self.Save(directories)
+
+    def Refresh(self, entry, path=None):
+        """
+        Returns entry, read again if its file has changed
+        """
+
+        if path is None:
+            path = entry.path
+
+        stat = os.stat(path)
+        if (entry is not None and entry.mtime == stat.st_mtime_ns and 
+                entry.size == stat.st_size):
+            return entry
+
+        entry = MakeEntry(path, stat)
+        self.entries[path] = entry
+
+        return entry
+
+    def Save(self, directories):
+        """
+        Write the index, if we can
+        """
+
+        samples = [list(entry._replace(
+                path=os.path.relpath(entry.path, self.directory)))
+                   for entry in self.entries.values()]
+
+        for path in self.CachePaths(self.directory):
+            temp = path + '.tmp'
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(temp, 'w') as f:
+                    json.dump({'version': INDEX_VERSION, 
+                               'directories': directories, 
+                               'samples': samples}, f)
+                os.replace(temp, path)
+            except OSError:
+                continue
+
+            return
+
+
+class SamplePool():
+    """
+    Samples by path, holding at most max_bytes and dropping the least 
+    recently used first.  The most recent sample is always kept, even if it
+    alone is larger than max_bytes.  Memory mapped samples count at their 
+    full size, which also bounds the number of open maps.
+    """
+
+    def __init__(self, decode, max_bytes=POOL_BYTES):
+        self._decode = decode
+        self._samples = collections.OrderedDict()
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._samples)
+
+    def __contains__(self, path):
+        return path in self._samples
+
+    def Get(self, path):
+        samples = self._samples.get(path, None)
+
+        if samples is not None:
+            self._samples.move_to_end(path)
+            return samples
+
+        samples = self._decode(path)
+        self._samples[path] = samples
+        self.nbytes += samples.nbytes
+
+        while self.nbytes > self.max_bytes and len(self._samples) > 1:
+            _, dropped = self._samples.popitem(last=False)
+            self.nbytes -= dropped.nbytes
+
+        return samples
+
+    def Clear(self):
+        self._samples.clear()
+        self.nbytes = 0
+
+
+class SampleLibrary():
+    """
+    All the chord samples in directory
+    """
+
+    def __init__(self, directory=None, max_bytes=POOL_BYTES):
+        if directory is None:
+            directory = LocalPath('Chords')
+
+        self.directory = directory
+        self.index = SampleIndex(directory)
+        self.pool = SamplePool(self._map, max_bytes=max_bytes)
+
+        self._takes = None
+
+    def Index(self):
+        """
+        Find every sample.  Only done once, call again to rescan.
+        """
+
+        self.index = SampleIndex(self.directory)
+        self.index.Load()
+        self.pool.Clear()
+
+        takes = collections.defaultdict(list)
+        for path, entry in sorted(self.index.entries.items()):
+            takes[entry.name].append(path)
+
+        self._takes = dict(takes)
+
+    def _map(self, path):
+        return MapSamples(self.index.Refresh(self.index.entries[path]))
+
+    def Entries(self, name):
+        """
+        SampleEntry of every take of chord name
+        """
+        return [self.index.entries[path] for path in self.takes.get(name, [])]
+
+    def Stage(self, stage):
+        """
+        Names of the chords we have samples of in a single sound 
+        recognition stage
+        """
+        return sorted({entry.name for entry in self.index.entries.values()
+                       if stage in entry.stages})
+
+    @property
+    def takes(self):
+        if self._takes is None:
+            self.Index()
+
+        return self._takes
+
+    @property
+    def names(self):
+        """
+        Names of the chords we have samples of
+        """
+        return sorted(self.takes)
+
+    def __contains__(self, name):
+        return name in self.takes
+
+    def Sample(self, name, rng=random, bpm=None):
+        """
+        Returns the samples of a random take of chord name.  Recordings are
+        the same at any tempo bpm.
+        """
+
+        return self.pool.Get(rng.choice(self.takes[name]))
+
+    def Preload(self, chords):
+        """
+        Decode every take of the chords, (name, bpm) pairs, as far as the 
+        pool has room for them
+        """
+
+        for name in {name for name, bpm in chords}:
+            for path in self.takes.get(name, []):
+                self.pool.Get(path)
+
+
+class ProgressionSchedule():
+    """
+    Sample accurate schedule of strums for the streaming chord output.
+
+    Queue(progression) adds strums after the ones already queued; each
+    element of a progression is (chord, strums, bpm), that is the chord is
+    strummed strums times at bpm.  The samples are fetched from the library
+    when queued, so render() only mixes.
+
+    A new strum chokes the chord still ringing, as the strumming hand does.
+    The start of every element of the progression is queued in self.prompts
+    as (sample, number, chord) so the GUI can follow the audio clock.
+    """
+
+    def __init__(self, library, sample_rate=SAMPLE_RATE):
+        self.library = library
+        self.sample_rate = sample_rate
+
+        self._choke = int(CHOKE_SECONDS*sample_rate)
+        self._lead = int(LEAD_SECONDS*sample_rate)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Drop everything queued and restart at sample zero
+        """
+
+        self._position = 0
+        self._cursor = 0.0
+        self._count = 0
+        self._strums = collections.deque()
+        self._tail = np.zeros(0, dtype=np.int32)
+        self.prompts = collections.deque()
+
+    @property
+    def position(self):
+        """
+        Number of samples rendered so far
+        """
+        return self._position
+
+    @property
+    def end(self):
+        """
+        Sample at which the last queued strum starts
+        """
+        return int(round(self._cursor))
+
+    @property
+    def idle(self):
+        """
+        True once everything queued has been played out
+        """
+        return len(self._strums) == 0 and len(self._tail) == 0
+
+    def Queue(self, progression, rng=random):
+        """
+        Queue the (chord, strums, bpm) elements of progression, returns
+        the prompt numbers given to them
+        """
+
+        # Don't try to start in the past
+        self._cursor = max(self._cursor, float(self._position + self._lead))
+
+        numbers = []
+        for chord, strums, bpm in progression:
+            period = 60 * self.sample_rate / max(bpm, 1)
+
+            self.prompts.append((int(round(self._cursor)), self._count, chord))
+            numbers.append(self._count)
+            self._count += 1
+
+            for i in range(strums):
+                self._strums.append((int(round(self._cursor)),
+                                     self.library.Sample(chord, rng, bpm)))
+                self._cursor += period
+
+        return numbers
+
+    def _chokeFrom(self, out, offset):
+        """
+        Fade out whatever is sounding in out from offset on, and its tail
+        """
+
+        ringing = np.concatenate((out[offset:], self._tail))
+        fade = min(self._choke, len(ringing))
+        ringing[:fade] = ringing[:fade] * np.linspace(1, 0, fade)
+        ringing[fade:] = 0
+
+        out[offset:] = ringing[:len(out) - offset]
+        self._tail = ringing[len(out) - offset:][:fade]
+
+    def render(self, frames):
+        """
+        Render the next frames samples as int16
+        """
+
+        start = self._position
+        stop = start + frames
+
+        out = np.zeros(frames, dtype=np.int32)
+
+        # Remainder of strums started in earlier buffers
+        carried = min(len(self._tail), frames)
+        out[:carried] += self._tail[:carried]
+        self._tail = self._tail[carried:]
+
+        while len(self._strums) > 0 and self._strums[0][0] < stop:
+            strum, sound = self._strums.popleft()
+            offset = max(strum - start, 0)
+
+            self._chokeFrom(out, offset)
+
+            inside = min(len(sound), frames - offset)
+            out[offset:offset+inside] += sound[:inside]
+
+            overflow = sound[inside:]
+            if len(overflow) > len(self._tail):
+                self._tail = np.pad(self._tail,
+                                    (0, len(overflow) - len(self._tail)))
+            self._tail[:len(overflow)] += overflow
+
+        self._position = stop
+
+        return np.clip(out, -2**15, 2**15-1).astype(np.int16)
+
+    def PopPrompts(self, position):
+        """
+        Remove and return the queued prompts at or before sample position
+        """
+
+        prompts = []
+        while len(self.prompts) > 0 and self.prompts[0][0] <= position:
+            prompts.append(self.prompts.popleft())
+
+        return prompts
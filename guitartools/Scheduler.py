@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:21:09 2026
+
+Spaced repetition
+
+@author: Ian Spielman
+
+An SM-2 style scheduler for chord change pairs.  Each pair has a memory:
+its stability (the days until it should be practiced again), an ease that
+stability grows by after each good attempt, and the time it is due.  An
+attempt is graded against the goal (0 to 5, 3 or more is a pass); a pass
+lengthens the stability and a fail resets it to a day.  Attempts made
+before the pair is due, such as the repeats of one timer session, only
+count if they fail.
+
+The pairs sit in a heap ordered by due time, so the pair to practice now
+is at the top, and recording an attempt reschedules one pair in
+O(log n).  Pairs that were never attempted are due when they are added.
+"""
+
+import time
+import heapq
+import itertools
+
+#
+# Constants
+#
+
+DAY = 24*60*60
+
+# SM-2 ease: initial and smallest
+EASE = 2.5
+MIN_EASE = 1.3
+
+# Stability after the first and second passes, in days
+FIRST_STABILITY = 1
+SECOND_STABILITY = 6
+
+
+def Grade(changes, goal):
+    """
+    SM-2 grade, 0 to 5, of an attempt of changes against the goal
+    """
+
+    return min(int(5 * changes / max(goal, 1)), 5)
+
+
+class PairMemory():
+    """
+    Spaced repetition state of one pair
+    """
+
+    __slots__ = ('repetitions', 'stability', 'ease', 'due')
+
+    def __init__(self, due=0.0):
+        self.repetitions = 0
+        self.stability = 0
+        self.ease = EASE
+        self.due = due
+
+    def Review(self, grade, when):
+        """
+        Update with an attempt graded grade at time when (in seconds)
+        """
+
+        if grade >= 3:
+            if when < self.due:
+                # Practiced early: no news
+                return
+
+            if self.repetitions == 0:
+                self.stability = FIRST_STABILITY
+            elif self.repetitions == 1:
+                self.stability = SECOND_STABILITY
+            else:
+                self.stability = round(self.stability * self.ease)
+            self.repetitions += 1
+        else:
+            self.repetitions = 0
+            self.stability = FIRST_STABILITY
+
+        self.ease = max(self.ease + 0.1 - (5-grade)*(0.08 + (5-grade)*0.02),
+                        MIN_EASE)
+        self.due = when + self.stability*DAY
+
+
+class ReviewScheduler():
+    """
+    Pairs of chords ordered by when they are due
+
+    scheduler.Build(history, pairs, goal)
+    key = scheduler.Next()
+    scheduler.Review(key, changes, time.time())
+    """
+
+    # Marks a heap entry that has been superseded
+    REMOVED = None
+
+    def __init__(self, goal=1):
+        self.goal = goal
+        self.Clear()
+
+    def Clear(self):
+        self._memory = {}
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def Memory(self, key):
+        return self._memory.get(key, None)
+
+    def _Remember(self, record, now):
+        """
+        The memory of a pair from its attempts, or a new one due now
+        """
+
+        if record is None or len(record) == 0:
+            return PairMemory(now)
+
+        # Replayed from the start, so that no attempt counts as early
+        memory = PairMemory(float('-inf'))
+        for stamp, changes in zip(record.stamps, record.changes):
+            memory.Review(Grade(changes, self.goal), stamp)
+
+        return memory
+
+    def Build(self, history, pairs, goal=None, now=None):
+        """
+        Replace the contents with pairs, replaying their attempts from
+        history
+        """
+
+        if goal is not None:
+            self.goal = goal
+        if now is None:
+            now = time.time()
+
+        self.Clear()
+
+        for key in pairs:
+            self._memory[key] = memory = self._Remember(history.Pair(*key),
+                                                        now)
+            entry = [memory.due, next(self._counter), key]
+            self._entries[key] = entry
+            self._heap.append(entry)
+
+        heapq.heapify(self._heap)
+
+    def _Push(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = self.REMOVED
+
+        entry = [self._memory[key].due, next(self._counter), key]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+        # Don't let superseded entries pile up
+        if len(self._heap) > 2*len(self._entries) + 64:
+            self._heap = [entry for entry in self._heap
+                          if entry[-1] is not self.REMOVED]
+            heapq.heapify(self._heap)
+
+    def Add(self, key, history, now=None):
+        """
+        Schedule the pair key, replaying its attempts from history
+        """
+
+        if key in self._entries:
+            return
+
+        if now is None:
+            now = time.time()
+
+        self._memory[key] = self._Remember(history.Pair(*key), now)
+        self._Push(key)
+
+    def Remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = self.REMOVED
+            del self._memory[key]
+
+    def Review(self, key, changes, when=None):
+        """
+        Record an attempt of the pair key made at time when (in seconds)
+        """
+
+        memory = self._memory.get(key, None)
+        if memory is None:
+            return
+
+        if when is None:
+            when = time.time()
+
+        due = memory.due
+        memory.Review(Grade(changes, self.goal), when)
+
+        if memory.due != due:
+            self._Push(key)
+
+    def Next(self):
+        """
+        Returns the pair that is most overdue (or due soonest), or None
+        """
+
+        heap = self._heap
+        while len(heap) > 0 and heap[0][-1] is self.REMOVED:
+            heapq.heappop(heap)
+
+        if len(heap) == 0:
+            return None
+
+        return heap[0][-1]
+
+    def Plan(self, count):
+        """
+        Returns the (key, due) of the count pairs due soonest, in order
+        """
+
+        entries = heapq.nsmallest(count, (entry for entry in self._heap
+                                          if entry[-1] is not self.REMOVED))
+
+        return [(entry[-1], entry[0]) for entry in entries]
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:02:51 2026
+
+Binary practice snapshot
+
+@author: Ian Spielman
+
+The .ini file remains the human-readable record of everything, but parsing
+the four levels of nested sections of a long changes history is slow.  So
+each time the .ini is written we also write <file>.ini.snapshot, a binary
+file laid out as
+
+magic (8 bytes)
+header length (8 byte unsigned int)
+JSON header
+columns, each aligned to 8 bytes
+
+The header holds the size and modification time of the .ini it was written
+with, all of the state except the changes history, and the location of each
+column of the history (see ChordHistory.ToColumns).  On load the file is
+memory mapped and the columns are read straight out of it.  If the .ini has
+been changed since (for example edited by hand) the snapshot is ignored.
+"""
+
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+
+from guitartools.History import ChordHistory
+
+MAGIC = b'GTSNAP01'
+HEADER = struct.Struct('<8sQ')
+ALIGN = 8
+
+# Location of the history in the state
+SECTION = 'changes'
+KEY = 'history'
+
+
+def SnapshotPath(filename):
+    return filename + '.snapshot'
+
+
+def _IniStamp(filename):
+    stat = os.stat(filename)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def WriteSnapshot(filename, state, history):
+    """
+    Write the snapshot for the .ini file filename, which must already have
+    been written from state.  history is the ChordHistory.ToColumns layout
+    of state[SECTION][KEY].
+    """
+
+    # Everything but the history goes in the header
+    state = dict(state)
+    if SECTION in state:
+        state[SECTION] = {k: v for k, v in state[SECTION].items() if k != KEY}
+
+    times = '\n'.join(history['times']).encode('utf-8')
+
+    data = {'pairs': history['pairs'],
+            'offsets': history['offsets'],
+            'changes': history['changes'],
+            'stamps': history['stamps'],
+            'times': array.array('B', times)}
+
+    header = {'ini': _IniStamp(filename),
+              'byteorder': sys.byteorder,
+              'state': state,
+              'chords': history['chords'],
+              'extra': history['extra'],
+              'columns': {}}
+
+    # Column offsets are relative to the end of the header
+    offset = 0
+    for name, column in data.items():
+        header['columns'][name] = [column.typecode, offset, len(column)]
+        offset += len(column) * column.itemsize
+        offset += -offset % ALIGN
+
+    header = json.dumps(header).encode('utf-8')
+    header += b' ' * (-(HEADER.size + len(header)) % ALIGN)
+
+    path = SnapshotPath(filename)
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(header)))
+        f.write(header)
+        for column in data.values():
+            column.tofile(f)
+            f.write(b'\0' * (-len(column) * column.itemsize % ALIGN))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp, path)
+
+
+def ReadSnapshot(filename):
+    """
+    Returns the state stored in the snapshot of the .ini file filename, with
+    the history as a ChordHistory, or None if there is no usable snapshot.
+    """
+
+    path = SnapshotPath(filename)
+
+    try:
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+
+            magic, length = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                return None
+
+            start = HEADER.size + length
+            header = json.loads(mm[HEADER.size:start].decode('utf-8'))
+
+            if (header['ini'] != _IniStamp(filename) or
+                    header['byteorder'] != sys.byteorder):
+                return None
+
+            columns = {}
+            view = memoryview(mm)
+            try:
+                for name, (typecode, offset, count) in header['columns'].items():
+                    column = array.array(typecode)
+                    offset += start
+                    column.frombytes(
+                            view[offset:offset + count*column.itemsize])
+                    columns[name] = column
+            finally:
+                view.release()
+
+        times = columns['times'].tobytes().decode('utf-8')
+        times = times.split('\n') if len(times) > 0 else []
+
+        history = ChordHistory.FromColumns(header['chords'],
+                                           columns['pairs'],
+                                           columns['offsets'],
+                                           columns['changes'],
+                                           times,
+                                           header['extra'],
+                                           columns.get('stamps', None))
+
+    except (OSError, ValueError, KeyError, TypeError, IndexError,
+            struct.error):
+        return None
+
+    state = header['state']
+    state.setdefault(SECTION, {})[KEY] = history
+
+    return state
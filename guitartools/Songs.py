@@ -16,8 +16,9 @@ This file provides random selector of songs to practice on a daily basis
 
 import random
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, QTableWidgetFixed, strtobool
-from PyQt5 import QtWidgets, QtCore
+from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, QTableViewFixed
+from guitartools.Models import SongRecord, SongTableModel
+from PyQt5 import QtWidgets
 
 
 SONG_NAME_INDEX = 0
@@ -36,7 +37,7 @@ class Songs(AutoConfig):
     Help guide me to suggest songs to select to mantain in my bag.
     """
 
-    AutoConfig.Add('songs', {})
+    AutoConfig.Add('songs', {}, cached=True)
 
     def __init__(self, GuitarTools, **kwargs):
                 
@@ -44,9 +45,15 @@ class Songs(AutoConfig):
         
         loader = UiLoader()
 
-        loader.registerCustomWidget(QTableWidgetFixed)
+        loader.registerCustomWidget(QTableViewFixed)
         self.ui = loader.load(LocalPath('songs.ui'))
         
+        # The song list is the source of truth, the table is a view on it
+        self.songModel = SongTableModel()
+        self._songs = self.songModel.records
+        self.ui.tableView_Songs.setModel(self.songModel)
+        self.songModel.recordChanged.connect(self._SongRecordChanged)
+        
         # Load the UI before calling super
         super().__init__(**kwargs)
 
@@ -54,20 +61,16 @@ class Songs(AutoConfig):
         # Setup table widget (desire to subclass) TESTING!
         #
 
-        self.ui.tableWidget_Songs.setColumnCount(3)
-        self.ui.tableWidget_Songs.setRowCount(0)
-        # self.ui.tableWidget_Songs.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
-        
-        self.ui.tableWidget_Songs.setHorizontalHeaderLabels(["Song", 
-                                                              "Active", 
-                                                              "Age"
-                                                              ])
+        # self.ui.tableView_Songs.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
 
-        header = self.ui.tableWidget_Songs.horizontalHeader()       
+        header = self.ui.tableView_Songs.horizontalHeader()       
         header.setSectionResizeMode(SONG_NAME_INDEX, QtWidgets.QHeaderView.Stretch)
         header.setSectionResizeMode(ACTIVE_CHECK_INDEX, QtWidgets.QHeaderView.ResizeToContents)
         header.setSectionResizeMode(SONG_QUALITY_INDEX, QtWidgets.QHeaderView.ResizeToContents)
         
+        # Size columns by the visible rows, not by every song in the list
+        header.setResizeContentsPrecision(0)
+        
         #
         # Connect widgets!
         #
@@ -75,67 +78,36 @@ class Songs(AutoConfig):
         self.ui.pushButton_SuggestSong.clicked.connect(self.SuggestSong)
         self.ui.pushButton_NewSong.clicked.connect(self.NewSong)
         
-        self._history = {}
-        
         # Seed the random number generator
         random.seed()
 
         
     @property
     def songs(self):
-        rows = self.ui.tableWidget_Songs.rowCount()
-        
-        songs = {}
-        for row in range(rows):
-            data = {
-                    'active': self.ui.tableWidget_Songs.cellWidget(row, ACTIVE_CHECK_INDEX).isChecked(), 
-                    'quality': int(float(self.ui.tableWidget_Songs.item(row, SONG_QUALITY_INDEX).text()))
-                    }
-            
-            song = self.ui.tableWidget_Songs.item(row, SONG_NAME_INDEX).text()
-            songs[song] = data
-
-        # self.ui.tableWidget_Songs.setFixedWidth()
-            
-        return songs
+        self._songs.Sync()
+        return {record.name: record.get_state() for record in self._songs}
     
     @songs.setter
     def songs(self, songs):
-        # Really dumb approach that clears the table and re-adds all the songs
-
-        self.ui.tableWidget_Songs.setRowCount(0)
+        # Replace the whole song list
 
+        records = []
         for name in sorted(songs.keys()):
             song = songs[name]
             
-            row = self.add_song(name, 
+            records.append(SongRecord(name, 
                            active=song.get('active', True),
-                           quality=int(float(song.get('quality', 1))),
-                           duplicate_check=False
-                           )
-            
-            # Used to know where in the table this song is stored.
-            song['index'] = row
+                           quality=int(float(song.get('quality', 1)))
+                           ))
 
-        # self.ui.tableWidget_Songs.setFixedWidth()
-            
+        self.songModel.Replace(records)
+        self.MarkDirty('songs')
 
     @property
     def active_songs(self):
-        rows = self.ui.tableWidget_Songs.rowCount()
-        
-        songs = {}
-        for row in range(rows):
-            data = {
-                    'active': self.ui.tableWidget_Songs.cellWidget(row, ACTIVE_CHECK_INDEX).isChecked(),
-                    'quality': float(self.ui.tableWidget_Songs.item(row, SONG_QUALITY_INDEX).text())
-                    }
-            
-            if data['active']:
-                song = self.ui.tableWidget_Songs.item(row, SONG_NAME_INDEX).text()
-                songs[song] = data
-            
-        return songs
+        self._songs.Sync()
+        return {record.name: record.get_state() 
+                for record in self._songs if record.active}
 
     #
     # Songs GUI
@@ -166,36 +138,19 @@ class Songs(AutoConfig):
         """
 
         # check to see if this song is already displayed
-        search = self.ui.tableWidget_Songs.findItems(name, QtCore.Qt.MatchFixedString)
-        if duplicate_check and len(search) != 0:
+        if duplicate_check and name in self._songs:
             self.GuitarTools.ui.statusbar.showMessage(
                     "Record Songs: Attempt to add duplicate song " + name, 
                     10000)
             return -1
         
-        # Add song to UI        
-        row = self.ui.tableWidget_Songs.rowCount()
-        self.ui.tableWidget_Songs.insertRow(row)
+        # Add song to the list (and so the UI)
+        row = self.songModel.InsertRecord(
+                len(self._songs),
+                SongRecord(name, active, quality)
+                )
         
-        active_check = QtWidgets.QCheckBox(self.ui.tableWidget_Songs)
-        active_check.setChecked(strtobool(active))
-                
-        song_name = QtWidgets.QTableWidgetItem(name)
-        song_name.setFlags(QtCore.Qt.ItemIsEnabled)
-        song_name.setFlags(QtCore.Qt.ItemIsSelectable)
-        
-
-        song_quality = QtWidgets.QTableWidgetItem(
-                "{:.1f}".format(quality))
-        song_quality.setFlags(QtCore.Qt.ItemIsEnabled)
-        song_quality.setFlags(QtCore.Qt.ItemIsSelectable)
-
-       
-        self.ui.tableWidget_Songs.setCellWidget(row, ACTIVE_CHECK_INDEX, active_check)
-        self.ui.tableWidget_Songs.setItem(row, SONG_NAME_INDEX, song_name)
-        self.ui.tableWidget_Songs.setItem(row, SONG_QUALITY_INDEX, song_quality)
-
-        # self.ui.tableWidget_Songs.resizeColumnsToContents()
+        self.MarkDirty('songs')
         
         return row
     
@@ -205,38 +160,42 @@ class Songs(AutoConfig):
         Ramdonly suggest a song to work on
         """
         
-        active_songs = self.active_songs
-        songs = self.songs
+        # Randomize, but weighted by delay since last performance
+        song = self._songs.Suggest(random)
         
-        if len(active_songs) == 0:
+        if song is None:
             song = ''
         else:
-            # Randomize, but weighted by delay since last performance
-            interval = 0
-            for k in active_songs:
-                 interval += songs[k]['quality']
-                 
-            selection = random.randrange(interval)
-            for index, song in enumerate(active_songs):
-                 selection -= active_songs[song]['quality']
-                 if selection < 0:
-                     break
-            
-            # update time since last play for all other active songs
-            for i, k in enumerate(active_songs):
-                if k != song:
-                    songs[k]['quality'] += 1
-                else:
-                    index = i 
-                    songs[k]['quality'] = 1
-            
-            self.songs = songs
+            self.PlaySong(song)
             
-        self.ui.tableWidget_Songs.selectRow(index)
+            self.GuitarTools.JournalEntry('song', song=song)
         
         self.GuitarTools.qt_application.clipboard().setText(song)
         # clipboard.setText(song)
         
+    def _SongRecordChanged(self, row, attribute):
+        """
+        Slot called when a song is changed from the table
+        """
+        
+        self.MarkDirty('songs')
+
+    def PlaySong(self, song):
+        """
+        Mark song as just played, every other active song ages by one
+        """
+        
+        if song not in self._songs:
+            return
+
+        # The other ages follow from the rotation's tick
+        self._songs.Play(song)
+        
+        self.songModel.RefreshColumn('quality')
+        self.MarkDirty('songs')
+        
+        self.ui.tableView_Songs.selectRow(self._songs.Row(song))
+        
     def SongsTuple(self, *args):
         """
         generates a sorted song tuple from the list of songs provided
@@ -6,12 +6,20 @@ Created on Tue May 16 22:05:15 2017
 @author: personal
 """
 
+import io
 import sys
+import time
 import types
 import os
+import marshal
+import hashlib
+import contextlib
+import importlib.util
 import distutils.util
+import xml.etree.ElementTree
+from collections import OrderedDict
 
-from PyQt5 import uic, QtWidgets
+from PyQt5 import uic, QtWidgets, QtCore
 
 
 # Ripped from qtutils
@@ -32,8 +40,184 @@ class UiLoader(object):
              raise UiLoaderPromotionException("The widget '%s' has already had a promotion registered"%name)
         setattr(self.module, name, class_)
      
-    def load(self, *args, **kwargs):
-        return uic.loadUi(*args, **kwargs)
+    def load(self, uifile, baseinstance=None, **kwargs):
+        with profile.Stage('ui load'):
+            
+            compiled = None
+            if len(kwargs) == 0:
+                try:
+                    compiled = CompiledUi(uifile)
+                except CompiledUi.Errors:
+                    pass
+            
+            if compiled is None:
+                return uic.loadUi(uifile, baseinstance, **kwargs)
+            
+            return compiled.setup(self.module, baseinstance)
+
+#
+# Compiled .ui cache
+#
+
+class CompiledUi():
+    """
+    The python code generated by uic for a .ui file, compiled once and 
+    cached (marshalled) in __pycache__ next to the .ui file.  The cache is 
+    keyed by the .ui file's modification time and size, and failing that its
+    hash, together with the python and PyQt versions.
+    
+    CompiledUi(uifile) raises one of CompiledUi.Errors if the code cannot be
+    generated, in which case the caller should fall back on uic.loadUi.
+    """
+    
+    # Bump if the cache layout changes
+    VERSION = 1
+    
+    Errors = (OSError, SyntaxError, ValueError, TypeError, AttributeError,
+              uic.exceptions.NoSuchWidgetError,
+              uic.exceptions.UnsupportedPropertyError,
+              xml.etree.ElementTree.ParseError)
+    
+    def __init__(self, uifile):
+        self._load(uifile)
+    
+    @staticmethod
+    def CachePath(uifile):
+        directory, name = os.path.split(os.path.abspath(uifile))
+        
+        return os.path.join(directory, '__pycache__', '{}.{}.uic'.format(
+                name, sys.implementation.cache_tag))
+
+    def _load(self, uifile):
+        
+        stat = os.stat(uifile)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        key = [self.VERSION, QtCore.PYQT_VERSION_STR, 
+               importlib.util.MAGIC_NUMBER.hex()]
+
+        cache = self.CachePath(uifile)
+        
+        try:
+            with open(cache, 'rb') as f:
+                cached_key, cached_stamp, digest, names, code = marshal.load(f)
+        except (OSError, ValueError, EOFError, TypeError):
+            cached_key = None
+        
+        if cached_key == key:
+            if cached_stamp == stamp:
+                self.widget_class, self.ui_class = names
+                self.code = code
+                return
+            
+            # Touched but perhaps unchanged
+            with open(uifile, 'rb') as f:
+                data = f.read()
+            
+            if hashlib.sha1(data).hexdigest() == digest:
+                self.widget_class, self.ui_class = names
+                self.code = code
+                return
+        
+        self._compile(uifile)
+        
+        with open(uifile, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        
+        # The cache is only an optimization
+        try:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            temp = cache + '.tmp'
+            with open(temp, 'wb') as f:
+                marshal.dump((key, stamp, digest, 
+                              (self.widget_class, self.ui_class), 
+                              self.code), f)
+            os.replace(temp, cache)
+        except OSError:
+            pass
+    
+    def _compile(self, uifile):
+        
+        root = xml.etree.ElementTree.parse(uifile).getroot().find('widget')
+        self.widget_class = root.get('class')
+        self.ui_class = 'Ui_' + root.get('name')
+        
+        source = io.StringIO()
+        uic.compileUi(uifile, source)
+        
+        self.code = compile(source.getvalue(), uifile, 'exec')
+
+    def setup(self, module, baseinstance=None):
+        """
+        Equivalent of uic.loadUi(uifile, baseinstance).  Custom widgets 
+        are taken from the UiLoader's promotion module.
+        """
+        
+        namespace = {'__name__': 'guitartools.ui'}
+        exec(self.code, namespace)
+        
+        if baseinstance is None:
+            Widget = getattr(module, self.widget_class, None)
+            if Widget is None:
+                Widget = getattr(QtWidgets, self.widget_class)
+            baseinstance = Widget()
+        
+        ui = namespace[self.ui_class]()
+        ui.setupUi(baseinstance)
+        
+        # loadUi puts every named object on the base instance
+        for name, value in vars(ui).items():
+            setattr(baseinstance, name, value)
+        
+        return baseinstance
+
+#
+# Startup timing
+#
+
+class StartupProfile():
+    """
+    Accumulates the time spent in named stages.  Stages may be nested, in
+    which case the time of the inner stage is not counted in the outer one.
+    
+    with profile.Stage('config parse'):
+        ...
+    """
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = OrderedDict()
+        self._nested = []
+
+    @contextlib.contextmanager
+    def Stage(self, name):
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if len(self._nested) > 0:
+                self._nested[-1] += elapsed
+    
+    def Report(self):
+        """
+        Returns a table of the time spent in each stage
+        """
+        
+        total = time.perf_counter() - self.start
+        
+        lines = ["{:<20s} {:>8.1f} ms".format(name, 1000*seconds) 
+                 for name, seconds in self.stages.items()]
+        lines.append("{:<20s} {:>8.1f} ms".format(
+                "other", 1000*(total - sum(self.stages.values()))))
+        lines.append("{:<20s} {:>8.1f} ms".format("total", 1000*total))
+        
+        return "\n".join(lines)
+
+profile = StartupProfile()
 
 #
 # Compute local path
@@ -49,8 +233,6 @@ def LocalPath(filename):
 # Ripped from qgas
 #
 
-from collections import OrderedDict
-
 def MakeAutoConfig():
     """
     Should be used in the following way:
@@ -58,8 +240,9 @@ def MakeAutoConfig():
     AutoConfig = MakeAutoConfig()
     
     class Metronome(QtWidgets.QWidget, AutoConfig):
-        AutoConfig.Add('history', {})
-        AutoConfig.Add('chords', {})
+        AutoConfig.Add('history', {}, cached=True)
+        AutoConfig.Add('chords', {}, cached=True)
+        AutoConfig.Add('goal', 1, CoerceInt(minimum=1))
 
         def __init__(self, **kwargs):
                     
@@ -69,6 +252,16 @@ def MakeAutoConfig():
             # autoconfiged obtions from **kwargs
             super().__init__(**kwargs)
     
+    Values are passed through the coerce function (if any) before they are
+    given to the setter, so setters receive values of the right type.
+    
+    get_state keeps the value of cached keys, and only calls their getter 
+    again after MarkDirty(key) is called.  Use this for state that is 
+    expensive to build, and call MarkDirty whenever it changes.
+    
+    Modified() tells if the state has changed since it was last loaded with
+    set_state or saved (MarkSaved): cached keys count as changed once marked
+    dirty, the other keys are compared with their saved values.
     """
     
     
@@ -81,17 +274,98 @@ def MakeAutoConfig():
         
         def __init__(self, autoconfig_name_key=None, **kwargs):
             self._autoconfig_name_key = autoconfig_name_key
+            self._autoconfig_cache = {}
+            self._autoconfig_modified = set()
+            self._autoconfig_saved = {}
         
         @classmethod
         def InitConfigVariables(cls, *args, **kwargs):
             cls._autoconfig_kwargs = OrderedDict(*args, **kwargs)
+            cls._autoconfig_coerce = {}
+            cls._autoconfig_cached = set()
+            cls._autoconfig_schema = None
         
         @classmethod
-        def Add(cls, key, val):
+        def Add(cls, key, val, coerce=None, cached=False):
             """
             Add the desired parameter at the class level
             """
             cls._autoconfig_kwargs[key] = val
+            cls._autoconfig_coerce[key] = coerce
+            if cached:
+                cls._autoconfig_cached.add(key)
+            
+            cls._autoconfig_schema = None
+        
+        @property
+        def autoconfig_name_key(self):
+            return self._autoconfig_name_key
+        
+        @classmethod
+        def Schema(cls):
+            """
+            Returns a tuple of (key, default, coerce, cached) for every 
+            parameter, in order
+            """
+            
+            if cls._autoconfig_schema is None:
+                cls._autoconfig_schema = tuple(
+                        (key, 
+                         val, 
+                         cls._autoconfig_coerce.get(key, None), 
+                         key in cls._autoconfig_cached)
+                        for key, val in cls._autoconfig_kwargs.items())
+            
+            return cls._autoconfig_schema
+        
+        def MarkDirty(self, *keys):
+            """
+            The values of these cached keys have changed
+            """
+            for key in keys:
+                self._autoconfig_cache.pop(key, None)
+                self._autoconfig_modified.add(key)
+        
+        def MarkSaved(self):
+            """
+            Our current state is what is on disk
+            """
+            
+            self._autoconfig_modified.clear()
+            self._autoconfig_saved = {key: getattr(self, key) 
+                                      for key, val, coerce, cached 
+                                      in self.Schema() if not cached}
+        
+        def Modified(self):
+            """
+            True if the state has changed since it was loaded or saved
+            """
+            
+            if len(self._autoconfig_modified) > 0:
+                return True
+            
+            for key, val, coerce, cached in self.Schema():
+                if not cached:
+                    if key not in self._autoconfig_saved:
+                        return True
+                    if getattr(self, key) != self._autoconfig_saved[key]:
+                        return True
+            
+            return False
+        
+        def _autoconfig_widget(self):
+            """
+            The widget displaying our state, if any
+            """
+            
+            if isinstance(self, QtWidgets.QWidget):
+                return self
+            
+            widget = self.__dict__.get('ui', None)
+            if isinstance(widget, QtWidgets.QWidget):
+                return widget
+            
+            return None
     
     class AutoConfig(AutoConfigBase):
         """    
@@ -138,8 +412,27 @@ def MakeAutoConfig():
             else: 
                 state = kwargs
             
-            for key, val in self._autoconfig_kwargs.items():
-                setattr(self, key, state.pop(key, val))
+            # Don't repaint until everything is set
+            widget = self._autoconfig_widget()
+            updates = widget is not None and widget.updatesEnabled()
+            if updates:
+                widget.setUpdatesEnabled(False)
+            
+            try:
+                for key, val, coerce, cached in self.Schema():
+                    val = state.pop(key, val)
+                    if coerce is not None:
+                        val = coerce(val)
+                    
+                    setattr(self, key, val)
+                    
+                    if cached:
+                        self._autoconfig_cache.pop(key, None)
+                
+                self.MarkSaved()
+            finally:
+                if updates:
+                    widget.setUpdatesEnabled(True)
             
             if len(state) > 0:
                 keys = [key for key in state]
@@ -149,8 +442,13 @@ def MakeAutoConfig():
         def get_state(self):
     
             state = {}
-            for key in self._autoconfig_kwargs:
-                state[key] = getattr(self, key)
+            for key, val, coerce, cached in self.Schema():
+                if not cached:
+                    state[key] = getattr(self, key)
+                elif key in self._autoconfig_cache:
+                    state[key] = self._autoconfig_cache[key]
+                else:
+                    state[key] = self._autoconfig_cache[key] = getattr(self, key)
     
             if self._autoconfig_name_key is not None:
                 return {self._autoconfig_name_key: state}
@@ -189,6 +487,20 @@ class QTableWidgetFixed(QtWidgets.QTableWidget):
         
         self.setMaximumWidth(width)
         self.setMinimumWidth(width)
+
+
+class QTableViewFixed(QtWidgets.QTableView):
+    """
+    Table view version of QTableWidgetFixed, for use with a model
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        
+        # Never display a vertical header
+        self.verticalHeader().setVisible(False)
+
+    setFixedWidth = QTableWidgetFixed.setFixedWidth
         
         
 #
@@ -218,3 +530,28 @@ def strtobool(x):
         return distutils.util.strtobool(x)
     else:
         return bool(x)
+
+#
+# AutoConfig coercion functions (config files give us strings)
+#
+
+def CoerceBool(x):
+    return bool(strtobool(x))
+
+def CoerceInt(minimum=None, maximum=None):
+    """
+    Returns a function that converts its argument to an int clipped to 
+    [minimum, maximum]
+    """
+    
+    def coerce(x):
+        x = int(float(x)) if type(x) == str else int(x)
+        
+        if minimum is not None:
+            x = max(x, minimum)
+        if maximum is not None:
+            x = min(x, maximum)
+        
+        return x
+    
+    return coerce
\ No newline at end of file
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:05:32 2026
+
+Chord synthesis
+
+@author: Ian Spielman
+
+Guitar chords synthesized with the Karplus-Strong plucked string algorithm,
+so that the Listening tab has something to play without a library of
+recorded samples.
+
+A chord name (Am, G7, F#5, D/F#, ...) is turned into a voicing, the fret of
+each string from low E to high E (None for a muted string), either from the
+table of open chords or from a movable barre shape.  A strum plucks each
+string of the voicing a little after the last, low to high for a down
+strum and high to low for an up strum, more tightly at faster tempos.
+
+Every string of every chord requested at once is computed together: the
+Karplus-Strong recurrence y[n] = decay*(y[n-N] + y[n-N+1])/2 only looks back
+at least N-1 samples, so all strings advance by a block of the shortest
+delay line in one numpy step.  Rendered chords are cached by voicing,
+direction and tempo.
+"""
+
+import random
+import collections
+
+import numpy as np
+
+from guitartools.Audio import SAMPLE_RATE
+from guitartools.Samples import CHORD_NAME, SOUND_STAGES
+
+#
+# Constants
+#
+
+# MIDI note of each open string, low E first
+OPEN_STRINGS = (40, 45, 50, 55, 59, 64)
+
+NOTES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+DOWN = 'down'
+UP = 'up'
+
+# Open chords
+VOICINGS = {
+        'E': (0, 2, 2, 1, 0, 0),
+        'A': (None, 0, 2, 2, 2, 0),
+        'D': (None, None, 0, 2, 3, 2),
+        'Em': (0, 2, 2, 0, 0, 0),
+        'Am': (None, 0, 2, 2, 1, 0),
+        'Dm': (None, None, 0, 2, 3, 1),
+        'G': (3, 2, 0, 0, 0, 3),
+        'C': (None, 3, 2, 0, 1, 0),
+        'F': (1, 3, 3, 2, 1, 1),
+        'G7': (3, 2, 0, 0, 0, 1),
+        'C7': (None, 3, 2, 3, 1, 0),
+        'B7': (None, 2, 1, 2, 0, 2),
+        'D7': (None, None, 0, 2, 1, 2),
+        'E7': (0, 2, 0, 1, 0, 0),
+        'A7': (None, 0, 2, 0, 2, 0),
+        'Fmaj7': (None, None, 3, 2, 1, 0),
+        'Asus2': (None, 0, 2, 2, 0, 0),
+        'Asus4': (None, 0, 2, 2, 3, 0),
+        'Dsus2': (None, None, 0, 2, 3, 0),
+        'Dsus4': (None, None, 0, 2, 3, 3),
+        'Esus4': (0, 2, 2, 2, 0, 0),
+        'G/B': (None, 2, 0, 0, 0, 3),
+        'C/G': (3, 3, 2, 0, 1, 0),
+        'D/F#': (2, None, 0, 2, 3, 2),
+        }
+
+# Movable shapes by quality, rooted on the low E and on the A string
+# (by the text following the root, see Samples.QUALITIES)
+E_SHAPES = {
+        '': (0, 2, 2, 1, 0, 0),
+        'm': (0, 2, 2, 0, 0, 0),
+        '7': (0, 2, 0, 1, 0, 0),
+        'maj7': (0, None, 1, 1, 0, None),
+        'm7': (0, 2, 0, 0, 0, 0),
+        '5': (0, 2, 2, None, None, None),
+        'sus2': (0, 2, 4, 4, 0, 0),
+        'sus4': (0, 2, 2, 2, 0, 0),
+        }
+A_SHAPES = {
+        '': (None, 0, 2, 2, 2, 0),
+        'm': (None, 0, 2, 2, 1, 0),
+        '7': (None, 0, 2, 0, 2, 0),
+        'maj7': (None, 0, 2, 1, 2, 0),
+        'm7': (None, 0, 2, 0, 1, 0),
+        '5': (None, 0, 2, 2, None, None),
+        'sus2': (None, 0, 2, 2, 0, 0),
+        'sus4': (None, 0, 2, 2, 3, 0),
+        }
+
+# Per sample loss of the string, and time between the first and last
+# string of a strum at 60 bpm (shorter at faster tempos)
+DECAY = 0.996
+STRUM_SECONDS = 0.06
+MIN_STRUM_SECONDS = 0.015
+
+# How long each rendered chord rings, at least and at most
+MIN_SECONDS = 0.5
+MAX_SECONDS = 3.0
+
+# Peak level of a rendered chord
+PEAK = 0.6 * (2**15-1)
+
+# Rendered chords to keep, and the tempo resolution they are kept at
+CACHE_SIZE = 256
+BPM_STEP = 5
+
+
+def PitchClass(note):
+    """
+    Pitch class (0 for C) of a note name such as F# or Bb
+    """
+
+    pitch = NOTES[note[0]]
+    for accidental in note[1:]:
+        pitch += {'#': 1, 'b': -1}[accidental]
+
+    return pitch % 12
+
+
+def Voicing(name):
+    """
+    Returns the frets, low E string first, to play chord name; None for a
+    muted string.  Raises KeyError if we don't know how to play it.
+    """
+
+    name = name.replace(' ', '')
+
+    voicing = VOICINGS.get(name, None)
+    if voicing is not None:
+        return voicing
+
+    match = CHORD_NAME.match(name)
+    if match is None:
+        raise KeyError(name)
+
+    root, suffix, bass = match.groups()
+    if suffix not in E_SHAPES:
+        raise KeyError(name)
+
+    chord = root + suffix
+
+    if chord in VOICINGS and bass is not None:
+        voicing = list(VOICINGS[chord])
+    else:
+        # Use whichever barre shape sits lower on the neck
+        pitch = PitchClass(root)
+        e_fret = (pitch - OPEN_STRINGS[0]) % 12
+        a_fret = (pitch - OPEN_STRINGS[1]) % 12
+
+        if e_fret <= a_fret:
+            shape, fret = E_SHAPES[suffix], e_fret
+        else:
+            shape, fret = A_SHAPES[suffix], a_fret
+
+        voicing = [None if f is None else f + fret for f in shape]
+
+    if bass is not None:
+        # Put the bass note on the low E or A string, muting below it
+        pitch = PitchClass(bass)
+        for string in (0, 1):
+            fret = (pitch - OPEN_STRINGS[string]) % 12
+            if fret <= 5:
+                voicing[:string] = [None]*string
+                voicing[string] = fret
+                break
+        else:
+            raise KeyError(name)
+
+    return tuple(voicing)
+
+
+def Pluck(notes, length, sample_rate=SAMPLE_RATE, decay=DECAY,
+          amplitudes=None, rng=None):
+    """
+    Karplus-Strong plucked strings: returns an array with a row of (at 
+    least) length samples for each MIDI note in notes
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    notes = np.asarray(notes, dtype=float)
+    strings = len(notes)
+
+    if amplitudes is None:
+        amplitudes = np.ones(strings)
+
+    if strings == 0:
+        return np.zeros((0, length), dtype=np.float32)
+
+    frequencies = 440 * 2**((notes - 69) / 12)
+    periods = np.maximum(np.round(sample_rate / frequencies).astype(int), 2)
+
+    # One flat array so that each block is a single take.  The extra 
+    # sample keeps the last block's look ahead inside its own row.
+    longest = periods.max()
+    y = np.zeros((strings, max(length, longest) + 1), dtype=np.float32)
+    flat = y.ravel()
+    length = y.shape[1] - 1
+
+    # The delay lines start out full of (slightly smoothed) noise
+    noise = rng.uniform(-1, 1, (strings, longest))
+    noise = 0.5*(noise + np.roll(noise, 1, axis=1))
+    fill = np.arange(longest)[None, :] < periods[:, None]
+    y[:, :longest] = np.where(fill, amplitudes[:, None] * noise, 0.0)
+
+    # Every sample looks back at least period-1 samples
+    block = max(periods.min() - 1, 1)
+    base = (np.arange(strings) * y.shape[1] - periods)[:, None]
+    steps = np.arange(block + 1)[None, :]
+
+    for n in range(periods.min(), length, block):
+        width = min(block, length - n)
+        back = flat.take(base + n + steps[:, :width + 1])
+        value = decay * 0.5 * (back[:, :-1] + back[:, 1:])
+
+        if n < longest:
+            # Strings still reading out their initial noise
+            value = np.where(n + steps[:, :width] >= periods[:, None],
+                             value, y[:, n:n + width])
+
+        y[:, n:n + width] = value
+
+    return y
+
+
+class ChordSynth():
+    """
+    Renders chords to int16 PCM, caching the results
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, cache_size=CACHE_SIZE):
+        self.sample_rate = sample_rate
+        self.cache_size = cache_size
+
+        self._cache = collections.OrderedDict()
+        self._rng = np.random.default_rng()
+
+    def _length(self, bpm):
+        seconds = min(max(60 / max(bpm, 1), MIN_SECONDS), MAX_SECONDS)
+        return int(seconds*self.sample_rate)
+
+    def _spread(self, bpm):
+        seconds = max(STRUM_SECONDS * 60 / max(bpm, 1), MIN_STRUM_SECONDS)
+        return seconds*self.sample_rate
+
+    def Render(self, requests):
+        """
+        Returns the int16 PCM for each (voicing, direction, bpm) in
+        requests, rendering the ones that are not cached in one pass
+        """
+
+        requests = [(tuple(voicing), direction, 
+                     max(BPM_STEP*int(round(bpm / BPM_STEP)), BPM_STEP))
+                    for voicing, direction, bpm in requests]
+
+        missing = [key for key in dict.fromkeys(requests)
+                   if key not in self._cache]
+
+        if len(missing) > 0:
+            length = max(self._length(bpm) for _, _, bpm in missing)
+
+            notes = []
+            starts = []
+            amplitudes = []
+            chords = []
+            for i, (voicing, direction, bpm) in enumerate(missing):
+                strings = [(string, fret) for string, fret in enumerate(voicing)
+                           if fret is not None]
+                if direction == UP:
+                    strings.reverse()
+
+                spread = self._spread(bpm) / max(len(strings) - 1, 1)
+                for j, (string, fret) in enumerate(strings):
+                    notes.append(OPEN_STRINGS[string] + fret)
+                    starts.append(int(j*spread))
+                    # Up strums catch less of the bass strings
+                    amplitudes.append(0.6 + 0.08*string if direction == UP
+                                      else 1.0)
+                    chords.append(i)
+
+            strings = Pluck(notes, length, self.sample_rate,
+                            amplitudes=np.array(amplitudes), rng=self._rng)
+
+            mixed = np.zeros((len(missing), length), dtype=np.float32)
+            for string, (chord, start) in enumerate(zip(chords, starts)):
+                if start < length:
+                    mixed[chord, start:] += strings[string, :length - start]
+
+            for key, chord in zip(missing, mixed):
+                chord = chord[:self._length(key[2])]
+                peak = np.abs(chord).max()
+                if peak > 0:
+                    chord = chord * (PEAK / peak)
+                chord = chord.astype(np.int16)
+                chord.setflags(write=False)
+
+                self._cache[key] = chord
+
+        chords = []
+        for key in requests:
+            self._cache.move_to_end(key)
+            chords.append(self._cache[key])
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return chords
+
+    def Chord(self, name, direction=DOWN, bpm=60):
+        """
+        Returns the int16 PCM of a strum of chord name
+        """
+        return self.Render([(Voicing(name), direction, bpm)])[0]
+
+    def Clear(self):
+        self._cache.clear()
+
+
+class SynthLibrary():
+    """
+    Synthesized stand in for a SampleLibrary: every chord of the single
+    sound recognition stages, and any other chord we can voice
+    """
+
+    # Chance that a strum is a down strum
+    DOWN_STRUMS = 0.75
+
+    directory = None
+
+    def __init__(self, sample_rate=SAMPLE_RATE):
+        self.synth = ChordSynth(sample_rate)
+
+    @property
+    def names(self):
+        names = set()
+        for chords in SOUND_STAGES:
+            names.update(chords)
+
+        return sorted(names)
+
+    def __contains__(self, name):
+        try:
+            Voicing(name)
+        except KeyError:
+            return False
+
+        return True
+
+    def _direction(self, rng):
+        return DOWN if rng.random() < self.DOWN_STRUMS else UP
+
+    def Sample(self, name, rng=random, bpm=60):
+        return self.synth.Render([(Voicing(name), self._direction(rng),
+                                   bpm)])[0]
+
+    def Preload(self, chords):
+        """
+        Render both strums of the chords, (name, bpm) pairs, all at once
+        """
+
+        self.synth.Render([(Voicing(name), direction, bpm)
+                           for name, bpm in chords
+                           for direction in (DOWN, UP)])
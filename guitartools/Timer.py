@@ -1,20 +1,35 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+import math
+
 from PyQt5 import QtCore, QtWidgets
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig
+from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, CoerceInt
+from guitartools.Program import Program
 
 class QProgressBarNumber(QtWidgets.QWidget):
     """
     A progress bar with a number display as well, along with a display of the
     remaining repeats
+
+    The repeats are the segments of a Program, after an optional lead in.
+    The countdown is kept as the time.monotonic() deadline of the current
+    repeat, and each next deadline is the last one plus the next duration,
+    so programs that never end need no table.  The display is simply
+    refreshed from the clock every refresh interval, and a separate single
+    shot timer is aimed at the deadline, so late or coalesced ticks never add
+    up to drift and pausing keeps the partial second.
     """
     
     RUNNING = 0
     STOPPED = 1
     PAUSED = 2
 
+    # Repeats reported for a program that never ends
+    ENDLESS = 2**31 - 1
+
     #
     # signals: beep, timer update and repeats deincremented
     #
@@ -25,6 +40,9 @@ class QProgressBarNumber(QtWidgets.QWidget):
     
     repeatTimeout = QtCore.pyqtSignal(int)
 
+    # Program segment and the seconds into it, -1 once stopped
+    segmentStarted = QtCore.pyqtSignal(int, float)
+
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -34,12 +52,17 @@ class QProgressBarNumber(QtWidgets.QWidget):
         #
 
         self.setTimes([0,])
-        self._active_times = self._times.copy()
+        self._active_program = self._program
 
         self.setLeadIn(3)
 
         self._state = QProgressBarNumber.STOPPED
 
+        self._segment = 0
+        self._remaining = 0.0
+        self._deadline = 0.0
+        self._refresh_interval = 100
+
         #
         # Overall widget properties
         #
@@ -53,6 +76,11 @@ class QProgressBarNumber(QtWidgets.QWidget):
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self._timerUpdate)
 
+        self.deadlineTimer = QtCore.QTimer()
+        self.deadlineTimer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.deadlineTimer.setSingleShot(True)
+        self.deadlineTimer.timeout.connect(self._deadlineUpdate)
+
         #
         # GUI elements
         #
@@ -78,6 +106,8 @@ class QProgressBarNumber(QtWidgets.QWidget):
         self.Repeats.setFocusPolicy(QtCore.Qt.NoFocus)
         self.Repeats.setButtonSymbols(QtWidgets.QAbstractSpinBox.NoButtons)
         self.Repeats.setReadOnly(True)
+        self.Repeats.setRange(-1, 99999)
+        self.Repeats.setSpecialValueText('\u221e')
         font = self.Repeats.font()
         font.setBold(True)
         
@@ -99,19 +129,35 @@ class QProgressBarNumber(QtWidgets.QWidget):
     def state(self):
         return self._state
     
-    @property
-    def _times_with_leadin(self):
+    def _duration(self, segment):
+        """
+        Duration of segment, counting the leadin as the first one
         """
-        Gives us the list of times including the leadin at the start
+        if segment < len(self._leadin):
+            return self._leadin[segment]
+        
+        return self._active_program.Duration(segment - len(self._leadin))
+
+    def _repeats(self, segment):
         """
-        return self._leadin + self._active_times
+        Number of repeats remaining once segment is complete, None if the
+        program never ends
+        """
+        return self._active_program.Remaining(segment - len(self._leadin))
         
     def setTimes(self, val):
         """
         Set the durations of each timer as a list
         """
                 
-        self._times = val            
+        self.setProgram(Program.FromTimes(val))
+
+    def setProgram(self, program):
+        """
+        Set the Program to count down, from the next reset
+        """
+        
+        self._program = program
                
     def setValue(self, time, repeats):
         self.ProgressBar.setValue(time)
@@ -121,15 +167,27 @@ class QProgressBarNumber(QtWidgets.QWidget):
     def value(self):
         return ( self.Time.value(), self.Repeats.value() )
 
+    def setRefreshInterval(self, msec):
+        """
+        Set how often (in ms) the display is refreshed while running
+        """
+        
+        self._refresh_interval = max(int(msec), 1)
+        
+        if self.timer.isActive():
+            self.timer.setInterval(self._refresh_interval)
+
     def timerReset(self):
         """
         Reset the timer to a state specified by self._times
         """
         
-        self._active_times = self._times.copy()
+        self._active_program = self._program
+        self._segment = 0
+        self._remaining = float(self._duration(0))
+        self._deadline = 0.0
         
-        self.ProgressBar.setRange(0, self._times_with_leadin[0])
-        self.setValue(self._times_with_leadin[0], len(self._times))
+        self._display()
         
     def setLeadIn(self, val):
         """
@@ -150,7 +208,9 @@ class QProgressBarNumber(QtWidgets.QWidget):
         This stops the timer and resets it to its defaults
         """
         self._emit_repeatTimeout(-1)
+        self.segmentStarted.emit(-1, 0.0)
         self._state = QProgressBarNumber.STOPPED
+        self.deadlineTimer.stop()
         ans = self.timer.stop(*args, **kwargs)
         self.timerReset()
 
@@ -160,47 +220,102 @@ class QProgressBarNumber(QtWidgets.QWidget):
         """
         Sending start either continues from being paused OR starts fresh.
         """
+
+        # The current segment ends once the remaining time is up
+        self._deadline = time.monotonic() + self._remaining
+
         # send a signal indicating the current location in the repeats list
-        self._emit_repeatTimeout(self.value()[1])
+        self._emit_repeatTimeout(self._repeats(self._segment))
+        self._emit_segmentStarted()
         self._state = QProgressBarNumber.RUNNING
 
-        return self.timer.start(1000)
+        self._scheduleDeadline()
+
+        return self.timer.start(self._refresh_interval)
 
     def pause(self, *args, **kwargs):
+        if self._state == QProgressBarNumber.RUNNING:
+            self._remaining = max(self._deadline - time.monotonic(), 0.0)
+        
         self._state = QProgressBarNumber.PAUSED
+        self.deadlineTimer.stop()
         
         return self.timer.stop(*args, **kwargs)
 
+    def _display(self):
+        """
+        Show the remaining time (rounded up to whole seconds) and repeats
+        """
+        
+        duration = self._duration(self._segment)
+        repeats = self._repeats(self._segment)
+        
+        self.ProgressBar.setRange(0, duration)
+        self.setValue(math.ceil(self._remaining),
+                      -1 if repeats is None else repeats)
+
+    def _scheduleDeadline(self):
+        """
+        Aim the single shot timer at the end of the current segment
+        """
+        
+        msec = (self._deadline - time.monotonic()) * 1000
+        self.deadlineTimer.start(max(math.ceil(msec), 0))
+
     def _timerUpdate(self):
         """
-        slot sending a single tick to the timer
+        slot refreshing the display from the clock
         """
         
-        time, repeats = self.value()
+        if self._state != QProgressBarNumber.RUNNING:
+            return
+
+        displayed = self.value()[0]
+        
+        self._remaining = max(self._deadline - time.monotonic(), 0.0)
+        self._display()
+        
+        # send timeout signal once per displayed second
+        if self.value()[0] != displayed:
+            self.timeout.emit()
 
-        if time <= 0:
+    def _deadlineUpdate(self):
+        """
+        slot called at the end of a segment: beep and move on to the next
+        repeat, or stop at the end of the last one
+        """
+        
+        now = time.monotonic()
+        
+        if now < self._deadline:
+            # Woke up early
+            self._scheduleDeadline()
+            return
+        
+        # Catch up on every deadline that has passed, each following on
+        # exactly from the last
+        while now >= self._deadline:
             # Send beep signal!!
             self.beep.emit()
             
             # Check to see if we should do a repeat or not
-            if repeats <= 0:
+            repeats = self._repeats(self._segment)
+            if repeats is not None and repeats <= 0:
                 self.stop()
-            else:
-                next_time = self._times_with_leadin[-repeats]
-                repeats -= 1
-                self.ProgressBar.setRange(0, next_time)
-                self.setValue(
-                        next_time, 
-                        repeats)
-                
-                # Send repeatTimeout and timeout signals
-                self._emit_repeatTimeout(repeats)
-                self.timeout.emit()
+                return
 
-        else:
-            self.setValue(time-1, repeats)     
-            # send timeout signal
-            self.timeout.emit()
+            self._segment += 1
+            self._deadline += self._duration(self._segment)
+
+        self._remaining = self._deadline - now
+        self._display()
+        
+        # Send repeatTimeout, segmentStarted and timeout signals
+        self._emit_repeatTimeout(self._repeats(self._segment))
+        self._emit_segmentStarted()
+        self.timeout.emit()
+        
+        self._scheduleDeadline()
     
     def _emit_repeatTimeout(self, val):
         """
@@ -208,24 +323,42 @@ class QProgressBarNumber(QtWidgets.QWidget):
         widgets don't know that we added the leadin, so this info is hidden
         """
         
+        # endless program
+        if val is None:
+            self.repeatTimeout.emit(QProgressBarNumber.ENDLESS)
         # paused condition
-        if val < 0:
+        elif val < 0:
             self.repeatTimeout.emit(val)
         elif len(self._leadin) == 0:
             self.repeatTimeout.emit(val)
         else:
             # OK there is a leadin and we want to igore it
             # Remember we count down
-            if val == len(self._times):
+            if self._segment < len(self._leadin):
                 self.repeatTimeout.emit(val-1)
             else:
                 self.repeatTimeout.emit(val)
+
+    def _emit_segmentStarted(self):
+        """
+        emit the current program segment and the seconds into it.  The leadin
+        counts down to the first segment, so it gives that segment with a
+        negative time
+        """
+        
+        index = self._segment - len(self._leadin)
+        
+        if index < 0:
+            self.segmentStarted.emit(0, -self._remaining)
+        else:
+            self.segmentStarted.emit(
+                    index, self._duration(self._segment) - self._remaining)
     
 AutoConfig = MakeAutoConfig()
 class Timer(AutoConfig):
     
-    AutoConfig.Add("repeats", 5)
-    AutoConfig.Add("starttime", 60)
+    AutoConfig.Add("repeats", 5, CoerceInt(minimum=1))
+    AutoConfig.Add("starttime", 60, CoerceInt(minimum=1))
     
     def __init__(self, GuitarTools, **kwargs):
 
@@ -261,8 +394,6 @@ class Timer(AutoConfig):
     
     @repeats.setter
     def repeats(self, value):
-        value = max(int(value), 1)
-        
         self.ui.spinBox_Repeats.setValue(value)
 
     @property
@@ -271,8 +402,6 @@ class Timer(AutoConfig):
     
     @starttime.setter
     def starttime(self, value):
-        value = max(int(value), 1)
-
         self.ui.spinBox_StartTime.setValue(value)
         
     #
@@ -296,6 +425,19 @@ class Timer(AutoConfig):
             
             self.ui.progressBarNumber_Countdown.start()
             
+            self.GuitarTools.JournalEntry('timer', 
+                                          repeats=self.repeats,
+                                          starttime=self.starttime,
+                                          when=time.ctime())
+
+    def SetSession(self, repeats, starttime):
+        """
+        Restore the settings of a timer session replayed from the journal
+        """
+        
+        self.repeats = max(int(repeats), 1)
+        self.starttime = max(int(starttime), 1)
+            
     def timerReset(self):
         """
         Reset the timer, but only if the timer is in the paused state
@@ -305,8 +447,8 @@ class Timer(AutoConfig):
             self.ui.progressBarNumber_Countdown.stop()
         elif self.ui.progressBarNumber_Countdown.state == QProgressBarNumber.STOPPED:
             # Just reset the timer 
-            self.ui.progressBarNumber_Countdown.setTimes(
-                    [self.starttime]*self.repeats
+            self.ui.progressBarNumber_Countdown.setProgram(
+                    Program.FromTimes([self.starttime], passes=self.repeats)
                     )
 
             self.ui.progressBarNumber_Countdown.timerReset()        
@@ -1,27 +1,57 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+_start_time = time.perf_counter()
+
 import sys
 import os
 import signal
+import importlib
+import collections
 import configobj
 
 # Quit on ctrl-c
 signal.signal(signal.SIGINT, signal.SIG_DFL)
 
-from PyQt5 import QtWidgets, QtGui
+from PyQt5 import QtWidgets, QtGui, QtCore
 
 #
-# Metronome widget
+# Custom widgets.  Only the timer is always visible, the tabs (and so the 
+# heavy imports they make, such as numpy and QtMultimedia for the metronome)
+# are only imported and built when first shown.
 #
 
-from guitartools.Metronome import Metronome
 from guitartools.Timer import Timer
-from guitartools.Changes import Changes
-from guitartools.Listening import Listening
-from guitartools.Songs import Songs
 
-from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig
+from guitartools.Support import UiLoader, LocalPath, MakeAutoConfig, profile, CoerceInt
+from guitartools.History import ChordHistory
+from guitartools.Journal import Journal, Compactor, FileStamp
+from guitartools.Snapshot import ReadSnapshot
+
+profile.start = _start_time
+profile.stages['import'] = time.perf_counter() - _start_time
+
+# Write a new snapshot once the journal holds this many entries
+COMPACT_ENTRIES = 100
+
+# Autosave once nothing has changed for AUTOSAVE_DELAY ms, but never put it
+# off for more than AUTOSAVE_LIMIT ms while changes keep coming
+AUTOSAVE_DELAY = 2000
+AUTOSAVE_LIMIT = 30000
+
+# Tabs built on demand: attribute (and class) name, module, 
+# autoconfig name key, tab page and the layout they go in
+LAZY_TABS = collections.OrderedDict([
+        ('Metronome', ('guitartools.Metronome', 'metronome', 
+                       'tab_Metronome', 'verticalLayout_Metronome')),
+        ('Changes', ('guitartools.Changes', 'changes', 
+                     'tab_Changes', 'verticalLayout_Changes')),
+        ('Listening', ('guitartools.Listening', 'listening', 
+                       'tab_Listening', 'verticalLayout_Listening')),
+        ('Songs', ('guitartools.Songs', 'songs', 
+                   'tab_Songs', 'verticalLayout_Songs')),
+        ])
 
 
 class GuitarToolsWindow(QtWidgets.QMainWindow):
@@ -31,7 +61,8 @@ AutoConfig = MakeAutoConfig()
 class GuitarToolsMainWindow(AutoConfig):
 
     AutoConfig.Add('_filename', None)
-    AutoConfig.Add('volume', 100)
+    AutoConfig.Add('volume', 100, CoerceInt(0, 100))
+    AutoConfig.Add('journal_sequence', 0, CoerceInt(minimum=0))
     _autoconfig_on_init = False
     
     def __init__(self, application, **kwargs):
@@ -43,6 +74,28 @@ class GuitarToolsMainWindow(AutoConfig):
 
         self.ui = loader.load(LocalPath('mainwindow.ui'), GuitarToolsWindow())
 
+        # State loaded for tabs that have not been built yet
+        self._tab_state = {}
+
+        # The journal of the current file, and the snapshot writer
+        self.journal = None
+        self._save_all = True
+        self._history_columns = (None, None)
+        self.compactor = Compactor()
+        self.compactor.finished.connect(self._Compacted)
+        self.compactor.failed.connect(self._CompactionFailed)
+
+        # Autosave
+        self.autosaveTimer = QtCore.QTimer()
+        self.autosaveTimer.setSingleShot(True)
+        self.autosaveTimer.setInterval(AUTOSAVE_DELAY)
+        self.autosaveTimer.timeout.connect(self._Autosave)
+        self._autosave_since = None
+        self._watched = set()
+        
+        self.saveStatus = QtWidgets.QLabel()
+        self.ui.statusbar.addPermanentWidget(self.saveStatus)
+
         # set all autoconfig items
         self.set_state(**kwargs)
         
@@ -69,48 +122,14 @@ class GuitarToolsMainWindow(AutoConfig):
         self.Timer.ui.progressBarNumber_Countdown.beep.connect(
                 self.qt_application.beep
                 )
+        self._WatchSettings(self.Timer.ui)
+        self._WatchSettings(self.ui.verticalSlider_Volume)
 
         #
-        # Metronome
-        #
-        self.Metronome = Metronome(autoconfig_name_key='metronome')
-        self.ui.verticalLayout_Metronome.addWidget(self.Metronome)
-        
-        # Now link the metronome to the timer
-        self.Timer.ui.progressBarNumber_Countdown.repeatTimeout.connect(
-                self.Metronome.externalTimerIndex
-                )
-
-        self.Metronome.timerSettings.connect(
-                self.Timer.ui.progressBarNumber_Countdown.setTimes)
-
-        self.Metronome.timerSettingsGo.connect(
-                self.Timer.ui.progressBarNumber_Countdown.stop)
-
-        self.Metronome.timerSettingsGo.connect(
-                self.Timer.ui.progressBarNumber_Countdown.start)
-        
-        self.ui.verticalSlider_Volume.valueChanged.connect(self.Metronome.setVolume)
-        self.ui.verticalSlider_Volume.valueChanged.emit(self.ui.verticalSlider_Volume.value() )
-
-        
-        #
-        # Chord changes
-        #
-        self.Changes = Changes(self, autoconfig_name_key='changes')
-        self.ui.verticalLayout_Changes.addWidget(self.Changes.ui)
-
-        #
-        # Songs Suggestor
+        # Metronome, Chord changes, Listening and Songs Suggestor tabs are
+        # built by _BuildTab when first shown
         #
-        self.Songs = Songs(self, autoconfig_name_key='songs')
-        self.ui.verticalLayout_Songs.addWidget(self.Songs.ui)
-
-        #
-        # Listening
-        #
-        self.Listening = Listening(self, autoconfig_name_key='listening')
-        self.ui.verticalLayout_Listening.addWidget(self.Listening.ui)
+        self.ui.tabWidget.currentChanged.connect(self._TabShown)
         
         #
         # Render menubar: work around a bug in osx where menubar is not active.
@@ -149,6 +168,78 @@ class GuitarToolsMainWindow(AutoConfig):
         ConfigFile = self.scriptDir + 'examples' + os.path.sep + 'changes.ini'
         self.SetFilename(ConfigFile)
         self._SetWindowTitle()
+        
+        self._TabShown(self.ui.tabWidget.currentIndex())
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: build tabs when first needed
+        if name in LAZY_TABS:
+            return self._BuildTab(name)
+        
+        raise AttributeError(name)
+
+    #
+    # Tabs
+    #
+
+    def _TabShown(self, index):
+        page = self.ui.tabWidget.widget(index)
+        
+        for name, (module, key, page_name, layout) in LAZY_TABS.items():
+            if page is getattr(self.ui, page_name) and name not in self.__dict__:
+                self._BuildTab(name)
+
+    def _BuildTab(self, name):
+        """
+        Import, build and configure the tab name
+        """
+        
+        module, key, page, layout = LAZY_TABS[name]
+        
+        with profile.Stage('import'):
+            Class = getattr(importlib.import_module(module), name)
+
+        with profile.Stage('widget population'):
+            if name == 'Metronome':
+                tab = Class(autoconfig_name_key=key)
+                widget = tab
+            else:
+                tab = Class(self, autoconfig_name_key=key)
+                widget = tab.ui
+
+            setattr(self, name, tab)
+            getattr(self.ui, layout).addWidget(widget)
+            
+            if name == 'Metronome':
+                self._ConnectMetronome()
+            
+            tab.set_state(**{key: dict(self._tab_state.pop(key, {}))})
+            self._WatchSettings(widget)
+        
+        return tab
+            
+    def _ConnectMetronome(self):
+
+        # Now link the metronome to the timer
+        self.Timer.ui.progressBarNumber_Countdown.repeatTimeout.connect(
+                self.Metronome.externalTimerIndex
+                )
+
+        self.Timer.ui.progressBarNumber_Countdown.segmentStarted.connect(
+                self.Metronome.externalSegment
+                )
+
+        self.Metronome.timerSettings.connect(
+                self.Timer.ui.progressBarNumber_Countdown.setProgram)
+
+        self.Metronome.timerSettingsGo.connect(
+                self.Timer.ui.progressBarNumber_Countdown.stop)
+
+        self.Metronome.timerSettingsGo.connect(
+                self.Timer.ui.progressBarNumber_Countdown.start)
+        
+        self.ui.verticalSlider_Volume.valueChanged.connect(self.Metronome.setVolume)
+        self.ui.verticalSlider_Volume.valueChanged.emit(self.ui.verticalSlider_Volume.value() )
 
     @property
     def volume(self):
@@ -156,16 +247,14 @@ class GuitarToolsMainWindow(AutoConfig):
     
     @volume.setter
     def volume(self, value):
-        value = max(int(value), 0)
-        value = min(int(value), 100)
-        
         self.ui.verticalSlider_Volume.setValue(value)
 
     def Quit(self):
         self.qt_application.quit()
 
     def GracefulShutdown(self):
-        self.SaveChanges()
+        self.autosaveTimer.stop()
+        self.SaveChanges(wait=True)
 
     def SetLogFile(self):
 
@@ -190,48 +279,271 @@ class GuitarToolsMainWindow(AutoConfig):
     #
 
     def SetFilename(self, filename):
+        
+        # Finish with the current file first
+        self.compactor.Wait()
+        if self.journal is not None:
+            self.journal.Close()
+            self.journal = None
                 
+        with profile.Stage('config parse'):
+            if filename is not None:
+                try:
+                    # Much faster than parsing the .ini, if it is up to date
+                    state = ReadSnapshot(filename)
+                    if state is None:
+                        state = configobj.ConfigObj(infile=filename)
+                    
+                except:
+                    self.ui.statusbar.showMessage("Invalid file: " + filename, 10000)
+                    
+                    state = configobj.ConfigObj()
+    
+    
+            else:
+                state = configobj.ConfigObj()
+
         if filename is not None:
+            self.compactor.Track(filename)
+        self._save_all = False
+
+        # Now for every subwidget distributed the config
+        with profile.Stage('widget population'):
+            self.set_state(**state)
+            self._filename = filename        
+
+            # The file is where we just loaded it from, which is not a change
+            self.MarkSaved()
+    
+            self.Timer.set_state(**state)
+            
+            # Tabs that are not built yet keep their state until they are
+            for name, (module, key, page, layout) in LAZY_TABS.items():
+                if name in self.__dict__:
+                    getattr(self, name).set_state(**state)
+                else:
+                    self._tab_state[key] = state.get(key, {})
+    
+            # Loading is not an edit
+            self.autosaveTimer.stop()
+            self._autosave_since = None
+
+            self._ReplayJournal()
+
+    #
+    # Practice journal
+    #
+
+    def _ReplayJournal(self):
+        """
+        Open the journal of the current file and apply the entries that are
+        newer than the snapshot we just loaded
+        """
+        
+        if self._filename is None:
+            return
+        
+        self.journal = Journal(self._filename + '.journal')
+        
+        entries = self.journal.Load(self.journal_sequence)
+        for entry in entries:
             try:
-                state = configobj.ConfigObj(infile=filename)
-                
-            except:
-                self.ui.statusbar.showMessage("Invalid file: " + filename, 10000)
-                
-                state = configobj.ConfigObj()
+                self._ReplayEntry(entry)
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        if len(entries) > 0:
+            self.ui.statusbar.showMessage(
+                    "Replayed {} journal entries".format(len(entries)), 
+                    10000)
+            self.ScheduleSave()
+
+    def _ReplayEntry(self, entry):
+        kind = entry['kind']
+
+        if kind == 'changes':
+            self.Changes.RecordChanges(int(entry['changes']), 
+                                       *entry['chords'], 
+                                       when=entry['when'])
+        elif kind == 'song':
+            self.Songs.PlaySong(entry['song'])
+        elif kind == 'timer':
+            self.Timer.SetSession(entry['repeats'], entry['starttime'])
+
+    def JournalEntry(self, kind, **fields):
+        """
+        Write one practice event to the journal, and start writing a new 
+        snapshot if the journal is getting long
+        """
+        
+        if self.journal is None:
+            return
+        
+        self.journal.Append(kind, **fields)
+        self._unsaved_changes = True
+        
+        if len(self.journal) >= COMPACT_ENTRIES and not self.compactor.running:
+            self.SaveChanges()
+        else:
+            self.ScheduleSave()
 
+    def _Compacted(self, filename, sequence):
+        """
+        The snapshot of filename now contains the journal up to sequence
+        """
+        
+        if self.journal is not None and filename == self._filename:
+            self.journal.Discard(sequence)
+        
+        self._ShowSaveStatus()
 
+    def _CompactionFailed(self, filename, message):
+        # We no longer know what is on disk
+        self._save_all = True
+        
+        self.ui.statusbar.showMessage(
+                "Unable to save {}: {}".format(filename, message), 
+                10000)
+        self._ShowSaveStatus()
+
+    def _ShowSaveStatus(self):
+        latency = self.compactor.latency
+        if latency is None:
+            text = "Not saved"
         else:
-            state = configobj.ConfigObj()
+            text = "Saved in {:.0f} ms".format(1000*latency)
+        
+        self.saveStatus.setText(
+                "{}, {} queued".format(text, self.compactor.depth))
 
-        # Now for every subwidget distributed the config
-        self.set_state(**state)
-        self._filename = filename        
+    #
+    # Autosave
+    #
 
-        self.Timer.set_state(**state)
-        self.Metronome.set_state(**state)
-        self.Changes.set_state(**state)
-        self.Songs.set_state(**state)
-        self.Listening.set_state(**state)
+    def _WatchSettings(self, widget):
+        """
+        Schedule an autosave whenever one of the inputs in widget, or the
+        data in one of its tables, is edited.  Read only inputs, such as the
+        countdown display, are not watched.
+        """
+        
+        signals = []
+        for child in [widget] + widget.findChildren(QtWidgets.QWidget):
+            if (isinstance(child, (QtWidgets.QAbstractSpinBox, 
+                                   QtWidgets.QLineEdit)) and 
+                    child.isReadOnly()):
+                continue
+            elif isinstance(child, (QtWidgets.QSpinBox, 
+                                  QtWidgets.QDoubleSpinBox, 
+                                  QtWidgets.QAbstractSlider)):
+                signals.append(child.valueChanged)
+            elif isinstance(child, QtWidgets.QLineEdit):
+                signals.append(child.editingFinished)
+            elif isinstance(child, QtWidgets.QAbstractButton):
+                if child.isCheckable():
+                    signals.append(child.toggled)
+            elif isinstance(child, QtWidgets.QAbstractItemView):
+                model = child.model()
+                # Models are often shared between views
+                if model is not None and id(model) not in self._watched:
+                    self._watched.add(id(model))
+                    signals += [model.dataChanged, 
+                                model.rowsInserted, 
+                                model.rowsRemoved]
+
+        for signal in signals:
+            signal.connect(self.ScheduleSave)
+
+    def ScheduleSave(self, *args):
+        """
+        Save once things have been quiet for AUTOSAVE_DELAY.  Bursts of
+        changes are saved together.
+        """
+        
+        if self._filename is None:
+            return
+        
+        now = time.perf_counter()
+        if self._autosave_since is None:
+            self._autosave_since = now
+        elif (now - self._autosave_since)*1000 > AUTOSAVE_LIMIT:
+            # Let the pending save happen
+            return
+        
+        self.autosaveTimer.start()
 
+    def _Autosave(self):
+        self.SaveChanges()
     
-    def SaveChanges(self):
+    def SaveChanges(self, wait=False):
         """
         Save to disk
+        
+        Only the sections that changed since they were loaded or saved are
+        rendered again, and nothing is written if nothing changed.  The 
+        snapshot is written in the background unless wait is True
         """
         
-        state = configobj.ConfigObj()
+        # This save covers any that was scheduled
+        self.autosaveTimer.stop()
+        self._autosave_since = None
+        
+        if self.journal is not None:
+            self.journal_sequence = self.journal.sequence
+        
+        # Tabs that were never built are saved as they were loaded
+        components = [self, self.Timer] + [getattr(self, name) 
+                      for name in LAZY_TABS if name in self.__dict__]
+
+        dirty = {component.autoconfig_name_key for component in components 
+                 if component.Modified()}
+        
+        if self._filename is None:
+            return
+        elif self._save_all or FileStamp(self._filename) is None:
+            dirty = None
+        elif len(dirty) == 0:
+            self._unsaved_changes = False
+            return
+        
+        state = {}
         state.update(self.get_state())
         state.update(self.Timer.get_state())
-        state.update(self.Metronome.get_state())
-        state.update(self.Changes.get_state())
-        state.update(self.Songs.get_state())
-        state.update(self.Listening.get_state())
-
         
-        if self._filename is not None:
-            state.filename = self._filename
-            state.write()
+        for name, (module, key, page, layout) in LAZY_TABS.items():
+            if name in self.__dict__:
+                state.update(getattr(self, name).get_state())
+            elif key in self._tab_state:
+                state[key] = self._tab_state[key]
+
+        if 'Changes' in self.__dict__:
+            # The cached history only changes when an attempt is recorded
+            source, history = self._history_columns
+            if source is not state['changes']['history']:
+                history = self.Changes.chord_history.ToColumns()
+                self._history_columns = (state['changes']['history'], history)
+        else:
+            history = state.get('changes', {}).get('history', None)
+            if isinstance(history, ChordHistory):
+                state['changes'] = dict(state['changes'], 
+                                        history=history.ToConfig())
+                history = history.ToColumns()
+            else:
+                # Still the text layout, leave the snapshot out of date
+                history = None
+        
+        if wait:
+            self.compactor.Write(self._filename, state, history, dirty)
+            self._Compacted(self._filename, self.journal_sequence)
+        else:
+            self.compactor.Start(self._filename, state, 
+                                 self.journal_sequence, history, dirty)
+        
+        self._ShowSaveStatus()
+
+        for component in components:
+            component.MarkSaved()
+        self._save_all = False
 
         self._unsaved_changes = False
 
@@ -241,10 +553,19 @@ if __name__ == '__main__':
     # Find application icon
     
 
+    # Report where the time goes during startup
+    profile_startup = '--profile-startup' in sys.argv
+    if profile_startup:
+        sys.argv.remove('--profile-startup')
+
     qapplication = QtWidgets.QApplication(sys.argv)
 
     app = GuitarToolsMainWindow(qapplication, autoconfig_name_key='guitartools')
 
+    if profile_startup:
+        # Once the window has been drawn
+        QtCore.QTimer.singleShot(0, lambda: print(profile.Report()))
+
     def execute_program():
         qapplication.exec_()    
 
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Spaced repetition schedule rebuilt from the chord changes history
+"""
+
+import time
+
+from guitartools.History import ChordHistory
+from guitartools.Scheduler import (ReviewScheduler, DAY, FIRST_STABILITY,
+                                   SECOND_STABILITY, EASE)
+
+
+def test_build_keeps_intervals_of_passing_history():
+    now = time.time()
+
+    history = ChordHistory()
+    for days in (20, 19, 10):
+        history.Record('A', 'D', 40, time.ctime(now - days*DAY))
+
+    scheduler = ReviewScheduler()
+    scheduler.Build(history, [('A', 'D')], goal=40, now=now)
+
+    memory = scheduler.Memory(('A', 'D'))
+    last = history.Pair('A', 'D').stamps[-1]
+
+    assert memory.repetitions == 3
+    assert memory.stability == round(SECOND_STABILITY*(EASE + 0.2))
+    assert memory.due == last + memory.stability*DAY
+    assert memory.due > now
+
+
+def test_build_new_pair_is_due_now():
+    now = time.time()
+
+    scheduler = ReviewScheduler()
+    scheduler.Build(ChordHistory(), [('A', 'D')], goal=40, now=now)
+
+    memory = scheduler.Memory(('A', 'D'))
+
+    assert memory.repetitions == 0
+    assert memory.due == now
+    assert scheduler.Next() == ('A', 'D')
+
+
+def test_failed_attempt_resets_stability():
+    now = time.time()
+
+    history = ChordHistory()
+    history.Record('A', 'D', 40, time.ctime(now - 10*DAY))
+    history.Record('A', 'D', 40, time.ctime(now - 9*DAY))
+    history.Record('A', 'D', 5, time.ctime(now - 2*DAY))
+
+    scheduler = ReviewScheduler()
+    scheduler.Build(history, [('A', 'D')], goal=40, now=now)
+
+    memory = scheduler.Memory(('A', 'D'))
+
+    assert memory.repetitions == 0
+    assert memory.stability == FIRST_STABILITY